@@ -0,0 +1,54 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.pem.decay_matrix import DecayMatrix
+
+
+def main():
+    """
+    Benchmark of the averaging engine against a per-group average, using a synthetic raw surface file.
+    Run from the repository folder: python -m benchmarks.bench_decay_matrix
+    """
+    def grouped_average(data):
+        def weighted_average(group):
+            row = group.iloc[0].copy()
+            row['Number_of_stacks'] = group.Number_of_stacks.sum()
+            row['Reading'] = np.average(np.stack(group.Reading.to_numpy()), axis=0, weights=group.Number_of_stacks)
+            return row
+
+        return data.groupby(['Station', 'Component'], group_keys=False).apply(weighted_average)
+
+    rng = np.random.default_rng(0)
+    num_stations, num_repeats, num_channels = 200, 8, 44
+    stations = np.repeat([f"{s * 25}N" for s in range(num_stations)], 3 * num_repeats)
+    components = np.tile(np.repeat(['X', 'Y', 'Z'], num_repeats), num_stations)
+    data = pd.DataFrame({
+        'Station': stations,
+        'Component': components,
+        'Reading_number': np.arange(len(stations)),
+        'Number_of_stacks': rng.integers(64, 512, len(stations)),
+        'Deleted': False,
+        'Overload': False,
+        'RAD_ID': 0,
+    })
+    data['Reading'] = pd.Series(list(rng.normal(size=(len(data), num_channels))), dtype=object)
+
+    t0 = time.perf_counter()
+    expected = grouped_average(data)
+    t1 = time.perf_counter()
+    averaged = DecayMatrix.from_data(data).average()
+    t2 = time.perf_counter()
+
+    expected = np.stack(expected.sort_values(['Station', 'Component']).Reading.to_numpy())
+    result = averaged.values[np.lexsort((averaged.components, averaged.stations))]
+    assert np.allclose(expected, result), "Averaged decays do not match."
+
+    print(f"{len(data)} readings, {num_channels} channels")
+    print(f"Per-group average: {t1 - t0:.3f} s")
+    print(f"DecayMatrix average: {t2 - t1:.3f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from src.pem.pem_file import PEMParser
+from src.pem.pem_stream import StreamingPEMParser
+
+
+def main():
+    """
+    Compare the time and peak memory of the regular and the streaming parser. The PEM file is the first argument,
+    or the largest PEM file of sample_files.
+    Run from the repository folder: python -m benchmarks.bench_pem_stream [filepath]
+    """
+    filepath = sys.argv[1] if len(sys.argv) > 1 else None
+    if filepath is None:
+        files = list(Path(__file__).parents[1].joinpath('sample_files').rglob('*.PEM'))
+        if not files:
+            print("No PEM file to parse.")
+            return
+        filepath = max(files, key=lambda f: f.stat().st_size)
+
+    for name, parse in [("PEMParser", lambda f: PEMParser().parse(f)),
+                        ("StreamingPEMParser", lambda f: StreamingPEMParser().parse(f))]:
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        pem_file = parse(filepath)
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name}: {pem_file.number_of_readings} readings in {elapsed:.2f} s, peak memory {peak / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.pem.pem_writer import READING_HEADER_FORMAT, VALUE_FORMAT, VALUES_PER_LINE, serialize_data
+
+
+def main():
+    """
+    Benchmark of the formatting of the data section against formatting each reading separately.
+    Run from the repository folder: python -m benchmarks.bench_pem_writer
+    """
+    def format_readings(data):
+        text = ''
+        for _, reading in data.iterrows():
+            text += READING_HEADER_FORMAT % (reading.Station, reading.Component, reading.Reading_index, reading.Gain,
+                                             reading.Rx_type, reading.ZTS, reading.Coil_delay,
+                                             reading.Number_of_stacks, reading.Readings_per_set,
+                                             reading.Reading_number) + '\n'
+            values = [VALUE_FORMAT % r for r in reading.Reading]
+            for i in range(0, len(values), VALUES_PER_LINE):
+                text += ' '.join(values[i:i + VALUES_PER_LINE]) + '\n'
+        return text
+
+    rng = np.random.default_rng(0)
+    num_readings, num_channels = 5000, 44
+    data = pd.DataFrame({
+        'Station': [f"{s * 25}N" for s in range(num_readings)],
+        'Component': rng.choice(['X', 'Y', 'Z'], num_readings),
+        'Reading_index': 1,
+        'Gain': 0,
+        'Rx_type': 'A',
+        'ZTS': 12.5,
+        'Coil_delay': 1000,
+        'Number_of_stacks': 64,
+        'Readings_per_set': 4,
+        'Reading_number': np.arange(num_readings),
+        'RAD_tool': None,
+    })
+    data['Reading'] = pd.Series(list(rng.normal(size=(num_readings, num_channels))), dtype=object)
+
+    t0 = time.perf_counter()
+    expected = format_readings(data)
+    t1 = time.perf_counter()
+    result = serialize_data(data)
+    t2 = time.perf_counter()
+    assert result == expected, "Formatted data does not match."
+
+    print(f"{num_readings} readings, {num_channels} channels")
+    print(f"Per-reading formatting: {t1 - t0:.3f} s")
+    print(f"serialize_data: {t2 - t1:.3f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import logging
+import multiprocessing
 import sys
 import time
 from pathlib import Path
@@ -68,26 +69,28 @@ class SplashScreen(QWidget, Ui_SplashScreen):
     def progress(self):
         self.counter += 1
         self.progressBar.setValue(self.counter)
-        app.processEvents()
+        QApplication.processEvents()
 
 
-# Splash screen
-app = QApplication(sys.argv)
-app.setStyle("Fusion")
+def main():
+    # Worker processes (used to parse files) import this module, so the application is only created here
+    multiprocessing.freeze_support()
 
-# Handle high resolution displays:
-if hasattr(Qt, 'AA_EnableHighDpiScaling'):
-    print(f"Using High DPI scaling.")
-    QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
-if hasattr(Qt, 'AA_UseHighDpiPixmaps'):
-    print(f"Using High DPI Pixmaps.")
-    QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)
+    # Splash screen
+    app = QApplication(sys.argv)
+    app.setStyle("Fusion")
 
-splash = SplashScreen(__version__)
-app.processEvents()
+    # Handle high resolution displays:
+    if hasattr(Qt, 'AA_EnableHighDpiScaling'):
+        print(f"Using High DPI scaling.")
+        QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
+    if hasattr(Qt, 'AA_UseHighDpiPixmaps'):
+        print(f"Using High DPI Pixmaps.")
+        QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)
 
+    splash = SplashScreen(__version__)
+    app.processEvents()
 
-def main():
     splash.showMessage("Loading modules...")
     t = time.time()
     from src.qt_py.pem_hub import PEMHub
@@ -1,87 +1,15 @@
 import os
-import time
 from pathlib import Path
-import cProfile
-import io
-import pstats
-from functools import wraps
 
-# Create the AppData folder used to save temporary data and settings
-app_data_dir = Path(os.getenv('APPDATA')).joinpath("PEMPro")
-app_data_dir.mkdir(exist_ok=True)
+# Create the AppData folder used to save temporary data and settings. APPDATA only exists on Windows, the command
+# line tools (src.batch) also run on Linux.
+app_data_dir = Path(os.getenv('APPDATA') or Path.home().joinpath(".local", "share")).joinpath("PEMPro")
+app_data_dir.mkdir(parents=True, exist_ok=True)
 
-app_temp_dir = Path(os.getenv('APPDATA')).joinpath("PEMPro/temp")
+app_temp_dir = app_data_dir.joinpath("temp")
 app_temp_dir.mkdir(exist_ok=True)
 
 samples_folder = Path(__file__).parents[1].joinpath("sample_files")
 
 
-def timeit(method):
-    """
-    Decorator to measure execution time of a method.
-    :param method: function
-    """
-    def timed(*args, **kwargs):
-        ts = time.time()
-        result = method(*args, **kwargs)
-        te = time.time()
-        if 'log_time' in kwargs:
-            name = kwargs.get('log_name', method.__name__.upper())
-            kwargs['log_time'][name] = int((te - ts) * 1000)
-        else:
-            print(f"{method.__name__} {(te - ts):.3f} s")
-        return result
-    return timed
-
-
-def profile(output_file=None, sort_by='cumulative', lines_to_print=None, strip_dirs=True):
-    """A time profiler decorator.
-    Inspired by and modified the profile decorator of Giampaolo Rodola:
-    http://code.activestate.com/recipes/577817-profile-decorator/
-    Args:
-        output_file: str or None. Default is None
-            Path of the output file. If only name of the file is given, it's
-            saved in the current directory.
-            If it's None, the name of the decorated function is used.
-        sort_by: str or SortKey enum or tuple/list of str/SortKey enum
-            Sorting criteria for the Stats object.
-            For a list of valid string and SortKey refer to:
-            https://docs.python.org/3/library/profile.html#pstats.Stats.sort_stats
-        lines_to_print: int or None
-            Number of lines to print. Default (None) is for all the lines.
-            This is useful in reducing the size of the printout, especially
-            that sorting by 'cumulative', the time consuming operations
-            are printed toward the top of the file.
-        strip_dirs: bool
-            Whether to remove the leading path info from file names.
-            This is also useful in reducing the size of the printout
-    Returns:
-        Profile of the decorated function
-    """
-
-    def inner(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            _output_file = output_file or func.__name__ + '.prof'
-            pr = cProfile.Profile()
-            pr.enable()
-            retval = func(*args, **kwargs)
-            pr.disable()
-            pr.dump_stats(_output_file)
-
-            with open(_output_file, 'w') as f:
-                ps = pstats.Stats(pr, stream=f)
-                if strip_dirs:
-                    ps.strip_dirs()
-                if isinstance(sort_by, (tuple, list)):
-                    ps.sort_stats(*sort_by)
-                else:
-                    ps.sort_stats(sort_by)
-                ps.print_stats(lines_to_print)
-            return retval
-
-        return wrapper
-
-    return inner
-
 __version__ = '0.12.5'
@@ -0,0 +1,298 @@
+"""
+Command line processing of PEM files, without PEMHub.
+
+Runs a pipeline of processing steps over PEM and DMP files, processing several files at once in worker processes.
+The pipeline is a comma-separated list of steps, with the arguments of a step separated by colons, or a JSON file with
+a list of steps, each a list of the step name and its arguments.
+
+Example:
+    python -m src.batch "C:/Projects/Loop 1" --pipeline "average,split,derotate:acc,export" --output Final --jobs 8
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+from src.pem.decay_matrix import average_pem, split_pem, auto_clean_pem
+from src.pem.pem_cache import ParsedFileCache
+from src.pem.pem_copy import copy_pem
+from src.pem.pem_stream import parse_pem, convert_dmp
+from src.pem.pem_writer import save_pem, export_pem
+from src.process_pool import process_map
+from src.project_index import pem_extensions
+from src.text_io import write_text_atomic
+
+logger = logging.getLogger(__name__)
+
+
+def derotate(pem_file, method='acc', soa=0):
+    """
+    De-rotate the XY data of a borehole file. Files which aren't boreholes with XY data are not changed.
+    :param pem_file: PEMFile object
+    :param method: str, 'acc', 'mag', 'pp' or 'unrotate'
+    :param soa: float, sensor offset angle
+    :return: PEMFile object
+    """
+    if not pem_file.is_borehole() or not pem_file.has_xy():
+        return pem_file
+    if pem_file.is_derotated() and method != 'unrotate':
+        logger.info(f"{pem_file.filepath.name} is already de-rotated.")
+        return pem_file
+
+    pem_file, error_msg = pem_file.prep_rotation(method)
+    if error_msg:
+        logger.warning(f"{pem_file.filepath.name}: {error_msg}")
+    return pem_file.rotate(method=method, soa=0 if method == 'unrotate' else float(soa))
+
+
+def auto_clean(pem_file, threshold='', window_size=''):
+    """
+    Flag the outlier readings for deletion, the same as the auto-clean of the plot editor.
+    :param pem_file: PEMFile object
+    :param threshold: str, maximum difference with the median. Defaults to the plot editor default.
+    :param window_size: str, number of channels compared, from the last off-time channel. Defaults to the plot editor
+    default.
+    :return: PEMFile object
+    """
+    return auto_clean_pem(pem_file,
+                          threshold=float(threshold) if threshold else None,
+                          window_size=int(window_size) if window_size else None)
+
+
+def reverse_components(pem_file, *components):
+    """
+    Reverse the polarity of components.
+    :param pem_file: PEMFile object
+    :param components: str, components to reverse, i.e. X, Y and/or Z
+    :return: PEMFile object
+    """
+    for component in components:
+        pem_file = pem_file.reverse_component(component.upper())
+    return pem_file
+
+
+def change_suffix(pem_file, suffix):
+    """
+    Change the suffix of the stations of a surface file.
+    :param pem_file: PEMFile object
+    :param suffix: str, N, E, S or W
+    :return: PEMFile object
+    """
+    if pem_file.is_borehole():
+        raise ValueError("Changing suffixes only applies to surface surveys.")
+    pem_file.change_suffix(suffix.upper())
+    return pem_file
+
+
+# Processing steps applied to each file. Each step takes the PEMFile and the (str) arguments of the step, and returns
+# the processed PEMFile.
+steps = {
+    'average': lambda pem_file: average_pem(pem_file),
+    'split': lambda pem_file: split_pem(pem_file),
+    'auto_clean': auto_clean,
+    'derotate': derotate,
+    'scale_current': lambda pem_file, current: pem_file.scale_current(float(current)),
+    'scale_coil_area': lambda pem_file, coil_area: pem_file.scale_coil_area(float(coil_area)),
+    'mag_offset': lambda pem_file: pem_file.mag_offset(),
+    'reverse': reverse_components,
+    'reverse_stations': lambda pem_file: pem_file.reverse_station_numbers(),
+    'suffix': change_suffix,
+}
+# Steps which write the processed file. 'save' overwrites the file, 'export' saves it in the output folder the same
+# way as the PEMHub export (processed and renamed), and 'xyz' writes an XYZ file in the output folder.
+output_steps = ['save', 'export', 'legacy_export', 'xyz']
+
+
+def parse_pipeline(text):
+    """
+    Parse a pipeline, either the path of a JSON file or a comma-separated list of steps.
+    :param text: str
+    :return: list of tuples, step name and tuple of str arguments
+    """
+    if os.path.isfile(text):
+        with open(text) as json_file:
+            pipeline = [(step[0], tuple(str(arg) for arg in step[1:])) for step in json.load(json_file)]
+    else:
+        pipeline = []
+        for step in [s.strip() for s in text.split(',') if s.strip()]:
+            name, *args = step.split(':')
+            pipeline.append((name.strip().lower(), tuple(args)))
+
+    for name, args in pipeline:
+        if name not in steps and name not in output_steps and name != 'print':
+            raise ValueError(f"Unknown step '{name}'. Steps are: {', '.join([*steps, *output_steps, 'print'])}.")
+    return pipeline
+
+
+def find_files(inputs):
+    """
+    Find the PEM and DMP files of the inputs.
+    :param inputs: list of str, files, folders (searched recursively) or glob patterns
+    :return: list of Path
+    """
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for folder, _, names in os.walk(item):
+                files.extend([Path(folder, name) for name in names if Path(name).suffix.lower() in pem_extensions])
+        else:
+            files.extend([Path(file) for file in glob.glob(item, recursive=True)
+                          if Path(file).suffix.lower() in pem_extensions])
+    # Remove duplicates, keeping the order
+    return list({str(file.absolute()): file for file in files}.values())
+
+
+def _run_pipeline(job):
+    """
+    Process pool task, parse a file and run the pipeline on it.
+    :param job: tuple, filepath, pipeline, output folder and bool, return the processed PEMFile.
+    :return: tuple, dict of the time of each step in seconds, and the processed PEMFile or None
+    """
+    filepath, pipeline, output, keep_file = job
+    timings = {}
+
+    t0 = time.perf_counter()
+    if Path(filepath).suffix.lower() == '.pem':
+        pem_file = parse_pem(filepath, evict_cache=False)
+    else:
+        pem_file, _ = convert_dmp(filepath, evict_cache=False)
+    timings['parse'] = time.perf_counter() - t0
+
+    for name, args in pipeline:
+        t0 = time.perf_counter()
+        if name in steps:
+            pem_file = steps[name](pem_file, *args)
+        elif name == 'save':
+            save_pem(pem_file, legacy=getattr(pem_file, 'legacy', False))
+        elif name in ['export', 'legacy_export']:
+            # Exporting changes the filepath of the file, so export a copy
+            export_pem(copy_pem(pem_file), output, legacy=name == 'legacy_export', processed=True)
+        elif name == 'xyz':
+            write_text_atomic(Path(output).joinpath(pem_file.filepath.name).with_suffix('.XYZ'), pem_file.to_xyz())
+        timings[name] = timings.get(name, 0) + time.perf_counter() - t0
+
+    return timings, pem_file if keep_file else None
+
+
+def print_pdf(pem_files, save_path):
+    """
+    Print the LIN, LOG, section and plan map plots of the files to a PDF, using PEMPrinter.
+    :param pem_files: list of PEMFile objects
+    :param save_path: str, filepath of the PDF, without extension.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    from src.pem.pem_plotter import PEMPrinter
+
+    crs = next((pem_file.get_crs() for pem_file in pem_files if pem_file.get_crs() is not None), None)
+    printer = PEMPrinter(make_plan_map=crs is not None, make_section_plots=True, make_lin_plots=True,
+                         make_log_plots=True, make_step_plots=False, CRS=crs, share_range=True, hide_gaps=True,
+                         annotate_loop=False, draw_title_box=True, draw_grid=True, draw_scale_bar=True,
+                         draw_north_arrow=True, draw_legend=True, draw_loops=True, draw_lines=True, draw_collars=True,
+                         draw_hole_traces=True, label_loops=True, label_lines=True, label_collars=True,
+                         label_hole_depths=True, draw_segment_labels=True)
+    printer.print_files(save_path, [(pem_file, getattr(pem_file, 'ri_file', None)) for pem_file in pem_files],
+                        progress=NullProgress())
+
+
+class NullProgress:
+    """
+    Stand-in for the progress dialog of PEMPrinter when printing without a GUI.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def __iadd__(self, value):
+        return self
+
+    def setLabelText(self, text):
+        logger.info(text)
+
+    def wasCanceled(self):
+        return False
+
+
+def run(inputs, pipeline, output=None, jobs=None):
+    """
+    Run the pipeline over the files of the inputs and print the time taken by each file.
+    :param inputs: list of str, files, folders or glob patterns
+    :param pipeline: list of tuples, step name and arguments (see parse_pipeline)
+    :param output: str, output folder of the 'export', 'xyz' and 'print' steps
+    :param jobs: int, number of worker processes. Defaults to the number of CPUs.
+    :return: int, number of files which failed
+    """
+    files = find_files(inputs)
+    if not files:
+        print("No PEM or DMP files found.")
+        return 0
+
+    names = [name for name, _ in pipeline]
+    if output is None and any(name in ['export', 'legacy_export', 'xyz', 'print'] for name in names):
+        raise ValueError("An output folder is required to export or print files.")
+    if output is not None:
+        Path(output).mkdir(parents=True, exist_ok=True)
+
+    file_pipeline = [(name, args) for name, args in pipeline if name != 'print']
+    print_files = 'print' in names
+    print(f"Processing {len(files)} files: {' > '.join(names)}")
+
+    start = time.perf_counter()
+    processed, errors = [], []
+    jobs_list = [(str(file), file_pipeline, output, print_files) for file in files]
+    for job, result, error in process_map(_run_pipeline, jobs_list, max_workers=jobs):
+        name = Path(job[0]).name
+        if error is not None:
+            errors.append((name, error))
+            print(f"{name}: ERROR {error}")
+            continue
+
+        timings, pem_file = result
+        steps_text = ', '.join([f"{step} {t:.2f}s" for step, t in timings.items()])
+        print(f"{name}: {sum(timings.values()):.2f}s ({steps_text})")
+        if pem_file is not None:
+            processed.append(pem_file)
+    # The workers don't evict the parsed file cache after each file
+    ParsedFileCache().evict()
+
+    if print_files and processed:
+        t0 = time.perf_counter()
+        save_path = str(Path(output).joinpath(f"PEM Plots {time.strftime('%Y-%m-%d %H%M')}"))
+        print_pdf(processed, save_path)
+        print(f"Printed {len(processed)} files to {save_path}.PDF: {time.perf_counter() - t0:.2f}s")
+
+    print(f"{len(files) - len(errors)} of {len(files)} files processed in {time.perf_counter() - start:.2f}s.")
+    return len(errors)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Process PEM and DMP files without the GUI.",
+                                     epilog=f"Steps: {', '.join([*steps, *output_steps, 'print'])}")
+    parser.add_argument('inputs', nargs='+', help="PEM/DMP files, folders (searched recursively) or glob patterns.")
+    parser.add_argument('-p', '--pipeline', required=True,
+                        help="Comma-separated steps, with arguments separated by colons (e.g. "
+                             "'average,split,scale_current:10,export'), or a JSON file with a list of steps.")
+    parser.add_argument('-o', '--output', help="Output folder of the export, xyz and print steps.")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="Number of files processed at the same time. "
+                                                                     "Defaults to the number of CPUs.")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Show the log messages.")
+    args = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    try:
+        pipeline = parse_pipeline(args.pipeline)
+        failed = run(args.inputs, pipeline, output=args.output, jobs=args.jobs)
+    except ValueError as e:
+        parser.error(str(e))
+    else:
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,6 @@ import re
 from math import hypot
 from pathlib import Path
 
-import chardet
 import geopandas as gpd
 import numpy as np
 import pandas as pd
@@ -14,9 +13,10 @@ from scipy import spatial
 from shapely.geometry import MultiPoint, Point, Polygon, MultiLineString, LineString
 from zipfile import ZipFile
 
-from src import app_temp_dir, timeit
+from src import app_temp_dir
+from src.instrumentation import timed
 from src.pem import convert_station
-from src.qt_py import read_file
+from src.text_io import read_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -98,7 +98,7 @@ def parse_gps(file, gps_object):
                 gps.rename(columns={"Name": "Station"}, inplace=True)
                 return gps
             else:
-                contents = read_file(file, as_list=True)
+                contents = read_tokens(file)
             gps = pd.DataFrame.from_records(contents)
         else:
             logger.error(f"Invalid input: {file}.")
@@ -640,7 +640,7 @@ class TransmitterLoop(BaseGPS):
         Return rows where the elevation is 0 and where the rows might not be sorted counter-clockwise.
         :return: DataFrame
         """
-        @timeit
+        @timed('TransmitterLoop.get_sorting_warnings', subsystem='gps')
         def get_sorting_warnings():
             sorting_warnings = pd.DataFrame()
 
@@ -902,12 +902,7 @@ class BoreholeSegments(BaseGPS):
         elif isinstance(file, pd.DataFrame):
             gps = file
         elif Path(str(file)).is_file():
-            with open(file, 'rb') as byte_file:
-                byte_content = byte_file.read()
-                encoding = chardet.detect(byte_content).get('encoding')
-                logger.info(f"Using {encoding} encoding for {Path(str(file)).name}.")
-                str_contents = byte_content.decode(encoding=encoding)
-            contents = [c.strip().split() for c in str_contents.splitlines()]
+            contents = read_tokens(file)
             gps = pd.DataFrame(contents)
         elif file is None:
             logger.debug(f"No GPS passed.")
@@ -0,0 +1,254 @@
+"""
+Opt-in timers and counters of the hot paths of PEMPro.
+
+Timers and counters belong to a subsystem (e.g. 'plot_editor' or 'map') and only record when their subsystem is
+enabled, otherwise they only cost a flag check. Subsystems are enabled with the PEMPRO_INSTRUMENT environment variable,
+a comma-separated list of subsystems or 'all', with enable(), or from the Performance window of PEMHub. Only the
+subsystems enabled with enable() are saved in the settings (see get_enabled_by_user), so the environment variable only
+applies to the sessions it is set for. The last samples of each metric are kept so the report shows rolling percentiles.
+
+Example:
+    @timed(subsystem='plot_editor')
+    def plot_decays(self, station):
+        ...
+
+    with timer('read_file', 'parsing'):
+        ...
+
+    count('decays_plotted', 'plot_editor', len(data))
+"""
+import csv
+import logging
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+env_variable = 'PEMPRO_INSTRUMENT'
+# Number of samples of each metric kept for the percentiles
+window_size = 1000
+report_columns = ['Subsystem', 'Name', 'Kind', 'Count', 'Total', 'Mean', 'P50', 'P90', 'P99', 'Max']
+
+
+class Subsystem:
+    """
+    Group of metrics enabled together. Decorators keep a reference to their subsystem, so checking if it's enabled
+    is a single attribute lookup.
+    """
+    __slots__ = ('name', 'enabled')
+
+    def __init__(self, name, enabled=False):
+        self.name = name
+        self.enabled = enabled
+
+
+class Metric:
+    """
+    Timer (in seconds) or counter. The count and total are kept for all samples, the percentiles use the last
+    window_size samples.
+    """
+
+    def __init__(self, subsystem, name, kind):
+        """
+        :param subsystem: str
+        :param name: str
+        :param kind: str, 'timer' or 'counter'
+        """
+        self.subsystem = subsystem
+        self.name = name
+        self.kind = kind
+        self.samples = deque(maxlen=window_size)
+        self.count = 0
+        self.total = 0.
+        self.max = None
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+        self.max = value if self.max is None else max(self.max, value)
+
+    def get_stats(self):
+        """
+        :return: dict, with the report_columns keys. Timers are in milliseconds.
+        """
+        scale = 1000 if self.kind == 'timer' else 1
+        if self.samples:
+            p50, p90, p99 = [float(p) * scale for p in np.percentile(np.array(self.samples), [50, 90, 99])]
+        else:
+            p50 = p90 = p99 = 0.
+        return {
+            'Subsystem': self.subsystem,
+            'Name': self.name,
+            'Kind': self.kind,
+            'Count': self.count,
+            'Total': self.total * scale,
+            'Mean': self.total / self.count * scale if self.count else 0.,
+            'P50': p50,
+            'P90': p90,
+            'P99': p99,
+            'Max': (self.max or 0.) * scale,
+        }
+
+
+_lock = threading.Lock()
+_subsystems = {}  # Name: Subsystem
+_user_enabled = set()  # Names of the subsystems enabled with enable() instead of the environment variable
+_metrics = {}  # (subsystem, name): Metric
+
+
+def _get_env_subsystems():
+    return {name.strip().lower() for name in os.getenv(env_variable, '').split(',') if name.strip()}
+
+
+def get_subsystem(name):
+    """
+    Return the subsystem, creating it if needed. New subsystems are enabled if they are in the environment variable.
+    :param name: str
+    :return: Subsystem object
+    """
+    subsystem = _subsystems.get(name)
+    if subsystem is None:
+        env_subsystems = _get_env_subsystems()
+        subsystem = Subsystem(name, enabled=bool({name, 'all', '*'} & env_subsystems))
+        subsystem = _subsystems.setdefault(name, subsystem)
+    return subsystem
+
+
+def get_subsystems():
+    """
+    :return: list of str, names of the known subsystems, sorted.
+    """
+    return sorted(_subsystems)
+
+
+def is_enabled(name):
+    subsystem = _subsystems.get(name)
+    return subsystem is not None and subsystem.enabled
+
+
+def get_enabled_by_user():
+    """
+    :return: list of str, names of the enabled subsystems that were enabled with enable(), sorted.
+    """
+    return sorted(name for name in _user_enabled if is_enabled(name))
+
+
+def enable(*names):
+    for name in names:
+        get_subsystem(name).enabled = True
+        _user_enabled.add(name)
+    logger.info(f"Instrumentation enabled for {', '.join(names)}.")
+
+
+def disable(*names):
+    for name in names:
+        get_subsystem(name).enabled = False
+        _user_enabled.discard(name)
+
+
+def record(subsystem, name, value, kind='timer'):
+    """
+    Add a sample to a metric, whether or not the subsystem is enabled.
+    :param subsystem: str
+    :param name: str
+    :param value: float, seconds for timers
+    :param kind: str, 'timer' or 'counter'
+    """
+    with _lock:
+        metric = _metrics.get((subsystem, name))
+        if metric is None:
+            metric = _metrics[(subsystem, name)] = Metric(subsystem, name, kind)
+        metric.add(value)
+
+
+def timed(name=None, subsystem='general'):
+    """
+    Decorator which times each call of the function when the subsystem is enabled.
+    :param name: str, name of the timer. Defaults to the qualified name of the function.
+    :param subsystem: str
+    """
+    group = get_subsystem(subsystem)
+
+    def decorator(func):
+        timer_name = name or func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not group.enabled:
+                return func(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(subsystem, timer_name, time.perf_counter() - t0)
+        return wrapper
+    return decorator
+
+
+class timer:
+    """
+    Context manager which times its block when the subsystem is enabled.
+    """
+    __slots__ = ('name', 'group', 't0')
+
+    def __init__(self, name, subsystem='general'):
+        self.name = name
+        self.group = get_subsystem(subsystem)
+        self.t0 = None
+
+    def __enter__(self):
+        if self.group.enabled:
+            self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        if self.t0 is not None:
+            record(self.group.name, self.name, time.perf_counter() - self.t0)
+        return False
+
+
+def count(name, subsystem='general', value=1):
+    """
+    Add to a counter when the subsystem is enabled.
+    :param name: str
+    :param subsystem: str
+    :param value: int or float
+    """
+    group = get_subsystem(subsystem)
+    if group.enabled:
+        record(subsystem, name, value, kind='counter')
+
+
+def get_report():
+    """
+    :return: list of dict, statistics of each metric (see Metric.get_stats), sorted by subsystem and name.
+    """
+    with _lock:
+        metrics = sorted(_metrics.values(), key=lambda m: (m.subsystem, m.name))
+        return [metric.get_stats() for metric in metrics]
+
+
+def export_csv(filepath):
+    """
+    Write the report to a CSV file. Timers are in milliseconds.
+    :param filepath: str or Path
+    """
+    with open(filepath, 'w', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=report_columns)
+        writer.writeheader()
+        for row in get_report():
+            writer.writerow({key: f"{value:.3f}" if isinstance(value, float) else value for key, value in row.items()})
+
+
+def reset():
+    """
+    Remove the samples of all metrics.
+    """
+    with _lock:
+        _metrics.clear()
@@ -0,0 +1,34 @@
+import numpy as np
+
+
+def lines_in_rect(x, y, left, bottom, right, top):
+    """
+    Find the lines with at least one segment inside or crossing a rectangle, testing every segment of every line at
+    once (Liang-Barsky clipping). Segments with NaN or INF values are ignored, so lines of different lengths can be
+    padded with NaN.
+    :param x: numpy array, x values, either shared by all lines (1D) or one row per line (2D)
+    :param y: 2D numpy array, y values, one row per line
+    :param left: float
+    :param bottom: float
+    :param right: float
+    :param top: float
+    :return: boolean numpy array, True for each line that intersects the rectangle.
+    """
+    y = np.asarray(y, dtype=float)
+    if y.ndim != 2 or y.shape[1] < 2:
+        return np.zeros(len(y), dtype=bool)
+    x = np.broadcast_to(np.asarray(x, dtype=float), y.shape)
+
+    x0, y0, dx, dy = x[:, :-1], y[:, :-1], np.diff(x, axis=1), np.diff(y, axis=1)
+    t0 = np.zeros(x0.shape)
+    t1 = np.ones(x0.shape)
+    inside = np.isfinite(x0) & np.isfinite(y0) & np.isfinite(dx) & np.isfinite(dy)
+    # Distance of the start of the segments to each edge, and the direction of the segments relative to the edge
+    for p, q in [(-dx, x0 - left), (dx, right - x0), (-dy, y0 - bottom), (dy, top - y0)]:
+        parallel = p == 0
+        inside &= ~(parallel & (q < 0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = q / p
+        t0 = np.where(~parallel & (p < 0), np.maximum(t0, t), t0)
+        t1 = np.where(~parallel & (p > 0), np.minimum(t1, t), t1)
+    return (inside & (t0 <= t1)).any(axis=1)
@@ -1,4 +1,5 @@
-from src.pem.pem_file import PEMParser, PEMFile
+from src.pem.pem_file import PEMFile
+from src.pem.pem_stream import parse_pem
 from src.gps.gps_editor import TransmitterLoop, BoreholeSegments, BoreholeCollar, BoreholeGeometry
 from src.mag_field.mag_field_calculator import MagneticFieldCalculator
 
@@ -34,7 +35,7 @@ class MMRFile(PEMFile):
 
     @classmethod
     def from_pemlike(cls, filepath):
-        pemfile = PEMParser.parse(PEMParser(), filepath)
+        pemfile = parse_pem(filepath)
         mmrfile = MMRFile()
         mmrfile.__dict__ = pemfile.__dict__.copy()
         return mmrfile
@@ -0,0 +1,32 @@
+def auto_size_ax(ax, figure, buffer=0):
+    """
+    Change the limits of the axes so the axes fills the full size of the figure.
+    :param ax: Matplotlib Axes object
+    :param figure: Matplotlib Figure object
+    :param buffer: int, marging (as a percentage) to add to the X and Y.
+    :return: None
+    """
+    xmin, xmax = ax.get_xlim()
+    ymin, ymax = ax.get_ylim()
+    map_width, map_height = xmax - xmin, ymax - ymin
+
+    current_ratio = map_width / map_height
+    figure_ratio = figure.bbox.width / figure.bbox.height
+
+    if current_ratio < figure_ratio:
+        new_height = map_height
+        new_width = new_height * figure_ratio
+    else:
+        new_width = map_width
+        new_height = new_width * (1 / figure_ratio)
+
+    x_offset = buffer * new_width
+    # y_offset = 0.06 * new_height  # Causes large margins on the right and left
+    y_offset = buffer * new_height
+    new_xmin = (xmin - x_offset) - ((new_width - map_width) / 2)
+    new_xmax = (xmax + x_offset) + ((new_width - map_width) / 2)
+    new_ymin = (ymin - y_offset) - ((new_height - map_height) / 2)
+    new_ymax = (ymax + y_offset) + ((new_height - map_height) / 2)
+
+    ax.set_xlim(new_xmin, new_xmax)
+    ax.set_ylim(new_ymin, new_ymax)
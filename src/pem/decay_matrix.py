@@ -0,0 +1,507 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from src.pem import convert_station
+
+logger = logging.getLogger(__name__)
+
+
+def convert_stations(stations):
+    """
+    Convert an array of station names into station numbers. Each unique station name is only converted once.
+    :param stations: array-like of str, station names
+    :return: numpy array of int
+    """
+    stations = np.asarray(stations).astype(str)
+    if stations.size == 0:
+        return np.array([], dtype=int)
+    unique_stations, inverse = np.unique(stations, return_inverse=True)
+    converted = np.array([convert_station(s) for s in unique_stations], dtype=int)
+    return converted[inverse]
+
+
+def get_run_starts(*keys):
+    """
+    Return the index of the first element of each run of equal consecutive values in the keys.
+    :param keys: 1D numpy arrays of equal length, the row is part of a new run if any of the keys change.
+    :return: numpy array of int
+    """
+    length = len(keys[0])
+    if length == 0:
+        return np.array([], dtype=int)
+
+    change = np.zeros(length, dtype=bool)
+    change[0] = True
+    for key in keys:
+        change[1:] |= key[1:] != key[:-1]
+    return np.flatnonzero(change)
+
+
+class DecayMatrix:
+    """
+    Columnar storage of the EM data of a PEMFile. The decay of every reading is held in a single contiguous
+    (readings x channels) float array, and the remaining information of each reading in a slim metadata data frame.
+    Rows are sorted by station and component, so the readings of a station, or of a station-component group, are a
+    contiguous block of the array and are returned as zero-copy views.
+    The index of the metadata is the index of the reading in PEMFile.data.
+    """
+    meta_columns = ['Station', 'Component', 'Reading_number', 'Number_of_stacks', 'Deleted', 'Overload', 'RAD_ID']
+
+    def __init__(self, values, meta):
+        """
+        :param values: 2D numpy array, (readings x channels) decay values, sorted the same as meta.
+        :param meta: pandas DataFrame, metadata of each reading. Must include a cStation column.
+        """
+        self.values = np.ascontiguousarray(values, dtype=float)
+        self.meta = meta
+        self.c_stations = meta.cStation.to_numpy()
+        self.stations = meta.Station.to_numpy(dtype=str)
+        self.components = meta.Component.to_numpy(dtype=str)
+        self.deleted = meta.Deleted.to_numpy(dtype=bool)
+        self._group_starts = None
+        self._group_lookup = None
+
+    def __len__(self):
+        return len(self.values)
+
+    def __repr__(self):
+        return f"DecayMatrix({self.number_of_readings} readings x {self.number_of_channels} channels)"
+
+    @classmethod
+    def from_data(cls, data):
+        """
+        Create a DecayMatrix from the data of a PEMFile.
+        :param data: pandas DataFrame, PEMFile.data
+        :return: DecayMatrix object
+        """
+        cols = [col for col in cls.meta_columns if col in data.columns]
+        meta = data.loc[:, cols].copy()
+        meta['Deleted'] = meta.Deleted.astype(bool)
+        meta['cStation'] = convert_stations(meta.Station)
+
+        # Stable sort, so the readings of a group keep the order they were recorded in
+        order = np.lexsort((meta.Component.to_numpy(dtype=str),
+                            meta.Station.to_numpy(dtype=str),
+                            meta.cStation.to_numpy()))
+        meta = meta.iloc[order]
+
+        readings = data.Reading.to_numpy()
+        if len(readings) == 0:
+            values = np.empty((0, 0), dtype=float)
+        else:
+            values = np.stack(readings[order]).astype(float, copy=False)
+        return cls(values, meta)
+
+    @classmethod
+    def from_pem_file(cls, pem_file):
+        """
+        Create a DecayMatrix from a PEMFile.
+        :param pem_file: PEMFile object
+        :return: DecayMatrix object
+        """
+        return cls.from_data(pem_file.data)
+
+    @property
+    def number_of_readings(self):
+        return self.values.shape[0]
+
+    @property
+    def number_of_channels(self):
+        return self.values.shape[1] if self.values.ndim == 2 else 0
+
+    def get_group_starts(self):
+        """
+        Return the row index where each station-component group starts. Calculated once.
+        :return: numpy array of int
+        """
+        if self._group_starts is None:
+            self._group_starts = get_run_starts(self.c_stations, self.stations, self.components)
+        return self._group_starts
+
+    def get_group_ids(self):
+        """
+        Return the position of the station-component group of each row.
+        :return: numpy array of int
+        """
+        starts = self.get_group_starts()
+        return np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(self))))
+
+    def get_groups(self):
+        """
+        Return the station and component of each station-component group, with the bounds of the group's rows.
+        :return: pandas DataFrame with columns Station, Component, cStation, Start, Stop
+        """
+        starts = self.get_group_starts()
+        stops = np.append(starts[1:], len(self)).astype(int)
+        return pd.DataFrame({'Station': self.stations[starts],
+                             'Component': self.components[starts],
+                             'cStation': self.c_stations[starts],
+                             'Start': starts,
+                             'Stop': stops})
+
+    def station_bounds(self, station):
+        """
+        Return the bounds of the rows of a station.
+        :param station: int, converted station number
+        :return: tuple of int, (start, stop)
+        """
+        start = np.searchsorted(self.c_stations, station, side='left')
+        stop = np.searchsorted(self.c_stations, station, side='right')
+        return start, stop
+
+    def station_view(self, station):
+        """
+        Return the metadata and a view of the decays of every reading of a station.
+        :param station: int, converted station number
+        :return: tuple, (pandas DataFrame, 2D numpy array)
+        """
+        start, stop = self.station_bounds(station)
+        return self.meta.iloc[start:stop], self.values[start:stop]
+
+    def group_view(self, station, component):
+        """
+        Return the metadata and a view of the decays of a station-component group.
+        :param station: str, station name
+        :param component: str
+        :return: tuple, (pandas DataFrame, 2D numpy array). Both are empty if the group doesn't exist.
+        """
+        if self._group_lookup is None:
+            groups = self.get_groups()
+            self._group_lookup = dict(zip(zip(groups.Station, groups.Component), zip(groups.Start, groups.Stop)))
+
+        start, stop = self._group_lookup.get((str(station), str(component)), (0, 0))
+        return self.meta.iloc[start:stop], self.values[start:stop]
+
+    def get_rows(self, index):
+        """
+        Return the position in the matrix of readings from their index in PEMFile.data.
+        :param index: list-like, index labels of PEMFile.data
+        :return: numpy array of int, -1 where the index isn't in the matrix
+        """
+        return self.meta.index.get_indexer(index)
+
+    def update(self, data, index):
+        """
+        Update the edited readings in place, instead of creating the matrix again. The decays and metadata of the
+        readings are copied from the data, and the stations where a component changed are sorted again. The decays
+        are overwritten, so the readings returned by to_readings change as well.
+        :param data: pandas DataFrame, PEMFile.data
+        :param index: list-like, index labels of the edited readings in PEMFile.data
+        :return: bool, False if the edit can't be applied (readings were added or removed, a station or the number
+        of channels changed), in which case the matrix must be created again.
+        """
+        rows = self.get_rows(index)
+        if len(data) != len(self) or (rows < 0).any():
+            return False
+        if len(rows) == 0:
+            return True
+
+        edited = data.loc[index]
+        if not np.array_equal(edited.Station.to_numpy(dtype=str), self.stations[rows]):
+            return False
+        try:
+            values = np.stack(edited.Reading.to_numpy()).astype(float, copy=False)
+        except ValueError:
+            return False
+        if values.shape[1] != self.number_of_channels:
+            return False
+
+        self.values[rows] = values
+        for col in [col for col in self.meta_columns if col in data.columns]:
+            column_values = edited[col].to_numpy(dtype=bool) if col == 'Deleted' else edited[col].to_numpy()
+            self.meta.iloc[rows, self.meta.columns.get_loc(col)] = column_values
+        self.deleted = self.meta.Deleted.to_numpy(dtype=bool)
+
+        moved = edited.Component.to_numpy(dtype=str) != self.components[rows]
+        if moved.any():
+            self.components = self.meta.Component.to_numpy(dtype=str)
+            # Sort the stations again the same as from_data, with the order in the data breaking ties
+            positions = data.index.get_indexer(self.meta.index)
+            order = np.arange(len(self))
+            for station in np.unique(self.c_stations[rows[moved]]):
+                start, stop = self.station_bounds(station)
+                order[start:stop] = start + np.lexsort((positions[start:stop], self.components[start:stop],
+                                                        self.stations[start:stop]))
+            self.values[:] = self.values[order]
+            self.meta = self.meta.iloc[order]
+            self.stations = self.meta.Station.to_numpy(dtype=str)
+            self.components = self.meta.Component.to_numpy(dtype=str)
+            self.deleted = self.meta.Deleted.to_numpy(dtype=bool)
+            self._group_starts = None
+            self._group_lookup = None
+        return True
+
+    def get_range(self, station=None, channel_mask=None):
+        """
+        Return the minimum and maximum decay value, optionally only for a station and a selection of channels.
+        :param station: int, converted station number
+        :param channel_mask: boolean numpy array, channels to include
+        :return: tuple of float, (min, max)
+        """
+        if station is None:
+            values = self.values
+        else:
+            _, values = self.station_view(station)
+
+        if channel_mask is not None:
+            values = values[:, channel_mask]
+
+        if values.size == 0:
+            return np.nan, np.nan
+        return values.min(), values.max()
+
+    def group_means(self, incl_deleted=False):
+        """
+        Calculate the mean decay of each station-component group in a single pass.
+        :param incl_deleted: bool, include readings flagged for deletion
+        :return: tuple, (pandas DataFrame of the groups, 2D numpy array of the mean decays)
+        """
+        if incl_deleted:
+            matrix = self
+        else:
+            matrix = self.filter(~self.deleted)
+
+        groups = matrix.get_groups()
+        if groups.empty:
+            return groups, np.empty((0, self.number_of_channels), dtype=float)
+
+        sums = np.add.reduceat(matrix.values, groups.Start.to_numpy(), axis=0)
+        counts = (groups.Stop - groups.Start).to_numpy()
+        return groups, sums / counts[:, None]
+
+    def group_medians(self):
+        """
+        Calculate the median decay of each station-component group, with a single sort of the whole matrix. The values
+        of each channel are sorted within their group, and the median is taken at the middle of each group.
+        :return: 2D numpy array, (groups x channels) median decays
+        """
+        starts = self.get_group_starts()
+        if len(starts) == 0:
+            return np.empty((0, self.number_of_channels), dtype=float)
+
+        counts = np.diff(np.append(starts, len(self)))
+        group_ids = np.broadcast_to(self.get_group_ids()[:, None], self.values.shape)
+        order = np.lexsort((self.values, group_ids), axis=0)
+        sorted_values = np.take_along_axis(self.values, order, axis=0)
+        # The two middle values are the same row for groups with an odd number of readings
+        return (sorted_values[starts + (counts - 1) // 2] + sorted_values[starts + counts // 2]) / 2
+
+    def find_outliers(self, threshold, channels, min_remaining=2):
+        """
+        Find the outlier readings of each station-component group. A reading is an outlier if any of the channels is
+        further than the threshold from the median of its group. Readings are removed from the furthest to the nearest
+        to the median (summed over every channel), until only min_remaining readings are left in the group. Ties are
+        broken by row, so the result only depends on the data.
+        :param threshold: float, maximum difference with the median, in the units of the data
+        :param channels: list-like of int, channels compared with the median
+        :param min_remaining: int, minimum number of readings kept in each group
+        :return: boolean numpy array, one value per row, True for the outlier readings.
+        """
+        starts = self.get_group_starts()
+        if len(starts) == 0:
+            return np.zeros(len(self), dtype=bool)
+
+        group_ids = self.get_group_ids()
+        difference = np.abs(self.values - self.group_medians()[group_ids])
+        outliers = (difference[:, np.asarray(channels, dtype=int)] > threshold).any(axis=1)
+
+        # Rank the readings of each group by their deviation from the median, largest first. Groups are contiguous, so
+        # the ranked rows of a group start at the same position as the group.
+        deviation = difference.sum(axis=1)
+        order = np.lexsort((np.arange(len(self)), -deviation, group_ids))
+        ranked = outliers[order]
+
+        # Number of outliers up to each row of its group, and the number of readings that can be removed per group
+        cumulative = np.cumsum(ranked)
+        group_count = cumulative - np.append(0, cumulative)[starts][group_ids]
+        max_removable = np.maximum(np.diff(np.append(starts, len(self))) - min_remaining, 0)[group_ids]
+
+        remove = np.zeros(len(self), dtype=bool)
+        remove[order] = ranked & (group_count <= max_removable)
+        return remove
+
+    def average(self, weights='Number_of_stacks'):
+        """
+        Average the decays of each station-component group in a single pass, weighted by the number of stacks.
+        The metadata of the first reading of each group is kept, and the weights of the group are summed.
+        :param weights: str, metadata column used as weights. Readings are weighted equally if it isn't in the meta.
+        :return: DecayMatrix object, one reading per group
+        """
+        starts = self.get_group_starts()
+        if len(starts) == 0:
+            return DecayMatrix(self.values.copy(), self.meta.copy())
+
+        if weights in self.meta.columns:
+            w = self.meta[weights].to_numpy(dtype=float)
+        else:
+            w = np.ones(len(self), dtype=float)
+
+        sums = np.add.reduceat(self.values * w[:, None], starts, axis=0)
+        total_weights = np.add.reduceat(w, starts)
+
+        # Fall back to an un-weighted mean for groups without any weight
+        no_weight = total_weights == 0
+        if no_weight.any():
+            counts = np.diff(np.append(starts, len(self)))
+            sums[no_weight] = np.add.reduceat(self.values, starts, axis=0)[no_weight]
+            total_weights = np.where(no_weight, counts, total_weights)
+
+        meta = self.meta.iloc[starts].copy()
+        if weights in meta.columns:
+            meta[weights] = np.add.reduceat(self.meta[weights].to_numpy(), starts)
+        return DecayMatrix(sums / total_weights[:, None], meta)
+
+    def split(self, channel_mask):
+        """
+        Keep only the channels selected by the mask.
+        :param channel_mask: boolean numpy array, one value per channel, True for channels to keep.
+        :return: DecayMatrix object
+        """
+        channel_mask = np.asarray(channel_mask, dtype=bool)
+        return DecayMatrix(self.values[:, channel_mask], self.meta)
+
+    def filter(self, mask):
+        """
+        Return a new DecayMatrix with only the rows where the mask is True. Row order is kept.
+        :param mask: boolean numpy array, one value per row
+        :return: DecayMatrix object
+        """
+        mask = np.asarray(mask, dtype=bool)
+        return DecayMatrix(self.values[mask], self.meta.loc[mask])
+
+    def invalid_rows(self):
+        """
+        Find the readings with INF or NaN values, in one pass over the whole matrix.
+        :return: boolean numpy array, one value per row, True where any channel of the reading is INF or NaN.
+        """
+        return ~np.isfinite(self.values).all(axis=1)
+
+    def to_readings(self):
+        """
+        Return the decays as a Series of row views indexed the same as the original data, to be used as the Reading
+        column of PEMFile.data. The arrays are views of the matrix, so no decay values are copied.
+        :return: pandas Series of 1D numpy arrays
+        """
+        return pd.Series(list(self.values), index=self.meta.index, name='Reading', dtype=object)
+
+
+def find_invalid_readings(data):
+    """
+    Return the readings of a PEMFile's data that have INF or NaN values, i.e. corrupt readings of a DMP file.
+    :param data: pandas DataFrame, PEMFile.data
+    :return: pandas DataFrame, rows of data, in the order of data
+    """
+    if data.empty:
+        return data.iloc[0:0]
+    matrix = DecayMatrix.from_data(data)
+    return data.loc[data.index.isin(matrix.meta.index[matrix.invalid_rows()])]
+
+
+def get_auto_clean_settings(pem_file):
+    """
+    Return the default threshold and window of the auto-clean, the same as in PEMPlotEditor.
+    :param pem_file: PEMFile object
+    :return: tuple, float threshold in the units of the file, and int number of channels compared.
+    """
+    if pem_file.units == 'pT':
+        threshold = 7 if "SQUID" in pem_file.get_survey_type() else 20
+    else:
+        threshold = 2 if pem_file.is_borehole() else 1.5
+
+    window_size = int(pem_file.get_offtime_channels().index[-1] / 4)
+    return threshold, window_size
+
+
+def find_outliers(data, channel_mask, threshold, window_size, min_remaining=2):
+    """
+    Find the outlier readings of a PEMFile's data (see DecayMatrix.find_outliers). Readings flagged for deletion are
+    not used. The readings are compared with the median of their station and component over the last window_size
+    off-time channels.
+    :param data: pandas DataFrame, PEMFile.data
+    :param channel_mask: boolean numpy array, True for the off-time channels
+    :param threshold: float, maximum difference with the median
+    :param window_size: int, number of off-time channels compared, from the last one.
+    :param min_remaining: int, minimum number of readings kept for each station and component
+    :return: pandas Index, index of the outlier readings in data
+    """
+    data = data[~data.Deleted.astype(bool)]
+    if data.empty:
+        return data.index
+
+    matrix = DecayMatrix.from_data(data)
+    channels = np.flatnonzero(np.asarray(channel_mask, dtype=bool))[-int(window_size):]
+    outliers = matrix.find_outliers(threshold, channels, min_remaining=min_remaining)
+    return matrix.meta.index[outliers]
+
+
+def auto_clean_pem(pem_file, threshold=None, window_size=None):
+    """
+    Flag the outlier readings of a PEMFile for deletion, the same as the auto-clean of PEMPlotEditor. Averaged files
+    are not changed. The PEMFile is modified in place.
+    :param pem_file: PEMFile object
+    :param threshold: float, maximum difference with the median of the station. Defaults to the PEMPlotEditor default.
+    :param window_size: int, number of channels compared, from the last off-time channel. Defaults to the
+    PEMPlotEditor default.
+    :return: PEMFile object
+    """
+    if pem_file.is_averaged():
+        logger.info(f"{pem_file.filepath.name} is averaged and can't be auto-cleaned.")
+        return pem_file
+
+    default_threshold, default_window_size = get_auto_clean_settings(pem_file)
+    threshold = default_threshold if threshold is None else threshold
+    window_size = default_window_size if window_size is None else window_size
+
+    channel_mask = ~pem_file.channel_times.Remove.to_numpy(dtype=bool)
+    index = find_outliers(pem_file.data, channel_mask, threshold, window_size)
+    pem_file.data.loc[index, 'Deleted'] = True
+    logger.info(f"{len(index)} reading(s) of {pem_file.filepath.name} flagged for deletion.")
+    return pem_file
+
+
+def average_pem(pem_file):
+    """
+    Average the data of a PEMFile. Each station-component group is reduced to a single reading, using a weighted
+    average of the decays with the number of stacks as weights. Readings flagged for deletion are not used.
+    The PEMFile is modified in place.
+    :param pem_file: PEMFile object
+    :return: PEMFile object
+    """
+    if pem_file.is_averaged():
+        logger.info(f"{pem_file.filepath.name} is already averaged.")
+        return pem_file
+
+    data = pem_file.data[~pem_file.data.Deleted.astype(bool)]
+    matrix = DecayMatrix.from_data(data).average()
+
+    # The first reading of each group is used as the template for the averaged reading
+    averaged_data = data.loc[matrix.meta.index].copy()
+    averaged_data['Number_of_stacks'] = matrix.meta.Number_of_stacks.to_numpy()
+    averaged_data['Reading'] = matrix.to_readings()
+
+    pem_file.data = averaged_data.reset_index(drop=True)
+    pem_file.number_of_readings = len(pem_file.data)
+    return pem_file
+
+
+def split_pem(pem_file):
+    """
+    Remove the on-time channels of a PEMFile, using the Remove column of the channel times table.
+    The PEMFile is modified in place.
+    :param pem_file: PEMFile object
+    :return: PEMFile object
+    """
+    if pem_file.is_split():
+        logger.info(f"{pem_file.filepath.name} is already split.")
+        return pem_file
+
+    channel_mask = ~pem_file.channel_times.Remove.to_numpy(dtype=bool)
+    if not pem_file.data.empty:
+        matrix = DecayMatrix.from_data(pem_file.data).split(channel_mask)
+        pem_file.data['Reading'] = matrix.to_readings()
+
+    pem_file.channel_times = pem_file.channel_times[channel_mask].reset_index(drop=True)
+    pem_file.number_of_channels = len(pem_file.channel_times)
+    return pem_file
@@ -0,0 +1,248 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src import __version__, app_data_dir
+
+logger = logging.getLogger(__name__)
+
+# Increment when the layout of the cached files changes, or when a parser change makes the cached files out of date.
+CACHE_FORMAT_VERSION = 1
+PARSER_VERSION = f"{__version__}-{CACHE_FORMAT_VERSION}"
+# Temporary files older than this (in seconds) were left by a process that was stopped while writing, and are removed
+# by the eviction.
+STALE_TEMP_AGE = 3600
+
+
+def _is_json_value(value):
+    return value is None or isinstance(value, (str, bool, int, float))
+
+
+class ParsedFileCache:
+    """
+    On-disk cache of parsed PEM and DMP files, so unchanged files don't need to be parsed again.
+    Each entry is a .npz file holding the decay values (as one (readings x channels) array) and the numeric columns of
+    the data, and a .json header holding the key, the simple header values and the column layout. Objects that can't
+    be stored as arrays or JSON (GPS objects, channel times, RAD tools) are pickled into the .npz file.
+    Entries are keyed by the absolute path, size and modification time of the file and the parser version, so a
+    changed file is never loaded from the cache. The least recently used entries are removed when the total size of
+    the cache is larger than max_size.
+    """
+    def __init__(self, folder=None, max_size=1024 ** 3):
+        """
+        :param folder: str or Path, folder of the cache. Defaults to a folder in the app data folder.
+        :param max_size: int, maximum size of the cache in bytes.
+        """
+        self.folder = Path(folder) if folder is not None else app_data_dir.joinpath("cache", "parsed_files")
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+
+    @staticmethod
+    def get_key(filepath, kind):
+        """
+        :param filepath: str or Path
+        :param kind: str, type of parser, i.e. 'pem' or 'dmp'
+        :return: tuple, str key of the entry and dict of the file information the key is made from
+        """
+        filepath = Path(filepath).absolute()
+        stat = filepath.stat()
+        info = {'filepath': str(filepath), 'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'kind': kind,
+                'version': PARSER_VERSION}
+        key = hashlib.sha1(json.dumps(info, sort_keys=True).encode()).hexdigest()
+        return key, info
+
+    def load(self, filepath, kind='pem'):
+        """
+        Load a parsed file from the cache.
+        :param filepath: str or Path
+        :param kind: str, type of parser, i.e. 'pem' or 'dmp'
+        :return: tuple, PEMFile object and the extra object stored with it, or None if the file isn't cached.
+        """
+        try:
+            key, info = self.get_key(filepath, kind)
+        except OSError:
+            return None
+
+        header_file, array_file = self.folder.joinpath(f"{key}.json"), self.folder.joinpath(f"{key}.npz")
+        if not header_file.exists() or not array_file.exists():
+            return None
+
+        try:
+            header = json.loads(header_file.read_text())
+            if header['info'] != info:
+                return None
+
+            with np.load(array_file, allow_pickle=False) as arrays:
+                arrays = dict(arrays)
+            objects = pickle.loads(arrays.pop('objects').tobytes())
+        except Exception as e:
+            logger.warning(f"Could not load {Path(filepath).name} from the cache: {e}")
+            self.remove(key)
+            return None
+
+        data = {}
+        for column in header['columns']:
+            if column == 'Reading' and 'readings' in arrays:
+                data[column] = list(arrays['readings'])
+            elif f"column_{column}" in arrays:
+                data[column] = arrays[f"column_{column}"]
+            else:
+                data[column] = objects['columns'][column]
+
+        pem_file = object.__new__(objects['class'])
+        pem_file.__dict__.update(header['attributes'])
+        pem_file.__dict__.update(objects['attributes'])
+        pem_file.data = pd.DataFrame(data, index=pd.Index(arrays['index']), columns=header['columns'])
+
+        os.utime(header_file)  # Used as the last access time for the eviction
+        logger.info(f"Loaded {Path(filepath).name} from the cache.")
+        return pem_file, objects['extra']
+
+    def store(self, filepath, pem_file, kind='pem', extra=None, evict=True):
+        """
+        Save a parsed file in the cache, and remove the least recently used entries if the cache is too large.
+        :param filepath: str or Path, filepath of the file which was parsed
+        :param pem_file: PEMFile object
+        :param kind: str, type of parser, i.e. 'pem' or 'dmp'
+        :param extra: object stored and returned with the PEMFile, such as the INF errors of a DMP file.
+        :param evict: bool, remove the least recently used entries. Files stored in a batch should not evict, and
+        evict() is called once after the batch instead.
+        """
+        try:
+            key, info = self.get_key(filepath, kind)
+        except OSError:
+            return
+
+        data = pem_file.data
+        arrays = {'index': data.index.to_numpy()}
+        objects = {'class': type(pem_file), 'attributes': {}, 'columns': {}, 'extra': extra}
+        header = {'info': info, 'attributes': {}, 'columns': list(data.columns)}
+
+        for column in data.columns:
+            values = data[column]
+            if column == 'Reading' and not values.empty and len({len(r) for r in values}) == 1:
+                arrays['readings'] = np.stack(values.to_numpy())
+            elif values.dtype != object and (pd.api.types.is_numeric_dtype(values) or
+                                             pd.api.types.is_datetime64_dtype(values)):
+                arrays[f"column_{column}"] = values.to_numpy()
+            else:
+                objects['columns'][column] = values.to_numpy()
+
+        for name, value in pem_file.__dict__.items():
+            if name == 'data':
+                continue
+            if _is_json_value(value):
+                header['attributes'][name] = value
+            else:
+                objects['attributes'][name] = value
+
+        try:
+            arrays['objects'] = np.frombuffer(pickle.dumps(objects, protocol=pickle.HIGHEST_PROTOCOL), dtype=np.uint8)
+            self._write_atomic(self.folder.joinpath(f"{key}.npz"), lambda f: np.savez(f, **arrays))
+            self._write_atomic(self.folder.joinpath(f"{key}.json"), lambda f: f.write(json.dumps(header).encode()))
+        except Exception as e:
+            logger.warning(f"Could not cache {Path(filepath).name}: {e}")
+            self.remove(key)
+            return
+
+        if evict:
+            self.evict()
+
+    def _write_atomic(self, filepath, write):
+        """
+        Write to a temporary file then rename it, so other processes never read a partially written entry.
+        :param filepath: Path
+        :param write: callable which writes to an opened binary file object
+        """
+        fd, temp_path = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                write(temp_file)
+            os.replace(temp_path, filepath)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def remove(self, key):
+        """
+        Delete an entry of the cache.
+        :param key: str
+        """
+        for suffix in ['.json', '.npz']:
+            try:
+                self.folder.joinpath(key + suffix).unlink()
+            except OSError:
+                pass
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the total size of the cache is at most max_size, and the
+        temporary files left by stopped processes.
+        """
+        now = time.time()
+        for temp_file in self.folder.glob('*.tmp'):
+            try:
+                if now - temp_file.stat().st_mtime > STALE_TEMP_AGE:
+                    temp_file.unlink()
+            except OSError:
+                continue
+
+        entries = []
+        for header_file in self.folder.glob('*.json'):
+            array_file = header_file.with_suffix('.npz')
+            try:
+                size = header_file.stat().st_size + (array_file.stat().st_size if array_file.exists() else 0)
+                entries.append((header_file.stat().st_mtime, size, header_file.stem))
+            except OSError:
+                continue
+
+        total_size = sum(entry[1] for entry in entries)
+        for _, size, key in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            self.remove(key)
+            total_size -= size
+            logger.info(f"Removed cache entry {key}.")
+
+    def clear(self):
+        """
+        Delete every entry of the cache.
+        """
+        for file in list(self.folder.glob('*.json')) + list(self.folder.glob('*.npz')):
+            file.unlink()
+
+
+def cached_parse(filepath, parse, kind='pem', cache=None, evict=True):
+    """
+    Parse a file using the cache.
+    :param filepath: str or Path
+    :param parse: callable, parses the filepath and returns a PEMFile, or a tuple of a PEMFile and an extra object.
+    :param kind: str, type of parser, i.e. 'pem' or 'dmp'. Files parsed by different parsers are cached separately.
+    :param cache: ParsedFileCache, defaults to the cache in the app data folder.
+    :param evict: bool, remove the least recently used entries after storing the file (see ParsedFileCache.store).
+    :return: return value of parse
+    """
+    cache = cache or ParsedFileCache()
+    cached = cache.load(filepath, kind=kind)
+    if cached is not None:
+        pem_file, extra = cached
+        return (pem_file, extra) if kind == 'dmp' else pem_file
+
+    t0 = time.time()
+    result = parse(filepath)
+    if kind == 'dmp':
+        pem_file, extra = result
+    else:
+        pem_file, extra = result, None
+    logger.debug(f"Parsed {Path(filepath).name} in {time.time() - t0:.2f}s.")
+    cache.store(filepath, pem_file, kind=kind, extra=extra, evict=evict)
+    return result
@@ -0,0 +1,96 @@
+import copy
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def _share_array(array):
+    """
+    Return a read-only view of an array, so the copy shares the memory of the original but can't write into it.
+    :param array: numpy array or any other object
+    :return: numpy array view, or the object itself if it isn't an array
+    """
+    if not isinstance(array, np.ndarray):
+        return array
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+def _copy_data(data):
+    """
+    Copy the data frame of a PEMFile, sharing the decay arrays of the Reading column with the original.
+    The columns of the data frame are copied, which for the object columns only copies the references. The decays of
+    the copy are read-only views of the decays of the original, so processing that replaces the Reading values
+    (e.g. data.Reading * -1) works as normal, and the memory of the decays is only duplicated for the readings that
+    are actually changed. Writing into a shared decay in place raises an error instead of changing the original.
+    The RAD tool objects are small and are modified in place by some processing, so they are copied, once per object.
+    :param data: pandas DataFrame
+    :return: pandas DataFrame
+    """
+    data = data.copy(deep=True)
+
+    if 'Reading' in data.columns:
+        data['Reading'] = pd.Series([_share_array(r) for r in data.Reading.to_numpy()], index=data.index,
+                                    dtype=object)
+
+    if 'RAD_tool' in data.columns:
+        copies = {}
+
+        def copy_rad(rad):
+            if rad is None or isinstance(rad, float):
+                return rad
+            if id(rad) not in copies:
+                copies[id(rad)] = copy.copy(rad)
+            return copies[id(rad)]
+
+        data['RAD_tool'] = pd.Series([copy_rad(r) for r in data.RAD_tool.to_numpy()], index=data.index, dtype=object)
+    return data
+
+
+def _copy_attribute(value, memo):
+    """
+    Copy an attribute of a PEMFile other than the data. GPS objects and data frames (i.e. the channel times) are
+    small, so they are copied. Immutable values are shared.
+    :param value: any object
+    :param memo: dict, copies already made, by id of the original, so objects referenced twice are copied once.
+    :return: copy of the object
+    """
+    if id(value) in memo:
+        return memo[id(value)]
+
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        new_value = value.copy()
+    elif hasattr(value, 'df') and isinstance(value.df, pd.DataFrame):
+        # GPS objects (loop, line, collar, segments, geometry)
+        new_value = copy.copy(value)
+        memo[id(value)] = new_value
+        new_value.__dict__ = {key: _copy_attribute(val, memo) for key, val in value.__dict__.items()}
+    elif isinstance(value, (list, dict, set)):
+        new_value = copy.copy(value)
+    else:
+        return value
+
+    memo[id(value)] = new_value
+    return new_value
+
+
+def copy_pem(pem_file):
+    """
+    Fast copy of a PEMFile for tools that transform the file but must not change the original, such as the de-rotator,
+    the maps and the exporter. The decay arrays, which make up most of the memory of the file, are shared with the
+    original (see _copy_data), everything else is copied.
+    The protection is one-sided: the copy can't write into the shared decays, but the original can. Processing of
+    the original must replace its decays (e.g. data.Reading = data.Reading * -1, or a new Reading column) instead of
+    writing into them (reading *= -1, reading[...] = ...), otherwise the change also shows in every copy.
+    :param pem_file: PEMFile object
+    :return: PEMFile object
+    """
+    memo = {}
+    new_file = copy.copy(pem_file)
+    new_file.__dict__ = {key: _copy_data(value) if key == 'data' else _copy_attribute(value, memo)
+                         for key, value in pem_file.__dict__.items()}
+    return new_file
@@ -0,0 +1,195 @@
+import json
+import logging
+import mmap
+import os
+import re
+import threading
+from pathlib import Path
+
+from src import app_data_dir
+from src.pem.pem_summary import mark_modified
+
+logger = logging.getLogger(__name__)
+
+header_columns = ['Client', 'Grid', 'Line', 'Loop', 'Date', 'Survey_type', 'Components', 'Number_of_readings']
+
+# Header attributes of a PEMFile that can be edited from the PEMHub table
+header_attributes = ['date', 'client', 'grid', 'line_name', 'loop_name', 'current', 'coil_area']
+
+# Start of a reading header, e.g. "100N ZR1", which marks the start of the data section
+reading_start = re.compile(rb"^\s*[\w\-.]+\s+([XYZ])R\d+\s", re.IGNORECASE)
+reading_component = re.compile(rb"^\s*[\w\-.]+[ \t]+([XYZ])R\d+\s", re.IGNORECASE | re.MULTILINE)
+
+
+def parse_pem_header(filepath):
+    """
+    Read only the header of a PEM file: the tags and notes, then the client, grid, line, loop, date and survey lines.
+    Reading stops at the data section. The components are found by scanning the reading headers of the data section
+    without parsing the data.
+    :param filepath: str or Path
+    :return: dict with the keys in header_columns
+    """
+    header = dict.fromkeys(header_columns, '')
+    lines = []
+    data_offset = None
+
+    with open(filepath, 'rb') as byte_file:
+        offset = 0
+        for line in byte_file:
+            if reading_start.match(line):
+                data_offset = offset
+                break
+            offset += len(line)
+            text = line.decode('latin-1').strip()
+            if text and not text.startswith(('<', '~')):
+                lines.append(text)
+
+        if data_offset is not None and os.path.getsize(filepath) > 0:
+            with mmap.mmap(byte_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                components = set()
+                for match in reading_component.finditer(mm, data_offset):
+                    components.add(match.group(1).decode().upper())
+                    if len(components) == 3:
+                        break
+            header['Components'] = ''.join(sorted(components))
+
+    for key, value in zip(['Client', 'Grid', 'Line', 'Loop', 'Date'], lines):
+        header[key] = value
+
+    if len(lines) > 5:
+        survey_values = lines[5].split()
+        header['Survey_type'] = survey_values[0]
+        if survey_values[-1].isdigit():
+            header['Number_of_readings'] = int(survey_values[-1])
+    return header
+
+
+class PEMHeaderCache:
+    """
+    Persistent cache of the headers of PEM files, saved as JSON in the app data folder. Entries are keyed by the
+    absolute path of the file and are parsed again when the size or modification time of the file changes.
+    The cache can be updated in a background thread (see update) while the GUI reads it with lookup, which never
+    accesses the files.
+    """
+    def __init__(self, filepath=None):
+        """
+        :param filepath: str or Path, JSON file of the cache. Defaults to a file in the app data folder.
+        """
+        self.filepath = Path(filepath) if filepath is not None else app_data_dir.joinpath("pem_headers.json")
+        self.headers = {}
+        self.changed = False
+        self.lock = threading.Lock()
+        if self.filepath.exists():
+            try:
+                self.headers = json.loads(self.filepath.read_text())
+            except (ValueError, OSError) as e:
+                logger.warning(f"Could not read the PEM header cache: {e}")
+
+    def lookup(self, filepath, size, mtime):
+        """
+        Return the cached header of a PEM file, without accessing the file.
+        :param filepath: str or Path
+        :param size: int, size of the file in bytes, i.e. from the project index
+        :param mtime: int, modification time of the file in ns
+        :return: dict with the keys in header_columns, or None if the header isn't cached or the file changed.
+        """
+        with self.lock:
+            entry = self.headers.get(str(Path(filepath).absolute()))
+        if entry is not None and entry['size'] == size and entry['mtime'] == mtime:
+            return entry['header']
+        return None
+
+    def get(self, filepath, size=None, mtime=None):
+        """
+        Return the header of a PEM file, parsing it if it isn't cached or the file changed.
+        :param filepath: str or Path
+        :param size: int, size of the file in bytes. The file is only accessed for its size and modification time if
+        they aren't given.
+        :param mtime: int, modification time of the file in ns
+        :return: dict with the keys in header_columns, or None if the file can't be read.
+        """
+        filepath = Path(filepath).absolute()
+        if size is None or mtime is None:
+            try:
+                stat = filepath.stat()
+            except OSError:
+                return None
+            size, mtime = stat.st_size, stat.st_mtime_ns
+
+        header = self.lookup(filepath, size, mtime)
+        if header is not None:
+            return header
+
+        try:
+            header = parse_pem_header(filepath)
+        except Exception as e:
+            logger.warning(f"Could not read the header of {filepath.name}: {e}")
+            return None
+
+        with self.lock:
+            self.headers[str(filepath)] = {'size': size, 'mtime': mtime, 'header': header}
+            self.changed = True
+        return header
+
+    def update(self, files, is_canceled=None):
+        """
+        Parse the headers of the files which aren't cached or changed. Meant to run in a background thread.
+        :param files: list of tuples, Path, size and modification time (ns) of each PEM file, i.e. from the project
+        index.
+        :param is_canceled: callable, the update stops when it returns True.
+        :return: bool, True if any header was parsed.
+        """
+        changed = False
+        for filepath, size, mtime in files:
+            if is_canceled is not None and is_canceled():
+                break
+            if self.lookup(filepath, size, mtime) is None and self.get(filepath, size, mtime) is not None:
+                changed = True
+        return changed
+
+    def prune(self):
+        """
+        Remove the entries of files which no longer exist.
+        """
+        for key in [key for key in list(self.headers) if not os.path.exists(key)]:
+            with self.lock:
+                self.headers.pop(key, None)
+                self.changed = True
+
+    def save(self):
+        """
+        Write the cache to disk if it changed.
+        """
+        with self.lock:
+            if not self.changed:
+                return
+            text = json.dumps(self.headers)
+            self.changed = False
+        temp_file = self.filepath.with_suffix('.tmp')
+        temp_file.write_text(text)
+        os.replace(temp_file, self.filepath)
+
+
+def update_headers(pem_files, **values):
+    """
+    Set header values of many PEMFiles at once, i.e. a shared client, grid or loop name. Only the files where a value
+    actually changes are modified, and their version is incremented once.
+    :param pem_files: list of PEMFile objects
+    :param values: new values, by attribute name (see header_attributes)
+    :return: list of the PEMFile objects that changed
+    """
+    invalid = [key for key in values if key not in header_attributes]
+    if invalid:
+        raise ValueError(f"{', '.join(invalid)} can't be updated. "
+                         f"Header attributes are {', '.join(header_attributes)}.")
+
+    changed = []
+    for pem_file in pem_files:
+        new_values = {key: value for key, value in values.items() if getattr(pem_file, key, None) != value}
+        if new_values:
+            for key, value in new_values.items():
+                setattr(pem_file, key, value)
+            mark_modified(pem_file)
+            changed.append(pem_file)
+    logger.debug(f"Updated the header of {len(changed)} of {len(pem_files)} files.")
+    return changed
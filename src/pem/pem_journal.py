@@ -0,0 +1,534 @@
+import logging
+import os
+import pickle
+import threading
+import zlib
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from src import app_temp_dir
+from src.pem.decay_matrix import average_pem, split_pem, auto_clean_pem
+from src.pem.pem_copy import copy_pem
+from src.pem.pem_summary import get_version, mark_modified
+
+logger = logging.getLogger(__name__)
+
+
+class JournalError(Exception):
+    """
+    Raised when an operation can't be undone because the file no longer matches the recorded delta.
+    """
+    pass
+
+
+class PackedArray:
+    """
+    Numeric array compressed with zlib. The compressed bytes are kept in memory until they are moved to a file with
+    spill().
+    """
+
+    def __init__(self, array):
+        """
+        :param array: numpy array of a numeric or bool dtype
+        """
+        array = np.ascontiguousarray(array)
+        self.dtype = array.dtype
+        self.shape = array.shape
+        self._bytes = zlib.compress(array.tobytes(), 1)
+        self.filepath = None
+
+    @property
+    def nbytes(self):
+        """
+        Memory used by the compressed array, 0 once it is moved to a file.
+        :return: int
+        """
+        return len(self._bytes) if self._bytes is not None else 0
+
+    def spill(self, filepath):
+        """
+        Move the compressed bytes to a file to free the memory.
+        :param filepath: Path
+        """
+        if self._bytes is None:
+            return
+        filepath.write_bytes(self._bytes)
+        self.filepath = filepath
+        self._bytes = None
+
+    def unpack(self):
+        """
+        :return: numpy array, writable copy of the original array
+        """
+        compressed = self._bytes if self._bytes is not None else self.filepath.read_bytes()
+        return np.frombuffer(bytearray(zlib.decompress(compressed)), dtype=self.dtype).reshape(self.shape)
+
+    def discard(self):
+        """
+        Delete the file of the array, if it was spilled.
+        """
+        if self.filepath is not None:
+            try:
+                os.remove(self.filepath)
+            except OSError:
+                pass
+            self.filepath = None
+
+
+class PackedObject(PackedArray):
+    """
+    Any picklable object (i.e. a data frame) compressed with zlib, counted and spilled the same as a PackedArray.
+    """
+
+    def __init__(self, obj):
+        """
+        :param obj: picklable object
+        """
+        self.dtype = None
+        self.shape = None
+        self._bytes = zlib.compress(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL), 1)
+        self.filepath = None
+
+    def unpack(self):
+        """
+        :return: copy of the original object
+        """
+        compressed = self._bytes if self._bytes is not None else self.filepath.read_bytes()
+        return pickle.loads(zlib.decompress(compressed))
+
+
+def stack_readings(data):
+    """
+    Return the decays of a data frame as a 2D array, one row per reading.
+    :param data: pandas DataFrame, PEMFile.data
+    :return: 2D numpy array
+    """
+    if data.empty:
+        return np.empty((0, 0))
+    return np.stack(data.Reading.to_numpy()).astype(float)
+
+
+def _set_readings(data, values):
+    """
+    Replace the Reading column of a data frame with the rows of a 2D array.
+    :param data: pandas DataFrame, PEMFile.data
+    :param values: 2D numpy array, one row per reading
+    """
+    if len(values) != len(data):
+        raise JournalError(f"The file has {len(data)} readings but {len(values)} were recorded.")
+    data['Reading'] = pd.Series(list(values), index=data.index, dtype=object)
+
+
+# Capture and restore functions of the operations. capture is called with the PEMFile and the arguments of the
+# operation before the file is changed, and returns the delta. restore is called with the PEMFile, the delta and the
+# arguments of the operation, and reverts the change.
+def _capture_data(pem_file, *args):
+    # Averaging replaces the data frame, so the whole data frame is kept, the decays as an array and the other columns
+    # as a pickled data frame.
+    data = pem_file.data
+    return {'meta': PackedObject(data.drop(columns='Reading')), 'columns': list(data.columns),
+            'readings': PackedArray(stack_readings(data)),
+            'number_of_readings': getattr(pem_file, 'number_of_readings', len(data))}
+
+
+def _restore_data(pem_file, delta, *args):
+    data = delta['meta'].unpack()
+    data['Reading'] = pd.Series(list(delta['readings'].unpack()), index=data.index, dtype=object)
+    pem_file.data = data[delta['columns']]
+    pem_file.number_of_readings = delta['number_of_readings']
+
+
+def _capture_readings(pem_file, *args):
+    return {'readings': PackedArray(stack_readings(pem_file.data))}
+
+
+def _restore_readings(pem_file, delta, *args):
+    if pem_file.data.empty:
+        return
+    _set_readings(pem_file.data, delta['readings'].unpack())
+
+
+def _capture_channels(pem_file, *args):
+    # Only the values of the removed channels are kept
+    remove = pem_file.channel_times.Remove.to_numpy(dtype=bool)
+    removed = stack_readings(pem_file.data)[:, remove] if not pem_file.data.empty else np.empty((0, 0))
+    return {'remove': remove, 'removed': PackedArray(removed), 'channel_times': pem_file.channel_times,
+            'number_of_channels': pem_file.number_of_channels}
+
+
+def _restore_channels(pem_file, delta, *args):
+    remove = delta['remove']
+    if not pem_file.data.empty:
+        values = stack_readings(pem_file.data)
+        if values.shape[1] != np.count_nonzero(~remove):
+            raise JournalError(f"The file has {values.shape[1]} channels but {np.count_nonzero(~remove)} were "
+                               f"recorded.")
+        full = np.empty((len(values), len(remove)))
+        full[:, ~remove] = values
+        full[:, remove] = delta['removed'].unpack()
+        _set_readings(pem_file.data, full)
+    pem_file.channel_times = delta['channel_times'].copy()
+    pem_file.number_of_channels = delta['number_of_channels']
+
+
+def _capture_deleted(pem_file, *args):
+    return {'deleted': PackedArray(pem_file.data.Deleted.to_numpy(dtype=bool))}
+
+
+def _restore_deleted(pem_file, delta, *args):
+    deleted = delta['deleted'].unpack()
+    if len(deleted) != len(pem_file.data):
+        raise JournalError(f"The file has {len(pem_file.data)} readings but {len(deleted)} were recorded.")
+    pem_file.data['Deleted'] = deleted
+
+
+def _capture_stations(pem_file, *args):
+    return {col: PackedObject(pem_file.data[col].to_numpy()) for col in ['Station', 'cStation']
+            if col in pem_file.data.columns}
+
+
+def _restore_stations(pem_file, delta, *args):
+    for col, packed in delta.items():
+        values = packed.unpack()
+        if len(values) != len(pem_file.data):
+            raise JournalError(f"The file has {len(pem_file.data)} readings but {len(values)} were recorded.")
+        pem_file.data[col] = values
+
+
+Operation = namedtuple('Operation', ['apply', 'capture', 'restore', 'tag'])
+
+# Operations that can be recorded in the journal, by name. apply takes the PEMFile and the arguments of the operation
+# and returns the PEMFile. The tag is used in the name of the backup of the file before the operation.
+operations = {
+    'average': Operation(lambda pem_file: average_pem(pem_file), _capture_data, _restore_data, 'A'),
+    'split': Operation(lambda pem_file: split_pem(pem_file), _capture_channels, _restore_channels, 'S'),
+    'auto_clean': Operation(lambda pem_file: auto_clean_pem(pem_file), _capture_deleted, _restore_deleted, 'AC'),
+    'scale_current': Operation(lambda pem_file, current: pem_file.scale_current(current),
+                               lambda pem_file, current: {'current': pem_file.current},
+                               lambda pem_file, delta, current: pem_file.scale_current(delta['current']), 'C'),
+    'scale_coil_area': Operation(lambda pem_file, coil_area: pem_file.scale_coil_area(coil_area),
+                                 lambda pem_file, coil_area: {'coil_area': pem_file.coil_area},
+                                 lambda pem_file, delta, coil_area: pem_file.scale_coil_area(delta['coil_area']),
+                                 'CA'),
+    'mag_offset': Operation(lambda pem_file: pem_file.mag_offset(), _capture_readings, _restore_readings, 'M'),
+    # Reversing the polarity twice gives back the same values, so only the component is recorded
+    'reverse_component': Operation(lambda pem_file, component: pem_file.reverse_component(component),
+                                   lambda pem_file, component: {},
+                                   lambda pem_file, delta, component: pem_file.reverse_component(component), 'R'),
+    'reverse_stations': Operation(lambda pem_file: pem_file.reverse_station_numbers(), _capture_stations,
+                                  _restore_stations, 'RS'),
+    'change_suffix': Operation(lambda pem_file, suffix: pem_file.change_suffix(suffix), _capture_stations,
+                               _restore_stations, 'SF'),
+}
+
+
+class JournalEntry:
+    """
+    An operation done on a PEMFile, with the delta needed to undo it.
+    """
+
+    def __init__(self, pem_file, operation, args):
+        """
+        :param pem_file: PEMFile object
+        :param operation: str, key of operations
+        :param args: tuple, arguments of the operation
+        """
+        self.pem_file = pem_file
+        self.operation = operation
+        self.args = args
+        self.delta = None
+
+    def _packed(self):
+        return [value for value in (self.delta or {}).values() if isinstance(value, PackedArray)]
+
+    @property
+    def nbytes(self):
+        return sum([packed.nbytes for packed in self._packed()])
+
+    def apply(self):
+        """
+        Record the delta and run the operation on the file.
+        """
+        operation = operations[self.operation]
+        delta = operation.capture(self.pem_file, *self.args)
+        operation.apply(self.pem_file, *self.args)
+        mark_modified(self.pem_file)
+        self.delta = delta
+
+    def restore(self, pem_file=None):
+        """
+        Undo the operation.
+        :param pem_file: PEMFile object, file to restore. Defaults to the file of the entry. Used to restore a copy
+        of the file while keeping the delta.
+        """
+        if pem_file is not None:
+            operations[self.operation].restore(pem_file, self.delta, *self.args)
+            mark_modified(pem_file)
+        else:
+            operations[self.operation].restore(self.pem_file, self.delta, *self.args)
+            mark_modified(self.pem_file)
+            self.discard()
+
+    def spill(self, folder):
+        for i, packed in enumerate(self._packed()):
+            packed.spill(folder.joinpath(f"{id(self)}_{i}.bin"))
+
+    def discard(self):
+        for packed in self._packed():
+            packed.discard()
+        self.delta = None
+
+
+class JournalBatch:
+    """
+    The operations done on several files by a single command of PEMHub, undone and redone together.
+    Operations can be applied from several threads at once.
+    """
+
+    def __init__(self, label):
+        """
+        :param label: str, name of the command, shown in the Undo and Redo menu items.
+        """
+        self.label = label
+        self.entries = []
+        self.versions = {}  # id of the PEMFile: version of the file when the batch was last applied or undone
+        self._lock = threading.Lock()
+
+    @property
+    def pem_files(self):
+        """
+        :return: list of the PEMFiles of the batch, without duplicates.
+        """
+        return list({id(entry.pem_file): entry.pem_file for entry in self.entries}.values())
+
+    def apply(self, pem_file, operation, *args):
+        """
+        Run an operation on a file and record it in the batch.
+        :param pem_file: PEMFile object
+        :param operation: str, key of operations
+        :param args: arguments of the operation
+        :return: PEMFile object
+        """
+        entry = JournalEntry(pem_file, operation, args)
+        entry.apply()
+        with self._lock:
+            self.entries.append(entry)
+        return pem_file
+
+    def stamp(self):
+        """
+        Record the current version of the files, to detect changes made outside of the journal.
+        """
+        self.versions = {id(pem_file): get_version(pem_file) for pem_file in self.pem_files}
+
+    def is_current(self):
+        """
+        :return: bool, False if a file was changed since the batch was last applied or undone.
+        """
+        return all([self.versions.get(id(pem_file)) == get_version(pem_file) for pem_file in self.pem_files])
+
+    def undo(self):
+        """
+        Undo the operations, last one first.
+        :return: list of tuples, PEMFile and error message of the operations that failed.
+        """
+        errors = []
+        for entry in reversed(self.entries):
+            try:
+                entry.restore()
+            except Exception as e:
+                logger.error(f"Could not undo {entry.operation} of {entry.pem_file.filepath.name}: {e}")
+                errors.append((entry.pem_file, str(e)))
+        return errors
+
+    def redo(self):
+        """
+        Run the operations again, recording new deltas.
+        :return: list of tuples, PEMFile and error message of the operations that failed.
+        """
+        errors = []
+        for entry in self.entries:
+            try:
+                entry.apply()
+            except Exception as e:
+                logger.error(f"Could not redo {entry.operation} of {entry.pem_file.filepath.name}: {e}")
+                errors.append((entry.pem_file, str(e)))
+        return errors
+
+    def remove_file(self, pem_file):
+        for entry in [entry for entry in self.entries if entry.pem_file is pem_file]:
+            entry.discard()
+            self.entries.remove(entry)
+        self.versions.pop(id(pem_file), None)
+
+    def discard(self):
+        for entry in self.entries:
+            entry.discard()
+
+
+class PEMJournal:
+    """
+    Undo and redo history of the processing done in PEMHub. Instead of writing a backup of each file before it is
+    processed, the journal records the delta of each operation: the decays before averaging (compressed), the values of
+    the removed channels, the previous current or coil area, the reversed component, or the previous station names.
+    Deltas are kept in memory up to max_memory, then the oldest are moved to files in the temp folder. Backups of the
+    files as they were before processing are only written when asked for, with write_backups.
+    """
+
+    def __init__(self, max_memory=256 * 1024 ** 2, max_batches=100, folder=None):
+        """
+        :param max_memory: int, bytes of compressed deltas kept in memory.
+        :param max_batches: int, number of commands that can be undone.
+        :param folder: Path, folder of the deltas moved out of memory. Defaults to a folder in the app temp folder.
+        """
+        self.max_memory = max_memory
+        self.max_batches = max_batches
+        self.folder = folder or app_temp_dir.joinpath("journal", str(os.getpid()))
+        self.undo_stack = []
+        self.redo_stack = []
+        self.backed_up = set()  # id of the PEMFiles whose backup was written
+
+    @property
+    def undo_batch(self):
+        return self.undo_stack[-1] if self.undo_stack else None
+
+    @property
+    def redo_batch(self):
+        return self.redo_stack[-1] if self.redo_stack else None
+
+    @property
+    def nbytes(self):
+        return sum([entry.nbytes for batch in self.undo_stack for entry in batch.entries])
+
+    @staticmethod
+    def batch(label):
+        """
+        Create a batch, to be added to the journal with push once the operations are done.
+        :param label: str
+        :return: JournalBatch object
+        """
+        return JournalBatch(label)
+
+    def push(self, batch):
+        """
+        Add a batch to the undo history. The redo history is cleared.
+        :param batch: JournalBatch object
+        """
+        if not batch.entries:
+            return
+        batch.stamp()
+        self.undo_stack.append(batch)
+        for old_batch in self.redo_stack:
+            old_batch.discard()
+        self.redo_stack.clear()
+
+        while len(self.undo_stack) > self.max_batches:
+            self.undo_stack.pop(0).discard()
+        self._trim()
+
+    def _trim(self):
+        """
+        Move the oldest deltas to files until the deltas in memory fit in max_memory.
+        """
+        nbytes = self.nbytes
+        if nbytes <= self.max_memory:
+            return
+
+        self.folder.mkdir(parents=True, exist_ok=True)
+        for batch in self.undo_stack:
+            for entry in batch.entries:
+                entry_bytes = entry.nbytes
+                if entry_bytes:
+                    entry.spill(self.folder)
+                    nbytes -= entry_bytes
+                if nbytes <= self.max_memory:
+                    logger.debug(f"Journal deltas in memory: {nbytes / 1024 ** 2:.1f} MB.")
+                    return
+
+    def undo(self):
+        """
+        Undo the last batch.
+        :return: tuple, JournalBatch (None if there's nothing to undo) and list of (PEMFile, error message).
+        """
+        if not self.undo_stack:
+            return None, []
+        batch = self.undo_stack.pop()
+        errors = batch.undo()
+        self.redo_stack.append(batch)
+        return batch, errors
+
+    def redo(self):
+        """
+        Redo the last batch undone.
+        :return: tuple, JournalBatch (None if there's nothing to redo) and list of (PEMFile, error message).
+        """
+        if not self.redo_stack:
+            return None, []
+        batch = self.redo_stack.pop()
+        errors = batch.redo()
+        self.undo_stack.append(batch)
+        self._trim()
+        return batch, errors
+
+    def forget(self, pem_file):
+        """
+        Remove the operations of a file, i.e. when it is closed.
+        :param pem_file: PEMFile object
+        """
+        for stack in [self.undo_stack, self.redo_stack]:
+            for batch in stack:
+                batch.remove_file(pem_file)
+            stack[:] = [batch for batch in stack if batch.entries]
+        self.backed_up.discard(id(pem_file))
+
+    def get_entries(self, pem_file):
+        """
+        :param pem_file: PEMFile object
+        :return: list of JournalEntry, the operations done on the file that can be undone, oldest first.
+        """
+        return [entry for batch in self.undo_stack for entry in batch.entries if entry.pem_file is pem_file]
+
+    def get_original(self, pem_file):
+        """
+        Return a copy of a file as it was before the operations in the journal. The file itself isn't changed.
+        :param pem_file: PEMFile object
+        :return: PEMFile object
+        """
+        original = copy_pem(pem_file)
+        for entry in reversed(self.get_entries(pem_file)):
+            entry.restore(original)
+        return original
+
+    def write_backups(self, pem_files):
+        """
+        Write a backup of each file as it was before it was processed. Files without operations in the journal, or
+        whose backup was already written, are skipped.
+        :param pem_files: list of PEMFile objects
+        :return: int, number of backups written
+        """
+        count = 0
+        for pem_file in pem_files:
+            entries = self.get_entries(pem_file)
+            if not entries or id(pem_file) in self.backed_up:
+                continue
+            logger.info(f"Writing the backup of {pem_file.filepath.name}.")
+            self.get_original(pem_file).save(backup=True, tag=f"[-{operations[entries[0].operation].tag}]")
+            self.backed_up.add(id(pem_file))
+            count += 1
+        return count
+
+    def clear(self):
+        """
+        Clear the history and delete the files of the deltas.
+        """
+        for batch in [*self.undo_stack, *self.redo_stack]:
+            batch.discard()
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.backed_up.clear()
+        try:
+            self.folder.rmdir()
+        except OSError:
+            pass
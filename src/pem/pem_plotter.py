@@ -17,16 +17,15 @@ import matplotlib as mpl
 import matplotlib.pyplot as plt
 import natsort
 import numpy as np
-import pyqtgraph as pg
 from matplotlib.backends.backend_pdf import PdfPages
 from matplotlib import patheffects, patches, ticker, text, transforms, lines
 from scipy import stats
 
-from src.qt_py import CustomProgressDialog, auto_size_ax
+from src.mpl import auto_size_ax
 from src.mag_field.mag_field_calculator import MagneticFieldCalculator
 from src.pem import convert_station
-from src.pem.pem_file import PEMGetter
-from src.qt_py.ri_importer import RIFile
+from src.pem.decay_matrix import average_pem, split_pem
+from src.pem.pem_stream import parse_pem
 
 logger = logging.getLogger(__name__)
 
@@ -578,12 +577,12 @@ class ProfilePlotter:
     """
     def __init__(self, pem_file, profile_data, figure, x_min=None, x_max=None, hide_gaps=True):
         if isinstance(pem_file, str) and os.path.isfile(pem_file):
-            pem_file = PEMParser().parse(pem_file)
+            pem_file = parse_pem(pem_file)
 
         if not pem_file.is_averaged():
-            pem_file = pem_file.average()
+            pem_file = average_pem(pem_file)
         if not pem_file.is_split():
-            pem_file = pem_file.split()
+            pem_file = split_pem(pem_file)
 
         plt.style.use('default')
         self.pem_file = pem_file
@@ -966,6 +965,8 @@ class STEPPlotter(ProfilePlotter):
     def __init__(self, pem_file, ri_file, figure, x_min=None, x_max=None, hide_gaps=True):
         super().__init__(pem_file, None, figure, x_min=x_min, x_max=x_max, hide_gaps=hide_gaps)
         if isinstance(ri_file, str) and os.path.isfile(ri_file):
+            # Imported here so the printer can be used without Qt (see src.batch)
+            from src.qt_py.ri_importer import RIFile
             ri_file = RIFile().open(ri_file)
         self.ri_file = ri_file
         self.figure.subplots_adjust(left=0.170, bottom=0.07, right=0.958, top=0.885)
@@ -2934,11 +2935,13 @@ class PEMPrinter:
         self.label_hole_depths = kwargs.get('label_hole_depths')
         self.draw_segment_labels = kwargs.get('draw_segment_labels')
 
-    def print_files(self, save_path, files):
+    def print_files(self, save_path, files, progress=None):
         """
         Plot the files to a PDF document
         :param save_path: str, PDF document filepath
         :param files: list of zipped PEMFile and RIFile objects. RI files are optional.
+        :param progress: optional object used instead of the progress dialog, with the same setLabelText,
+        wasCanceled and += methods, and used as a context manager. Allows printing without a QApplication.
         """
         def save_plots(pem_files, ri_files, x_min, x_max):
             """
@@ -3175,7 +3178,10 @@ class PEMPrinter:
 
         with PdfPages(save_path + '.PDF') as pdf:
             global dlg
-            with CustomProgressDialog("Printing PDFs..", 0, num_pages, busyCursor=True) as dlg:
+            if progress is None:
+                from src.qt_py import CustomProgressDialog
+                progress = CustomProgressDialog("Printing PDFs..", 0, num_pages, busyCursor=True)
+            with progress as dlg:
                 # Save the borehole PDFs
                 for survey, files in unique_bhs.items():
                     if dlg.wasCanceled():
@@ -3244,7 +3250,7 @@ class PEMPrinter:
 
 if __name__ == '__main__':
     from PySide2.QtWidgets import QApplication
-    from src.pem.pem_file import PEMParser
+    from src.pem.pem_file import PEMParser, PEMGetter
 
     app = QApplication(sys.argv)
     pem_getter = PEMGetter()
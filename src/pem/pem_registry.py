@@ -0,0 +1,186 @@
+import logging
+import operator
+import os
+from bisect import bisect_right
+
+import natsort
+
+logger = logging.getLogger(__name__)
+
+# Natural sort key of a file name, the same order as natsort.os_sorted
+name_key = natsort.os_sort_keygen()
+
+
+def get_path_key(filepath):
+    """
+    Key of a filepath in the registry, the normalized absolute path.
+    :param filepath: str or Path
+    :return: str
+    """
+    return os.path.normcase(os.path.abspath(str(filepath)))
+
+
+class PEMRegistry(list):
+    """
+    Ordered list of the PEMFiles opened in PEMHub, where the position of a file is its row in the table.
+    On top of the list operations, files can be found by their filepath, and the position of a file is found without
+    searching the list. The natural sort key of each file name is kept so the position of a new file in the sorted
+    list is found by bisection instead of sorting all the files again.
+    Files are compared by identity. Call reindex() after changing the filepath of an opened file.
+    Every list operation that changes the list keeps the filepaths and positions up to date. Operations on slices
+    and reverse() rebuild them. Repeating the list (*=) is not supported, since a file can only be opened once.
+    """
+
+    def __init__(self, pem_files=()):
+        super().__init__()
+        self._keys = []  # Sort key of each file, in the same order as the files
+        self._paths = {}  # Path key: PEMFile
+        self._file_paths = {}  # id of the PEMFile: path key the file is registered with
+        self._positions = None  # id of the PEMFile: position. Re-built when needed after the list changes.
+        self.extend(pem_files)
+
+    def _register(self, pem_file):
+        key = get_path_key(pem_file.filepath)
+        self._paths[key] = pem_file
+        self._file_paths[id(pem_file)] = key
+
+    def _unregister(self, pem_file):
+        key = self._file_paths.pop(id(pem_file), None)
+        if key is not None and self._paths.get(key) is pem_file:
+            del self._paths[key]
+
+    def _get_positions(self):
+        if self._positions is None:
+            self._positions = {id(pem_file): i for i, pem_file in enumerate(self)}
+        return self._positions
+
+    def _normalize(self, i):
+        try:
+            i = operator.index(i)
+        except TypeError:
+            raise TypeError("PEMRegistry only supports integer indexes.")
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("PEMRegistry index out of range.")
+        return i
+
+    def _rebuild(self, pem_files):
+        """
+        Replace all the files, registering them again.
+        :param pem_files: list of PEMFile objects
+        """
+        self.clear()
+        self.extend(pem_files)
+
+    def insert(self, i, pem_file):
+        i = operator.index(i)
+        i = min(max(i + len(self) if i < 0 else i, 0), len(self))
+        super().insert(i, pem_file)
+        self._keys.insert(i, name_key(pem_file.filepath.name))
+        self._register(pem_file)
+        if i == len(self) - 1 and self._positions is not None:
+            self._positions[id(pem_file)] = i
+        else:
+            self._positions = None
+
+    def append(self, pem_file):
+        self.insert(len(self), pem_file)
+
+    def extend(self, pem_files):
+        for pem_file in pem_files:
+            self.append(pem_file)
+
+    def __iadd__(self, pem_files):
+        self.extend(pem_files)
+        return self
+
+    def __imul__(self, n):
+        raise TypeError("PEMRegistry can't be repeated, a file can only be opened once.")
+
+    def reverse(self):
+        self._rebuild(list(reversed(self)))
+
+    def __setitem__(self, i, pem_file):
+        if isinstance(i, slice):
+            pem_files = list(self)
+            pem_files[i] = pem_file
+            self._rebuild(pem_files)
+            return
+
+        i = self._normalize(i)
+        old_file = self[i]
+        self._unregister(old_file)
+        super().__setitem__(i, pem_file)
+        self._keys[i] = name_key(pem_file.filepath.name)
+        self._register(pem_file)
+        if self._positions is not None:
+            self._positions.pop(id(old_file), None)
+            self._positions[id(pem_file)] = i
+
+    def __delitem__(self, i):
+        if isinstance(i, slice):
+            pem_files = list(self)
+            del pem_files[i]
+            self._rebuild(pem_files)
+            return
+
+        i = self._normalize(i)
+        self._unregister(self[i])
+        super().__delitem__(i)
+        del self._keys[i]
+        self._positions = None
+
+    def pop(self, i=-1):
+        pem_file = self[i]
+        del self[i]
+        return pem_file
+
+    def remove(self, pem_file):
+        del self[self.index(pem_file)]
+
+    def clear(self):
+        super().clear()
+        self._keys.clear()
+        self._paths.clear()
+        self._file_paths.clear()
+        self._positions = None
+
+    def sort(self, key=None, reverse=False):
+        self._rebuild(sorted(self, key=key, reverse=reverse))
+
+    def index(self, pem_file, *args):
+        i = self._get_positions().get(id(pem_file))
+        if i is None or self[i] is not pem_file:
+            raise ValueError(f"{pem_file} is not in the registry.")
+        return i
+
+    def __contains__(self, pem_file):
+        return id(pem_file) in self._get_positions()
+
+    def find(self, filepath):
+        """
+        Return the opened file with the filepath.
+        :param filepath: str or Path
+        :return: PEMFile object, or None if no opened file has the filepath.
+        """
+        return self._paths.get(get_path_key(filepath))
+
+    def get_insertion_point(self, pem_file):
+        """
+        Position of a new file so the files stay in natural order of their file names. If the files are not in that
+        order, the position is still valid but the files won't be sorted.
+        :param pem_file: PEMFile object
+        :return: int
+        """
+        return bisect_right(self._keys, name_key(pem_file.filepath.name))
+
+    def reindex(self):
+        """
+        Update the filepaths and sort keys of the files, after the filepath of a file was changed.
+        """
+        self._paths.clear()
+        self._file_paths.clear()
+        for pem_file in self:
+            self._register(pem_file)
+        self._keys = [name_key(pem_file.filepath.name) for pem_file in self]
@@ -0,0 +1,212 @@
+import json
+import logging
+import os
+import pickle
+import queue
+import threading
+import time
+import uuid
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from src import app_data_dir
+from src.pem.pem_copy import copy_pem
+from src.pem.pem_summary import get_version
+
+logger = logging.getLogger(__name__)
+
+# Attributes of a PEMFile that are caches and are not saved in the session
+transient_attributes = ['summary']
+
+
+def dump_pem(pem_file):
+    """
+    Serialize a PEMFile with its in-memory state. The decays are saved as a single 2D array instead of one array per
+    reading, and the result is compressed.
+    :param pem_file: PEMFile object
+    :return: bytes
+    """
+    state = {key: value for key, value in pem_file.__dict__.items() if key not in transient_attributes}
+    data = state.get('data')
+    if isinstance(data, pd.DataFrame) and 'Reading' in data.columns and not data.empty:
+        try:
+            readings = np.stack(data.Reading.to_numpy())
+        except ValueError:
+            # Readings of different lengths are saved as they are
+            pass
+        else:
+            state['data'] = data.drop(columns='Reading')
+            state['_columns'] = list(data.columns)
+            state['_readings'] = readings
+    return zlib.compress(pickle.dumps((type(pem_file), state), protocol=pickle.HIGHEST_PROTOCOL), 1)
+
+
+def load_pem(blob):
+    """
+    Re-create a PEMFile serialized with dump_pem.
+    :param blob: bytes
+    :return: PEMFile object
+    """
+    cls, state = pickle.loads(zlib.decompress(blob))
+    if '_readings' in state:
+        data = state['data']
+        data['Reading'] = pd.Series(list(state.pop('_readings')), index=data.index, dtype=object)
+        state['data'] = data[state.pop('_columns')]
+
+    pem_file = cls.__new__(cls)
+    pem_file.__dict__.update(state)
+    return pem_file
+
+
+def _snapshot(pem_file):
+    """
+    Copy a PEMFile to be written in the background. copy_pem shares the decays with the original, which can still be
+    edited in place while the copy is written, so the decays are copied as well.
+    :param pem_file: PEMFile object
+    :return: PEMFile object
+    """
+    snapshot = copy_pem(pem_file)
+    data = snapshot.data
+    if isinstance(data, pd.DataFrame) and 'Reading' in data.columns and not data.empty:
+        readings = data.Reading.to_numpy()
+        try:
+            decays = list(np.stack(readings))
+        except ValueError:
+            decays = [np.array(r) for r in readings]
+        data['Reading'] = pd.Series(decays, index=data.index, dtype=object)
+    return snapshot
+
+
+def _write_atomic(filepath, content):
+    temp_file = filepath.with_suffix(filepath.suffix + '.tmp')
+    temp_file.write_bytes(content)
+    os.replace(temp_file, filepath)
+
+
+class PEMSession:
+    """
+    Snapshot of the files opened in PEMHub, so a session can be restored after a crash or a restart without parsing
+    the files again and without losing the unsaved changes. Each file is saved in its own compressed file, and only
+    the files that changed since the last save (see pem_summary.mark_modified) are written again. A JSON manifest keeps
+    the order of the files and the project information. The files are written in a background thread.
+    """
+
+    def __init__(self, folder=None):
+        """
+        :param folder: Path, folder of the session. Defaults to a folder in the app data folder.
+        """
+        self.folder = folder or app_data_dir.joinpath("session")
+        self.files_folder = self.folder.joinpath("files")
+        self.manifest_path = self.folder.joinpath("session.json")
+        # id of the PEMFile: PEMFile, ID of the file in the session and version last saved
+        self._files = {}
+        self._failed = set()  # IDs of the files that could not be written
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def _worker(self):
+        while True:
+            manifest, changed = self._queue.get()
+            try:
+                self._write(manifest, changed)
+            except Exception as e:
+                logger.error(f"Could not save the session: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, manifest, changed):
+        """
+        Write the changed files and the manifest, then delete the files that are no longer in the session.
+        :param manifest: dict
+        :param changed: list of tuples, ID in the session and PEMFile object
+        """
+        t0 = time.perf_counter()
+        self.files_folder.mkdir(parents=True, exist_ok=True)
+        for file_id, pem_file in changed:
+            try:
+                _write_atomic(self.files_folder.joinpath(file_id + '.bin'), dump_pem(pem_file))
+            except Exception as e:
+                logger.error(f"Could not save {pem_file.filepath.name} in the session: {e}")
+                with self._lock:
+                    self._failed.add(file_id)
+
+        _write_atomic(self.manifest_path, json.dumps(manifest).encode())
+
+        file_ids = set(manifest['files'])
+        for filepath in self.files_folder.glob('*.bin'):
+            if filepath.stem not in file_ids:
+                try:
+                    os.remove(filepath)
+                except OSError:
+                    pass
+        logger.debug(f"Saved {len(changed)} of {len(file_ids)} files in the session "
+                     f"({time.perf_counter() - t0:.2f}s).")
+
+    def save(self, pem_files, wait=False, **info):
+        """
+        Save the session. The changed files are copied (see _snapshot) so they can be written in the background while
+        they are being edited.
+        :param pem_files: list of PEMFile objects, in the order of the table.
+        :param wait: bool, wait until the session is written.
+        :param info: JSON serializable project information saved in the manifest, i.e. the CRS and the header.
+        """
+        with self._lock:
+            failed, self._failed = self._failed, set()
+
+        files, changed = {}, []
+        for pem_file in pem_files:
+            entry = self._files.get(id(pem_file))
+            if entry is None or entry[0] is not pem_file:
+                entry = (pem_file, uuid.uuid4().hex, None)
+            if entry[2] != get_version(pem_file) or entry[1] in failed:
+                changed.append((entry[1], _snapshot(pem_file)))
+                entry = (pem_file, entry[1], get_version(pem_file))
+            files[id(pem_file)] = entry
+        self._files = files
+
+        manifest = dict(info, files=[files[id(pem_file)][1] for pem_file in pem_files], saved=time.time())
+        self._queue.put((manifest, changed))
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._worker, daemon=True)
+            self._thread.start()
+        if wait:
+            self._queue.join()
+
+    def get_manifest(self):
+        """
+        :return: dict, manifest of the saved session, or None if there is no saved session or it has no files.
+        """
+        if not self.manifest_path.exists():
+            return None
+        try:
+            manifest = json.loads(self.manifest_path.read_text())
+        except (ValueError, OSError) as e:
+            logger.warning(f"Could not read the session: {e}")
+            return None
+        return manifest if manifest.get('files') else None
+
+    def load(self, is_canceled=None):
+        """
+        Load the files of the saved session. The loaded files aren't written again until they are changed.
+        :param is_canceled: callable, loading stops when it returns True.
+        :return: tuple, manifest dict (None if there is no saved session) and list of PEMFile objects, in order.
+        """
+        manifest = self.get_manifest()
+        if manifest is None:
+            return None, []
+
+        pem_files = []
+        for file_id in manifest['files']:
+            if is_canceled is not None and is_canceled():
+                break
+            try:
+                pem_file = load_pem(self.files_folder.joinpath(file_id + '.bin').read_bytes())
+            except Exception as e:
+                logger.error(f"Could not restore file {file_id} of the session: {e}")
+                continue
+            self._files[id(pem_file)] = (pem_file, file_id, get_version(pem_file))
+            pem_files.append(pem_file)
+        return manifest, pem_files
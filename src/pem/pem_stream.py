@@ -0,0 +1,293 @@
+import logging
+import os
+import re
+import time
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src import app_temp_dir
+from src.pem import convert_station
+from src.pem.pem_cache import ParsedFileCache, cached_parse
+from src.pem.decay_matrix import find_invalid_readings
+from src.pem.pem_file import PEMParser, DMPParser, RADTool
+from src.process_pool import process_map
+from src.text_io import iter_lines, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Files at least this large (in bytes) are parsed with the streaming parser by parse_pem.
+STREAM_SIZE_THRESHOLD = 32 * 1024 ** 2
+
+# Reading header: Station, Component + R-index, Gain, Rx type, ZTS, coil delay, stacks, readings per set, reading number
+reading_header = re.compile(
+    r"^\s*(?P<Station>[\w\-.]+)\s+(?P<Component>[XYZ])R(?P<Reading_index>\d+)\s+G?(?P<Gain>\d+)\s+(?P<Rx_type>\w)\s+"
+    r"(?P<ZTS>-?[\d.]+)\s+(?P<Coil_delay>-?\d+)\s+(?P<Number_of_stacks>\d+)\s+(?P<Readings_per_set>\d+)\s+"
+    r"(?P<Reading_number>\d+)", re.IGNORECASE)
+rad_line = re.compile(r"^\s*D\d", re.IGNORECASE)
+
+numeric_columns = ['Reading_index', 'Gain', 'ZTS', 'Coil_delay', 'Number_of_stacks', 'Readings_per_set',
+                   'Reading_number']
+
+
+class GrowableArray:
+    """
+    Preallocated 2D numpy buffer that rows are appended to. The capacity doubles when the buffer is full, so appending
+    is amortized O(1), and finalize() shrinks the buffer in place to the number of rows written.
+    """
+    def __init__(self, width, dtype=float, capacity=4096):
+        """
+        :param width: int, number of columns
+        :param dtype: numpy dtype of the buffer
+        :param capacity: int, number of rows initially allocated
+        """
+        self.width = width
+        self.size = 0
+        self._buffer = np.empty((max(capacity, 1), width), dtype=dtype)
+
+    def __len__(self):
+        return self.size
+
+    def append(self, row):
+        """
+        Copy a row into the buffer.
+        :param row: 1D array-like of length width
+        """
+        if self.size == len(self._buffer):
+            self._buffer.resize((len(self._buffer) * 2, self.width), refcheck=False)
+        self._buffer[self.size] = row
+        self.size += 1
+
+    def finalize(self):
+        """
+        Release the unused capacity and return the filled array. The buffer should not be appended to afterwards.
+        :return: 2D numpy array, (rows x width)
+        """
+        self._buffer.resize((self.size, self.width), refcheck=False)
+        return self._buffer
+
+
+class StreamingPEMParser:
+    """
+    Low-memory parser for large PEM files. The file is read line by line, and the decay values and numeric header
+    values of every reading are appended directly into growable numpy buffers, so the peak memory use stays near the
+    size of the final arrays. The file header (tags, notes, GPS and channel times) is parsed by PEMParser from a
+    temporary file containing the header and the first reading only.
+    The decays in the Reading column are row views of a single (readings x channels) array.
+    """
+    def __init__(self):
+        self.filepath = None
+
+    def parse(self, filepath):
+        """
+        Parse a PEM file.
+        :param filepath: str or Path
+        :return: PEMFile object
+        """
+        self.filepath = Path(filepath)
+        t0 = time.time()
+        lines = iter_lines(self.filepath)
+
+        # Everything before the first reading header is the file header
+        header_lines = []
+        match = None
+        for line in lines:
+            match = reading_header.match(line)
+            if match:
+                break
+            header_lines.append(line)
+
+        if match is None:
+            raise ValueError(f"No readings found in {self.filepath.name}.")
+
+        template, values, meta, rad_lines = self._read_data(lines, header_lines, match)
+
+        stations = meta.pop('Station')
+        data = pd.DataFrame({'Station': stations, 'Component': meta.pop('Component')})
+        for i, column in enumerate(numeric_columns):
+            column_values = meta['numeric'][:, i]
+            data[column] = column_values if column == 'ZTS' else column_values.astype(int)
+        data.insert(4, 'Rx_type', meta.pop('Rx_type'))
+
+        # Readings with the same RAD tool line share the same RAD_ID and RADTool object
+        rad_ids, unique_rads = pd.factorize(pd.Series(rad_lines, dtype=object).fillna(''))
+        rad_tools = np.array([RADTool().from_match(rad) if rad else None for rad in unique_rads], dtype=object)
+        data['RAD_tool'] = rad_tools[rad_ids]
+        data['Reading'] = pd.Series(list(values), index=data.index, dtype=object)
+        data['RAD_ID'] = rad_ids
+        data['Deleted'] = False
+        data['Overload'] = False
+        data['Timestamp'] = pd.NaT
+
+        unique_stations, inverse = np.unique(np.asarray(stations, dtype=str), return_inverse=True)
+        data['cStation'] = np.array([convert_station(s) for s in unique_stations], dtype=int)[inverse]
+
+        template.data = self._conform(data, template.data)
+        template.filepath = self.filepath
+        template.number_of_readings = len(data)
+        logger.info(f"Streamed {len(data)} readings of {self.filepath.name} in {time.time() - t0:.2f}s.")
+        return template
+
+    def _read_data(self, lines, header_lines, first_match):
+        """
+        Stream the data section of the file into the buffers.
+        :param lines: generator of the remaining lines of the file
+        :param header_lines: list of str, lines of the file header
+        :param first_match: re.Match of the first reading header
+        :return: tuple, template PEMFile, (readings x channels) numpy array, dict of metadata, list of RAD lines
+        """
+        meta = {'Station': [], 'Component': [], 'Rx_type': []}
+        rad_lines = []
+        template = None
+        numeric = GrowableArray(len(numeric_columns))
+        values = None
+        reading_values = []
+        first_reading = [first_match.string]
+        names = {}  # Repeated station names share the same string object
+
+        def add_reading(match, rad, decay):
+            groups = match.groupdict()
+            station = groups['Station']
+            meta['Station'].append(names.setdefault(station, station))
+            meta['Component'].append(names.setdefault(groups['Component'].upper(), groups['Component'].upper()))
+            meta['Rx_type'].append(names.setdefault(groups['Rx_type'], groups['Rx_type']))
+            numeric.append([float(groups[column]) for column in numeric_columns])
+            rad_lines.append(names.setdefault(rad, rad) if rad is not None else None)
+
+            decay = np.concatenate(decay) if decay else np.array([])
+            if len(decay) != values.width:
+                raise ValueError(f"Reading {groups['Reading_number']} of station {station} has {len(decay)} values "
+                                 f"but {values.width} channels were expected.")
+            values.append(decay)
+
+        match, rad = first_match, None
+        for line in lines:
+            next_match = reading_header.match(line)
+
+            if template is None:
+                if next_match:
+                    template = self._parse_template(header_lines + first_reading)
+                    values = GrowableArray(len(template.channel_times))
+                else:
+                    first_reading.append(line)
+
+            if next_match:
+                add_reading(match, rad, reading_values)
+                match, rad, reading_values = next_match, None, []
+            elif rad_line.match(line):
+                rad = line.strip()
+            elif line.strip():
+                reading_values.append(tokenize(line))
+
+        if template is None:
+            template = self._parse_template(header_lines + first_reading)
+            values = GrowableArray(len(template.channel_times))
+        add_reading(match, rad, reading_values)
+
+        meta['numeric'] = numeric.finalize()
+        return template, values.finalize(), meta, rad_lines
+
+    def _conform(self, data, reference):
+        """
+        Give the streamed data the columns, column order and dtypes of the data of the regular parser, so both parsers
+        produce the same frame.
+        :param data: DataFrame, streamed readings
+        :param reference: DataFrame, data of the template parsed by PEMParser
+        :return: DataFrame
+        """
+        missing = reference.columns.difference(data.columns)
+        if not missing.empty:
+            raise ValueError(f"Columns {', '.join(missing)} of {self.filepath.name} can't be streamed.")
+
+        data = data.reindex(columns=reference.columns)
+        for column, dtype in reference.dtypes.items():
+            if data[column].dtype != dtype:
+                try:
+                    data[column] = data[column].astype(dtype)
+                except (TypeError, ValueError) as e:
+                    raise ValueError(f"Column {column} of {self.filepath.name} can't be cast to {dtype}: {e}")
+        return data
+
+    def _parse_template(self, lines):
+        """
+        Parse the header of the file with PEMParser, using a temporary file with the header and the first reading.
+        :param lines: list of str
+        :return: PEMFile object
+        """
+        temp_file = app_temp_dir.joinpath(f"stream_{os.getpid()}_{self.filepath.name}")
+        try:
+            temp_file.write_text('\n'.join(lines) + '\n')
+            return PEMParser().parse(temp_file)
+        finally:
+            if temp_file.exists():
+                temp_file.unlink()
+
+
+def parse_pem(filepath, stream=None, use_cache=True, evict_cache=True):
+    """
+    Parse a PEM file, using the streaming parser for large files.
+    :param filepath: str or Path
+    :param stream: bool, force (True) or disable (False) the streaming parser. If None, the streaming parser is used
+    for files of at least STREAM_SIZE_THRESHOLD bytes.
+    :param use_cache: bool, load the file from the parsed file cache if it hasn't changed since it was last parsed.
+    :param evict_cache: bool, remove the least recently used entries of the cache after caching the file. Batches
+    evict once at the end instead.
+    :return: PEMFile object
+    """
+    if use_cache:
+        return cached_parse(filepath, lambda f: parse_pem(f, stream=stream, use_cache=False), evict=evict_cache)
+
+    if stream is None:
+        stream = os.path.getsize(filepath) >= STREAM_SIZE_THRESHOLD
+
+    if stream:
+        try:
+            return StreamingPEMParser().parse(filepath)
+        except Exception as e:
+            logger.warning(f"Streaming parse of {Path(filepath).name} failed ({e}), using the regular parser.")
+    return PEMParser().parse(filepath)
+
+
+def parse_pem_files(filepaths, max_workers=None, is_canceled=None):
+    """
+    Generator that parses PEM files in a process pool and yields each result as soon as it is completed, so the
+    order of the results is not the order of filepaths.
+    :param filepaths: list of str or Path
+    :param max_workers: int, number of worker processes. Defaults to the number of CPUs.
+    :param is_canceled: callable polled while waiting for the workers. Parsing stops when it returns True.
+    :return: yields tuples of filepath, PEMFile object or None, and error message or None
+    """
+    try:
+        yield from process_map(partial(parse_pem, evict_cache=False), filepaths, max_workers=max_workers,
+                               is_canceled=is_canceled)
+    finally:
+        ParsedFileCache().evict()
+
+
+def convert_dmp(filepath, evict_cache=True):
+    """
+    Convert a .DMP or .DMP2 file to a PEMFile.
+    :param filepath: str or Path
+    :param evict_cache: bool, remove the least recently used entries of the cache after caching the file.
+    :return: tuple, PEMFile object and DataFrame of the readings with INF or NaN values, found in a single pass over
+    the data. The INF readings reported by DMPParser are part of these, so they aren't used.
+    """
+    pem_file, _ = cached_parse(filepath, DMPParser().parse, kind='dmp', evict=evict_cache)
+    return pem_file, find_invalid_readings(pem_file.data)
+
+
+def convert_dmp_files(filepaths, max_workers=None, is_canceled=None):
+    """
+    Generator that converts DMP files in a process pool and yields each result as soon as it is completed.
+    :param filepaths: list of str or Path
+    :param max_workers: int, number of worker processes. Defaults to the number of CPUs.
+    :param is_canceled: callable polled while waiting for the workers. Converting stops when it returns True.
+    :return: yields tuples of filepath, tuple of PEMFile and INF readings DataFrame or None, and error message or None
+    """
+    try:
+        yield from process_map(partial(convert_dmp, evict_cache=False), filepaths, max_workers=max_workers,
+                               is_canceled=is_canceled)
+    finally:
+        ParsedFileCache().evict()
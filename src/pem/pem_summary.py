@@ -0,0 +1,95 @@
+import logging
+
+import numpy as np
+
+from src.pem.decay_matrix import convert_stations
+
+logger = logging.getLogger(__name__)
+
+
+def get_version(pem_file):
+    """
+    Version of a PEMFile, incremented every time the file is modified (see mark_modified).
+    :param pem_file: PEMFile object
+    :return: int
+    """
+    return getattr(pem_file, 'version', 0)
+
+
+def mark_modified(pem_file):
+    """
+    Increment the version of a PEMFile, so its cached summary is re-calculated the next time it is used. Must be
+    called after any change to the data or GPS of the file.
+    :param pem_file: PEMFile object
+    :return: PEMFile object
+    """
+    pem_file.version = get_version(pem_file) + 1
+    return pem_file
+
+
+class PEMSummary:
+    """
+    Summary statistics of a PEMFile, used by the PEMHub table, table colors and selection labels. The values taken from
+    the data are calculated together from the data columns, and the checks (GPS, suffix, repeats, polarity) are run
+    once per version of the file.
+    """
+
+    def __init__(self, pem_file):
+        """
+        :param pem_file: PEMFile object
+        """
+        data = pem_file.data
+        self.key = self.get_key(pem_file)
+
+        # Station range of the un-deleted readings
+        filt = ~data.Deleted.astype(bool).to_numpy() if 'Deleted' in data.columns else np.ones(len(data), dtype=bool)
+        if 'cStation' in data.columns:
+            stations = data.cStation.to_numpy()[filt]
+        else:
+            stations = convert_stations(data.Station.to_numpy()[filt])
+        if stations.size:
+            self.min_station, self.max_station = int(stations.min()), int(stations.max())
+        else:
+            self.min_station, self.max_station = None, None
+
+        self.components = np.unique(data.Component.astype(str).to_numpy()).tolist()
+        self.zts = np.unique(data.ZTS.to_numpy().astype(int)).astype(str).tolist()
+        self.readings_per_set = sorted(np.unique(data.Readings_per_set.to_numpy()).astype(str))
+        self.number_of_stacks = sorted(np.unique(data.Number_of_stacks.to_numpy()).astype(str))
+
+        self.survey_type = pem_file.get_survey_type()
+        self.is_pp = pem_file.is_pp()
+        self.is_averaged = pem_file.is_averaged()
+        self.is_split = pem_file.is_split()
+        self.is_borehole = pem_file.is_borehole()
+        self.has_xy = pem_file.has_xy()
+        self.is_derotated = pem_file.is_derotated() if self.is_borehole and self.has_xy else False
+        self.has_all_gps = pem_file.has_all_gps()
+
+        self.number_gps_warnings = pem_file.get_number_gps_warnings()
+        self.number_suffix_warnings = len(pem_file.get_suffix_warnings())
+        self.number_repeats = len(pem_file.get_repeats())
+        self.reversed_components = pem_file.get_reversed_components() if self.has_all_gps else []
+
+    @staticmethod
+    def get_key(pem_file):
+        """
+        The summary is valid as long as the version of the file and its data frame are the same.
+        :param pem_file: PEMFile object
+        :return: tuple
+        """
+        return get_version(pem_file), id(pem_file.data), len(pem_file.data)
+
+
+def get_summary(pem_file):
+    """
+    Return the summary of a PEMFile, re-calculating it only if the file was modified since it was last calculated.
+    :param pem_file: PEMFile object
+    :return: PEMSummary object
+    """
+    summary = getattr(pem_file, 'summary', None)
+    if summary is None or summary.key != PEMSummary.get_key(pem_file):
+        logger.debug(f"Calculating the summary of {pem_file.filepath.name}.")
+        summary = PEMSummary(pem_file)
+        pem_file.summary = summary
+    return summary
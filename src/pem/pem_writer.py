@@ -0,0 +1,255 @@
+import copy
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.pem.pem_stream import reading_header, rad_line
+from src.process_pool import process_map
+from src.text_io import write_text_atomic
+
+logger = logging.getLogger(__name__)
+
+# Decay values are written 7 per line, left-aligned in 14 characters with 7 significant digits
+VALUES_PER_LINE = 7
+VALUE_FORMAT = '%-14.7G'
+READING_HEADER_FORMAT = '%s %sR%g %g %s %g %g %g %g %g'
+# The position markers of _reading_order are written as two values below this, which are formatted exactly
+MARKER_BASE = 1000
+
+
+def get_values_format(number_of_channels):
+    """
+    Format string of the decay values of one reading.
+    :param number_of_channels: int
+    :return: str
+    """
+    lines = []
+    for start in range(0, number_of_channels, VALUES_PER_LINE):
+        lines.append(' '.join([VALUE_FORMAT] * min(VALUES_PER_LINE, number_of_channels - start)))
+    return '\n'.join(lines)
+
+
+def serialize_data(data, legacy=False):
+    """
+    Text of the data section of a PEM file. Every reading is formatted by a single string-formatting operation over
+    the whole (readings x channels) decay array, instead of formatting each reading separately.
+    :param data: pandas DataFrame, data of a PEMFile
+    :param legacy: bool, write the RAD tool lines in the legacy format
+    :return: str
+    """
+    if data.empty:
+        return ''
+
+    values = np.stack(data.Reading.to_numpy()).astype(float)
+
+    headers = [READING_HEADER_FORMAT % row for row in zip(
+        data.Station.astype(str), data.Component.astype(str), data.Reading_index, data.Gain, data.Rx_type.astype(str),
+        data.ZTS, data.Coil_delay, data.Number_of_stacks, data.Readings_per_set, data.Reading_number
+    )]
+
+    # RAD tool lines, formatted once per RAD tool object
+    rad_lines = {}
+    for i, rad in enumerate(data.RAD_tool.to_numpy()):
+        if rad is None or (isinstance(rad, float) and np.isnan(rad)):
+            continue
+        if id(rad) not in rad_lines:
+            rad_lines[id(rad)] = rad.to_string(legacy=legacy)
+        headers[i] = f"{headers[i]}\n{rad_lines[id(rad)]}"
+
+    args = np.empty((len(values), values.shape[1] + 1), dtype=object)
+    args[:, 0] = headers
+    args[:, 1:] = values
+    reading_format = f"%s\n{get_values_format(values.shape[1])}\n"
+    return (reading_format * len(values)) % tuple(args.ravel().tolist())
+
+
+def _reading_order(pem_file, legacy=False):
+    """
+    Find how PEMFile.to_string() orders and filters the readings, without formatting the decays. The file is written
+    with the decay of each reading replaced by its position in the data, and the positions are read back from the
+    text.
+    :param pem_file: PEMFile object
+    :param legacy: bool
+    :return: tuple, header text, list of int positions of the written readings, text of the data section of the
+    position markers, and the marker data frame. None if the text has no readings.
+    """
+    markers = pem_file.data.copy()
+    markers['Reading'] = pd.Series([np.array(divmod(i, MARKER_BASE), dtype=float) for i in range(len(markers))],
+                                   index=markers.index, dtype=object)
+    sample = copy.copy(pem_file)
+    sample.data = markers
+    lines = sample.to_string(legacy=legacy).splitlines(keepends=True)
+    start = next((i for i, line in enumerate(lines) if reading_header.match(line)), None)
+    if start is None:
+        return None
+
+    values = []
+    for line in lines[start:]:
+        if reading_header.match(line):
+            values.append([])
+        elif values and not rad_line.match(line):
+            values[-1].extend(line.split())
+    positions = [int(float(value[0])) * MARKER_BASE + int(float(value[1])) for value in values]
+    return ''.join(lines[:start]), positions, ''.join(lines[start:]), markers
+
+
+def pem_to_string(pem_file, legacy=False):
+    """
+    Text of a PEM file, using serialize_data for the data section. The whole data section is checked against
+    PEMFile.to_string(): the order of the readings and every line other than the decay values are compared to the
+    text of the file written with position markers as decays (see _reading_order), and the header and the formatting
+    of the decay values are compared to the text of the first reading alone. If anything differs, the text of
+    PEMFile.to_string() is returned.
+    :param pem_file: PEMFile object
+    :param legacy: bool
+    :return: str
+    """
+    data = pem_file.data
+    if len(data) < 2:
+        return pem_file.to_string(legacy=legacy)
+
+    try:
+        order = _reading_order(pem_file, legacy=legacy)
+        if order is None:
+            return pem_file.to_string(legacy=legacy)
+        header, positions, marker_text, markers = order
+        if len(set(positions)) != len(positions):
+            raise ValueError("Readings are repeated.")
+
+        marker_data = serialize_data(markers.iloc[positions], legacy=legacy)
+        end = marker_text[len(marker_data):]
+        if not marker_text.startswith(marker_data) or end.strip():
+            raise ValueError("Reading headers or RAD tool lines differ.")
+
+        data = data.iloc[positions]
+        sample = copy.copy(pem_file)
+        sample.data = data.iloc[:1].copy()
+        sample.number_of_readings = getattr(pem_file, 'number_of_readings', len(pem_file.data))
+        lines = sample.to_string(legacy=legacy).splitlines(keepends=True)
+        start = next((i for i, line in enumerate(lines) if reading_header.match(line)), len(lines))
+        if ''.join(lines[:start]) != header:
+            raise ValueError("The header depends on the decays.")
+        sample_reading = ''.join(lines[start:])
+        first_reading = serialize_data(sample.data, legacy=legacy)
+        if not sample_reading.startswith(first_reading) or sample_reading[len(first_reading):].strip():
+            raise ValueError("Decay values differ.")
+    except (ValueError, IndexError) as e:
+        logger.debug(f"Using PEMFile.to_string() for {pem_file.filepath.name} ({e}).")
+        return pem_file.to_string(legacy=legacy)
+
+    return header + serialize_data(data, legacy=legacy) + end
+
+
+def save_pem(pem_file, filepath=None, legacy=False):
+    """
+    Write a PEM file. The file is written to a temporary file first then renamed, so an interrupted save never
+    leaves a partially written file.
+    :param pem_file: PEMFile object
+    :param filepath: str or Path, defaults to the filepath of the PEMFile
+    :param legacy: bool
+    :return: Path, filepath of the saved file
+    """
+    filepath = Path(filepath or pem_file.filepath)
+    write_text_atomic(filepath, pem_to_string(pem_file, legacy=legacy))
+    return filepath
+
+
+def _save_task(job):
+    """
+    Process pool task, save a PEMFile in place.
+    :param job: tuple, PEMFile object and bool legacy
+    :return: Path
+    """
+    pem_file, legacy = job
+    return save_pem(pem_file, legacy=legacy)
+
+
+def export_pem(pem_file, folder, legacy=False, processed=False):
+    """
+    Export a PEMFile to a folder with PEMFile.save(), which processes and renames the file. The file is saved
+    into a temporary folder in the export folder, then moved into the export folder once it is fully written.
+    :param pem_file: PEMFile object, its filepath is changed, so pass a copy.
+    :param folder: str or Path
+    :param legacy: bool
+    :param processed: bool
+    :return: list of Path, the exported files
+    """
+    temp_folder = Path(tempfile.mkdtemp(dir=folder, prefix='.export_'))
+    try:
+        pem_file.filepath = temp_folder.joinpath(pem_file.filepath.name)
+        pem_file.save(legacy=legacy, processed=processed, rename=True)
+
+        exported = []
+        for file in temp_folder.iterdir():
+            os.replace(file, Path(folder).joinpath(file.name))
+            exported.append(Path(folder).joinpath(file.name))
+        return exported
+    finally:
+        shutil.rmtree(temp_folder, ignore_errors=True)
+
+
+def _export_task(job):
+    """
+    Process pool task, export a PEMFile (see export_pem).
+    :param job: tuple, PEMFile object, export folder, bool legacy and bool processed
+    :return: list of Path, the exported files
+    """
+    return export_pem(*job)
+
+
+def _xyz_task(job):
+    """
+    Process pool task, write the XYZ file of a PEMFile.
+    :param job: tuple, PEMFile object and filepath of the XYZ file
+    :return: Path
+    """
+    pem_file, filepath = job
+    write_text_atomic(filepath, pem_file.to_xyz())
+    return Path(filepath)
+
+
+def save_pem_files(pem_files, legacy=None, is_canceled=None):
+    """
+    Generator that saves PEM files in place in a process pool.
+    :param pem_files: list of PEMFile objects
+    :param legacy: bool, defaults to the legacy attribute of each file.
+    :param is_canceled: callable polled while waiting for the workers. Saving stops when it returns True.
+    :return: yields tuples of PEMFile, saved filepath or None, and error message or None
+    """
+    jobs = [(pem_file, getattr(pem_file, 'legacy', False) if legacy is None else legacy) for pem_file in pem_files]
+    for job, filepath, error in process_map(_save_task, jobs, is_canceled=is_canceled):
+        yield job[0], filepath, error
+
+
+def export_pem_files(pem_files, folder, legacy=False, processed=False, is_canceled=None):
+    """
+    Generator that exports PEM files to a folder in a process pool, using PEMFile.save().
+    :param pem_files: list of PEMFile objects, these are modified by the export, so pass copies.
+    :param folder: str or Path
+    :param legacy: bool
+    :param processed: bool
+    :param is_canceled: callable polled while waiting for the workers. Exporting stops when it returns True.
+    :return: yields tuples of PEMFile, list of exported filepaths or None, and error message or None
+    """
+    jobs = [(pem_file, str(folder), legacy, processed) for pem_file in pem_files]
+    for job, filepaths, error in process_map(_export_task, jobs, is_canceled=is_canceled):
+        yield job[0], filepaths, error
+
+
+def export_xyz_files(pem_files, folder, is_canceled=None):
+    """
+    Generator that writes the XYZ files of PEM files to a folder in a process pool.
+    :param pem_files: list of PEMFile objects
+    :param folder: str or Path
+    :param is_canceled: callable polled while waiting for the workers. Exporting stops when it returns True.
+    :return: yields tuples of PEMFile, XYZ filepath or None, and error message or None
+    """
+    jobs = [(pem_file, str(Path(folder).joinpath(pem_file.filepath.name).with_suffix(".XYZ")))
+            for pem_file in pem_files]
+    for job, filepath, error in process_map(_xyz_task, jobs, is_canceled=is_canceled):
+        yield job[0], filepath, error
@@ -0,0 +1,150 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from src.pem.decay_matrix import convert_stations
+
+logger = logging.getLogger(__name__)
+
+
+class ProfileMeans:
+    """
+    Mean decay of each component and station of a PEMFile, as plotted in the profile (LIN) plots. The sums and
+    counts of the readings of each group are kept in (component, station, channel) arrays, so when readings are
+    edited only their contributions are removed and added again, and only the groups they belong to are calculated
+    again. Stations are the converted station numbers, and channels are the channels of the channel mask, numbered
+    from 0. Readings flagged for deletion or with NaN/INF values are not used.
+    """
+    components = ['X', 'Y', 'Z']
+
+    def __init__(self, data, channel_mask):
+        """
+        :param data: pandas DataFrame, PEMFile.data
+        :param channel_mask: boolean numpy array, channels used, i.e. the off-time channels.
+        """
+        self.channel_mask = np.asarray(channel_mask, dtype=bool)
+        self.index = pd.Index([])
+        self.stations = np.array([], dtype=int)
+        self.sums = np.zeros((len(self.components), 0, self.number_of_channels))
+        self.counts = np.zeros((len(self.components), 0))
+        self.means = np.zeros_like(self.sums)
+        # Group and values of each reading, in the order of the index
+        self._comp = np.array([], dtype=int)
+        self._pos = np.array([], dtype=int)
+        self._used = np.array([], dtype=bool)
+        self._values = np.empty((0, self.number_of_channels))
+        self.rebuild(data)
+
+    @property
+    def number_of_channels(self):
+        return int(self.channel_mask.sum())
+
+    def _read(self, data):
+        """
+        Return the group and the values of readings.
+        :param data: pandas DataFrame, rows of PEMFile.data
+        :return: tuple, component index (-1 for other components), station number, bool if the reading is used,
+        and the 2D values.
+        """
+        comp = np.array(data.Component.map({c: i for i, c in enumerate(self.components)}).fillna(-1), dtype=int)
+        stations = convert_stations(data.Station)
+        if len(data):
+            values = np.stack(data.Reading.to_numpy()).astype(float)[:, self.channel_mask]
+        else:
+            values = np.empty((0, self.number_of_channels))
+        used = (comp >= 0) & ~data.Deleted.astype(bool).to_numpy() & np.isfinite(values).all(axis=1)
+        return comp, stations, used, values
+
+    def _add(self, comp, pos, used, values, sign=1):
+        np.add.at(self.sums, (comp[used], pos[used]), sign * values[used])
+        np.add.at(self.counts, (comp[used], pos[used]), sign)
+
+    def _calc_means(self, comp, pos):
+        """
+        Calculate the mean of groups from their sums and counts.
+        :param comp: numpy array of int, component index of the groups
+        :param pos: numpy array of int, station position of the groups
+        """
+        counts = self.counts[comp, pos]
+        empty = counts <= 0
+        # Remove the rounding errors of groups where every reading was removed
+        self.sums[comp[empty], pos[empty]] = 0.
+        self.counts[comp[empty], pos[empty]] = 0.
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = self.sums[comp, pos] / counts[:, None]
+        means[empty] = np.nan
+        self.means[comp, pos] = means
+
+    def rebuild(self, data):
+        """
+        Calculate the means of every group.
+        :param data: pandas DataFrame, PEMFile.data
+        """
+        comp, stations, used, values = self._read(data)
+        self.index = data.index
+        self.stations = np.unique(stations)
+        pos = np.searchsorted(self.stations, stations)
+
+        self.sums = np.zeros((len(self.components), len(self.stations), self.number_of_channels))
+        self.counts = np.zeros((len(self.components), len(self.stations)))
+        self.means = np.full_like(self.sums, np.nan)
+        self._comp, self._pos, self._used, self._values = comp, pos, used, values
+        self._add(comp, pos, used, values)
+
+        all_comp, all_pos = np.divmod(np.arange(self.counts.size), len(self.stations) or 1)
+        self._calc_means(all_comp, all_pos)
+
+    def update(self, data, index):
+        """
+        Update the means of the groups of edited readings. Everything is calculated again if readings were added or
+        removed, or if a reading is moved to a new station.
+        :param data: pandas DataFrame, PEMFile.data
+        :param index: list-like, index labels of the edited readings in data
+        :return: list of str, components of the groups which changed
+        """
+        rows = self.index.get_indexer(index)
+        if len(data) != len(self.index) or (rows < 0).any():
+            self.rebuild(data)
+            return list(self.components)
+
+        comp, stations, used, values = self._read(data.loc[index])
+        if not np.isin(stations, self.stations).all():
+            self.rebuild(data)
+            return list(self.components)
+        pos = np.searchsorted(self.stations, stations)
+
+        # Replace the contribution of the readings to their old and new groups
+        old_comp, old_pos = self._comp[rows], self._pos[rows]
+        self._add(old_comp, old_pos, self._used[rows], self._values[rows], sign=-1)
+        self._add(comp, pos, used, values)
+        self._comp[rows], self._pos[rows], self._used[rows], self._values[rows] = comp, pos, used, values
+
+        groups = np.unique(np.concatenate([np.column_stack([old_comp, old_pos]), np.column_stack([comp, pos])]),
+                           axis=0)
+        groups = groups[groups[:, 0] >= 0]
+        self._calc_means(groups[:, 0], groups[:, 1])
+        return [self.components[i] for i in np.unique(groups[:, 0])]
+
+    def get_means(self, component):
+        """
+        Return the mean decay of each station of a component, for stations with readings.
+        :param component: str
+        :return: tuple, station numbers and 2D array of the means, (stations x channels)
+        """
+        if component not in self.components:
+            return np.array([], dtype=int), np.empty((0, self.number_of_channels))
+        i = self.components.index(component)
+        filt = self.counts[i] > 0
+        return self.stations[filt], self.means[i][filt]
+
+    def get_readings(self, component):
+        """
+        Return the values of the readings used for a component.
+        :param component: str
+        :return: tuple, station number of each reading and 2D array of the values, (readings x channels)
+        """
+        if component not in self.components:
+            return np.array([], dtype=int), np.empty((0, self.number_of_channels))
+        filt = self._used & (self._comp == self.components.index(component))
+        return self.stations[self._pos[filt]], self._values[filt]
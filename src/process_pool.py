@@ -0,0 +1,79 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+# Fewer items than this are processed in the calling process, since starting the worker processes costs more.
+PARALLEL_MIN_ITEMS = 4
+
+
+def _run_task(task, item):
+    """
+    Run a task and return the error instead of raising it, so one bad item doesn't stop the others.
+    :param task: callable
+    :param item: argument of the task
+    :return: tuple, result of the task or None, and error message or None
+    """
+    try:
+        return task(item), None
+    except Exception as e:
+        logger.error(f"Error processing {item}: {e}")
+        return None, str(e)
+
+
+def process_map(task, items, max_workers=None, is_canceled=None, min_items=PARALLEL_MIN_ITEMS):
+    """
+    Generator that runs a task on each item in a process pool, and yields each result as soon as it is completed, so
+    the order of the results is not the order of the items. Small batches are processed in the calling process, and
+    the remaining items are processed in the calling process if the pool stops working.
+    The task must be a module-level function which doesn't use Qt, and the items and results must be picklable.
+    :param task: callable, takes a single item
+    :param items: list of the arguments of the task
+    :param max_workers: int, number of worker processes. Defaults to the number of CPUs.
+    :param is_canceled: callable polled while waiting for the workers. Processing stops when it returns True.
+    :param min_items: int, minimum number of items to use the process pool.
+    :return: yields tuples of item, result of the task or None, and error message or None
+    """
+    items = list(items)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(items))
+
+    remaining = []
+    if len(items) < min_items or max_workers < 2:
+        remaining = items
+    else:
+        pending = {}
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+        try:
+            pending = {executor.submit(_run_task, task, item): item for item in items}
+            while pending:
+                done, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = pending.pop(future)
+                    try:
+                        yield (item, *future.result())
+                    except BrokenProcessPool:
+                        remaining.append(item)
+                    except Exception as e:
+                        # The result could not be sent back from the worker
+                        yield item, None, str(e)
+
+                if is_canceled is not None and is_canceled():
+                    return
+
+                if remaining:
+                    logger.warning("The process pool stopped, processing the remaining items in this process.")
+                    remaining.extend(pending.values())
+                    pending.clear()
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    for item in remaining:
+        if is_canceled is not None and is_canceled():
+            return
+        yield (item, *_run_task(task, item))
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+from src import app_data_dir
+
+logger = logging.getLogger(__name__)
+
+# Extensions of the files listed in PEMHub
+pem_extensions = ['.pem', '.dmp', '.dmp2']
+gps_extensions = ['.txt', '.csv', '.gpx', '.xlsx', '.xls']
+
+
+class ProjectIndex:
+    """
+    Index of the files in a project directory, saved as JSON in the app data folder. The directory tree is walked
+    once, then each update only lists the folders whose modification time changed, since adding, removing or renaming
+    a file changes the modification time of its folder. The size and modification time of each file are kept so the
+    file lists can be filtered without accessing the files. Editing a file doesn't change its folder, so the PEM and
+    DMP files are also stat'ed again on each update.
+    Updates can run in a background thread, the file lists can be read at any time.
+    """
+
+    def __init__(self, root, folder=None):
+        """
+        :param root: str or Path, project directory
+        :param folder: str or Path, folder of the saved indexes. Defaults to a folder in the app data folder.
+        """
+        self.root = Path(root).absolute()
+        self.folder = Path(folder) if folder is not None else app_data_dir.joinpath("project_index")
+        self.filepath = self.folder.joinpath(hashlib.sha1(str(self.root).encode()).hexdigest() + '.json')
+        # Relative folder path: {'mtime': int, 'dirs': list of str, 'files': {name: [size, mtime]}}
+        self.dirs = {}
+        self.lock = threading.Lock()
+        self.is_complete = False
+        self.load()
+
+    def load(self):
+        """
+        Load the saved index of the project directory.
+        """
+        if not self.filepath.exists():
+            return
+        try:
+            saved = json.loads(self.filepath.read_text())
+        except (ValueError, OSError) as e:
+            logger.warning(f"Could not read the index of {self.root}: {e}")
+            return
+
+        if saved.get('root') == str(self.root):
+            self.dirs = saved['dirs']
+            self.is_complete = True
+
+    def save(self):
+        """
+        Write the index to disk.
+        """
+        self.folder.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            text = json.dumps({'root': str(self.root), 'dirs': self.dirs})
+        temp_file = self.filepath.with_suffix('.tmp')
+        temp_file.write_text(text)
+        os.replace(temp_file, self.filepath)
+
+    def _scan_dir(self, rel_path, mtime):
+        """
+        List the files and sub-folders of a folder.
+        :param rel_path: str, path of the folder relative to the root
+        :param mtime: int, modification time of the folder in ns
+        :return: dict, entry of the folder
+        """
+        entry = {'mtime': mtime, 'dirs': [], 'files': {}}
+        with os.scandir(self.root.joinpath(rel_path)) as it:
+            for item in it:
+                try:
+                    if item.is_dir():
+                        entry['dirs'].append(item.name)
+                    elif item.is_file():
+                        stat = item.stat()
+                        entry['files'][item.name] = [stat.st_size, stat.st_mtime_ns]
+                except OSError:
+                    continue
+        return entry
+
+    def _restat_files(self, rel_path, entry, extensions):
+        """
+        Update the size and modification time of the files of a folder which didn't change.
+        :param rel_path: str, path of the folder relative to the root
+        :param entry: dict, entry of the folder
+        :param extensions: list of str, lower case extensions of the files to stat
+        :return: dict, entry of the folder. A new entry is returned if any file changed, the entry is never modified.
+        """
+        folder = self.root.joinpath(rel_path)
+        files = None
+        for name, (size, mtime) in entry['files'].items():
+            if os.path.splitext(name)[1].lower() not in extensions:
+                continue
+            try:
+                stat = os.stat(folder.joinpath(name))
+            except OSError:
+                continue
+            if stat.st_size != size or stat.st_mtime_ns != mtime:
+                if files is None:
+                    files = dict(entry['files'])
+                files[name] = [stat.st_size, stat.st_mtime_ns]
+        return entry if files is None else dict(entry, files=files)
+
+    def update(self, is_canceled=None):
+        """
+        Bring the index up to date with the project directory. Only the folders which changed are listed again, the
+        PEM and DMP files of the other folders are stat'ed.
+        :param is_canceled: callable, the update stops when it returns True.
+        :return: bool, True if the index changed.
+        """
+        new_dirs = {}
+        changed = False
+        stack = ['']
+        while stack:
+            if is_canceled is not None and is_canceled():
+                return False
+
+            rel_path = stack.pop()
+            try:
+                mtime = os.stat(self.root.joinpath(rel_path)).st_mtime_ns
+            except OSError:
+                continue
+
+            entry = self.dirs.get(rel_path)
+            if entry is None or entry['mtime'] != mtime:
+                try:
+                    entry = self._scan_dir(rel_path, mtime)
+                except OSError as e:
+                    logger.warning(f"Could not list {rel_path or self.root}: {e}")
+                    continue
+                changed = True
+            else:
+                new_entry = self._restat_files(rel_path, entry, pem_extensions)
+                changed = changed or new_entry is not entry
+                entry = new_entry
+
+            new_dirs[rel_path] = entry
+            stack.extend([os.path.join(rel_path, name) for name in entry['dirs']])
+
+        changed = changed or new_dirs.keys() != self.dirs.keys()
+        with self.lock:
+            self.dirs = new_dirs
+            self.is_complete = True
+        if changed:
+            self.save()
+        return changed
+
+    def get_files(self, extensions):
+        """
+        Return the files in the index with the given extensions.
+        :param extensions: list of str, lower case extensions with the leading period.
+        :return: list of tuples, Path, size and modification time of each file.
+        """
+        files = []
+        with self.lock:
+            for rel_path, entry in self.dirs.items():
+                folder = self.root.joinpath(rel_path)
+                for name, (size, mtime) in entry['files'].items():
+                    if os.path.splitext(name)[1].lower() in extensions:
+                        files.append((folder.joinpath(name), size, mtime))
+        return files
@@ -2,7 +2,6 @@ import sys
 import re
 from pathlib import Path
 
-import chardet
 import numpy as np
 import pandas as pd
 import pyqtgraph as pg
@@ -15,6 +14,7 @@ from PySide2.QtWidgets import (QMessageBox, QWidget, QLabel, QFrame, QHBoxLayout
 from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
 from pyproj import CRS
 from src.logger import logger, Log
+from src.mpl import auto_size_ax
 
 # Modify the paths for when the script is being run in a frozen state (i.e. as an EXE)
 if getattr(sys, 'frozen', False):
@@ -203,23 +203,6 @@ def get_extension_icon(filepath):
     return icon
 
 
-def read_file(file, as_list=False):
-    """
-    Read an ascii file with automatic decoding.
-    :param file: str
-    :param as_list: Bool, return the contents as a single list (True) or str (False)
-    :return: list or str
-    """
-    with open(file, 'rb') as byte_file:
-        byte_content = byte_file.read()
-        encoding = chardet.detect(byte_content).get('encoding')
-        logger.info(f"Using {encoding} encoding for {Path(str(file)).name}.")
-        contents = byte_content.decode(encoding=encoding)
-    if as_list is True:
-        contents = [c.strip().split() for c in contents.splitlines()]
-    return contents
-
-
 def df_to_table(df, table, set_role=False):
     """
     Add the contents of the data frame to the table
@@ -294,40 +277,6 @@ def table_to_df(table, dtypes=None, nan_replacement=False):
     return df
 
 
-def auto_size_ax(ax, figure, buffer=0):
-    """
-    Change the limits of the axes so the axes fills the full size of the figure.
-    :param ax: Matplotlib Axes object
-    :param figure: Matplotlib Figure object
-    :param buffer: int, marging (as a percentage) to add to the X and Y.
-    :return: None
-    """
-    xmin, xmax = ax.get_xlim()
-    ymin, ymax = ax.get_ylim()
-    map_width, map_height = xmax - xmin, ymax - ymin
-
-    current_ratio = map_width / map_height
-    figure_ratio = figure.bbox.width / figure.bbox.height
-
-    if current_ratio < figure_ratio:
-        new_height = map_height
-        new_width = new_height * figure_ratio
-    else:
-        new_width = map_width
-        new_height = new_width * (1 / figure_ratio)
-
-    x_offset = buffer * new_width
-    # y_offset = 0.06 * new_height  # Causes large margins on the right and left
-    y_offset = buffer * new_height
-    new_xmin = (xmin - x_offset) - ((new_width - map_width) / 2)
-    new_xmax = (xmax + x_offset) + ((new_width - map_width) / 2)
-    new_ymin = (ymin - y_offset) - ((new_height - map_height) / 2)
-    new_ymax = (ymax + y_offset) + ((new_height - map_height) / 2)
-
-    ax.set_xlim(new_xmin, new_xmax)
-    ax.set_ylim(new_ymin, new_ymax)
-
-
 def clear_table(table):
     """
     Clear a given table
@@ -12,7 +12,8 @@ import pyqtgraph as pg
 from PySide2.QtCore import Qt
 from PySide2.QtWidgets import (QMainWindow, QMessageBox, QGridLayout, QWidget, QMenu, QAction,
                                QFileDialog, QVBoxLayout, QLabel, QApplication)
-from src.qt_py import read_file, get_icon, get_line_color
+from src.qt_py import get_icon, get_line_color
+from src.text_io import read_text
 
 logger = logging.getLogger(__name__)
 logger.setLevel("DEBUG")
@@ -226,7 +227,7 @@ class DBPlotter(QMainWindow):
         for file in db_files:
             name = Path(file).name
             logger.info(f"Parsing file {name}.")
-            str_contents = read_file(file, as_list=False)
+            str_contents = read_text(file)
             # For files with extra spaces. Doesn't work.
             # str_contents = re.sub(r" {2,}", "\|", str_contents)
             # str_contents = re.sub(r" ", "", str_contents)
@@ -0,0 +1,174 @@
+import logging
+
+import numpy as np
+import pyqtgraph as pg
+from PySide2.QtCore import Qt
+
+from src.line_clip import lines_in_rect
+from src.qt_py import get_line_color
+
+logger = logging.getLogger(__name__)
+
+
+class DecayLines:
+    """
+    The decays plotted in one decay plot. Instead of one curve item per reading, the decays are drawn by a fixed set
+    of curve items, one per style (deleted, overload and selected), each drawing all of its decays as a single path
+    using the 'connect' array of pyqtgraph. Plotting a station, changing the selection or deleting readings only sets
+    the data of these items.
+    Decays are identified by their row, the position of the reading in the data plotted by the editor. Hit-testing and
+    selection return rows instead of plot items.
+    """
+
+    def __init__(self, darkmode=False):
+        """
+        :param darkmode: bool
+        """
+        self.darkmode = darkmode
+        self.rows = np.array([], dtype=int)  # Row of each decay
+        self.values = np.empty((0, 0))  # Decay values, one decay per row
+        self.deleted = np.array([], dtype=bool)
+        self.overload = np.array([], dtype=bool)
+        self.selected = np.array([], dtype=bool)
+        self.hover_row = None
+
+        # One item per style, by (deleted, overload, selected)
+        self.layers = {}
+        for deleted in [False, True]:
+            for overload in [False, True]:
+                for selected in [False, True]:
+                    item = pg.PlotCurveItem(pen=self.get_pen(deleted, overload, selected))
+                    # Selected decays are drawn over the others, and deleted decays under the others
+                    item.setZValue(1 + (not deleted) + 2 * selected)
+                    self.layers[(deleted, overload, selected)] = item
+        self.hover_item = pg.PlotCurveItem()
+        self.hover_item.setZValue(0.5)
+        self.zero_line = pg.InfiniteLine(pos=0, angle=0, movable=False,
+                                         pen=pg.mkPen(get_line_color("foreground", "pyqt", darkmode), width=0.15))
+
+    def get_pen(self, deleted, overload, selected):
+        """
+        :return: QPen of the decays of a style
+        """
+        if selected:
+            color = get_line_color("red", "pyqt", self.darkmode, alpha=200) if deleted else \
+                get_line_color("teal", "pyqt", self.darkmode, alpha=250)
+        else:
+            color = get_line_color("red", "pyqt", self.darkmode, alpha=150) if deleted else \
+                get_line_color("foreground", "pyqt", self.darkmode, alpha=200)
+        style = Qt.DashDotDotLine if overload else Qt.SolidLine
+        return pg.mkPen(color, width=2 if selected else 1, style=style)
+
+    def add_to(self, ax):
+        """
+        Add the items to a plot. Done after the plot is cleared.
+        :param ax: pg.PlotItem
+        """
+        ax.addItem(self.zero_line, ignoreBounds=True)
+        for item in self.layers.values():
+            ax.addItem(item)
+        ax.addItem(self.hover_item)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def set_data(self, rows, values, deleted, overload, selected_rows=()):
+        """
+        Set the decays to draw.
+        :param rows: array of int, row of each decay
+        :param values: 2D array, decay values of each decay
+        :param deleted: array of bool
+        :param overload: array of bool
+        :param selected_rows: list of int, rows of the selected decays
+        """
+        self.rows = np.asarray(rows, dtype=int)
+        if len(self.rows):
+            self.values = np.asarray(values, dtype=float).reshape(len(self.rows), -1)
+        else:
+            self.values = np.empty((0, 0))
+        self.deleted = np.asarray(deleted, dtype=bool)
+        self.overload = np.asarray(overload, dtype=bool)
+        self.hover_row = None
+        self.set_selection(selected_rows)
+
+    def set_selection(self, selected_rows):
+        """
+        Change the selected decays and draw the decays again.
+        :param selected_rows: list of int, rows of the selected decays. Rows not plotted here are ignored.
+        """
+        self.selected = np.isin(self.rows, np.asarray(selected_rows, dtype=int))
+        self.draw()
+
+    def draw(self):
+        for (deleted, overload, selected), item in self.layers.items():
+            mask = (self.deleted == deleted) & (self.overload == overload) & (self.selected == selected)
+            x, y, connect = self.get_path(mask)
+            item.setData(x=x, y=y, connect=connect)
+            item.setVisible(bool(mask.any()))
+        self.set_hover(self.hover_row)
+
+    def get_path(self, mask):
+        """
+        Return the vertices of the decays of the mask as a single path, where the last point of a decay isn't
+        connected to the first point of the next one.
+        :param mask: array of bool
+        :return: tuple, x, y and connect arrays
+        """
+        values = self.values[mask]
+        num_decays, num_channels = values.shape if values.size else (0, 0)
+        x = np.tile(np.arange(num_channels, dtype=float), num_decays)
+        connect = np.ones(x.size, dtype=np.int32)
+        if num_channels:
+            connect[num_channels - 1::num_channels] = 0
+        return x, values.ravel(), connect
+
+    def set_hover(self, row):
+        """
+        Draw a shadow behind the decay of a row, i.e. the decay nearest the mouse.
+        :param row: int, or None to remove the shadow.
+        """
+        self.hover_row = row if row is not None and row in self.rows else None
+        if self.hover_row is None:
+            self.hover_item.setData(x=np.array([]), y=np.array([]))
+            self.hover_item.hide()
+            return
+
+        i = np.flatnonzero(self.rows == self.hover_row)[0]
+        pen = self.get_pen(self.deleted[i], self.overload[i], self.selected[i])
+        self.hover_item.setPen(pg.mkPen(pen.color(), width=2.5 + 2 * self.selected[i], cosmetic=True))
+        self.hover_item.setData(x=np.arange(self.values.shape[1], dtype=float), y=self.values[i])
+        self.hover_item.show()
+
+    def in_rect(self, left, bottom, right, top):
+        """
+        Return the decays which cross a rectangle (see lines_in_rect).
+        :return: list of int, rows of the decays.
+        """
+        if not len(self.rows):
+            return []
+        x = np.arange(self.values.shape[1], dtype=float)
+        return self.rows[lines_in_rect(x, self.values, left, bottom, right, top)].tolist()
+
+    def nearest(self, x, y, x_scale, y_scale, num_points=100):
+        """
+        Return the decay nearest a point. Each decay is interpolated so the distance is measured to the line between
+        the channels and not only to the channels.
+        :param x: float, x of the point in data coordinates
+        :param y: float, y of the point in data coordinates
+        :param x_scale: float, width of the view, so distances in x and y are comparable
+        :param y_scale: float, height of the view
+        :param num_points: int, number of points of the interpolated decays
+        :return: int, row of the nearest decay, or None if there are no decays.
+        """
+        if not len(self.rows) or self.values.shape[1] == 0:
+            return None
+
+        num_channels = self.values.shape[1]
+        xi = np.linspace(0, num_channels - 1, num_points)
+        left = np.minimum(xi.astype(int), max(num_channels - 2, 0))
+        right = np.minimum(left + 1, num_channels - 1)
+        frac = xi - left
+        yi = self.values[:, left] + (self.values[:, right] - self.values[:, left]) * frac
+
+        distances = np.hypot((xi - x) / x_scale, (yi - y) / y_scale).min(axis=1)
+        return int(self.rows[np.nanargmin(distances)]) if not np.isnan(distances).all() else None
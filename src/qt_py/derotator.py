@@ -12,7 +12,9 @@ from PySide2.QtGui import QKeySequence
 from PySide2.QtWidgets import (QMainWindow, QMessageBox, QFileDialog, QApplication, QShortcut, QTableWidget, QWidget,
                                QVBoxLayout, QAbstractItemView)
 
-from src import timeit
+from src.instrumentation import timed
+from src.pem.decay_matrix import average_pem, split_pem
+from src.pem.pem_copy import copy_pem
 from src.pem.pem_file import PEMFile, PEMGetter
 from src.qt_py import NonScientific, get_icon, get_line_color, df_to_table
 from src.ui.derotator import Ui_Derotator
@@ -376,24 +378,23 @@ class Derotator(QMainWindow, Ui_Derotator):
         :return: pandas pd.DataFrame object
         """
 
-        def get_stats(reading):
+        def get_stats(station, rad):
             """
-            Return the relevant information in the reading, mostly in the RAD_Tool object.
-            :param reading: PEMFile reading
+            Return the relevant information of a reading, mostly in the RAD_Tool object.
+            :param station: str, station of the reading
+            :param rad: RADTool object of the reading
             :return: list
             """
-            rad = reading.RAD_tool
-            station = reading.Station
-            stats.append([station, rad.azimuth, rad.dip,
-                          rad.x_pos, rad.y_pos, rad.z_pos,
-                          rad.ppx_theory, rad.ppy_theory, rad.ppz_theory,
-                          rad.ppxy_theory, rad.ppxy_measured, rad.ppxy_cleaned,
-                          rad.get_azimuth(), rad.get_dip(),
-                          rad.acc_roll_angle, rad.mag_roll_angle, rad.measured_pp_roll_angle, rad.cleaned_pp_roll_angle]
-                         )
-
-        stats = []
-        self.pem_file.data.apply(get_stats, axis=1)
+            return [station, rad.azimuth, rad.dip,
+                    rad.x_pos, rad.y_pos, rad.z_pos,
+                    rad.ppx_theory, rad.ppy_theory, rad.ppz_theory,
+                    rad.ppxy_theory, rad.ppxy_measured, rad.ppxy_cleaned,
+                    rad.get_azimuth(), rad.get_dip(),
+                    rad.acc_roll_angle, rad.mag_roll_angle, rad.measured_pp_roll_angle, rad.cleaned_pp_roll_angle]
+
+        # Only the first reading of each station is kept, so only evaluate the RAD tool of those readings.
+        station_data = self.pem_file.data.drop_duplicates(subset='Station')
+        stats = [get_stats(station, rad) for station, rad in zip(station_data.Station, station_data.RAD_tool)]
         df = pd.DataFrame(stats,
                        columns=['Station', 'Segment Azimuth', 'Segment Dip',
                                 'X Position', 'Y Position', 'Z Position',
@@ -629,7 +630,7 @@ class Derotator(QMainWindow, Ui_Derotator):
                                                         f"Magnetic de-rotation set as default.")
             self.mag_btn.click()
 
-    @timeit
+    @timed(subsystem='derotator')
     def plot_pem(self, pem_file):
         """
         Plot the PEM file in a LIN plot style, with both components in separate plots
@@ -762,17 +763,17 @@ class Derotator(QMainWindow, Ui_Derotator):
         if not pem_file:
             return
 
-        raw_pem = pem_file.copy()  # Needed otherwise the returned PEMFile will be averaged and split
-        processed_pem = pem_file.copy()
+        raw_pem = copy_pem(pem_file)  # Needed otherwise the returned PEMFile will be averaged and split
+        processed_pem = copy_pem(pem_file)
         self.profile_data = processed_pem.get_profile_data(converted=True, incl_deleted=False)
 
         # Split the data if it isn't already split
         if not processed_pem.is_split():
-            processed_pem = processed_pem.split()
+            processed_pem = split_pem(processed_pem)
 
         # Average the data if it isn't averaged
         if not processed_pem.is_averaged():
-            processed_pem = processed_pem.average()
+            processed_pem = average_pem(processed_pem)
 
         clear_plots()
         channel_bounds = self.pem_file.get_channel_bounds()
@@ -803,7 +804,7 @@ class Derotator(QMainWindow, Ui_Derotator):
             self.soa = self.soa_sbox.value()
 
         # Create a copy of the pem_file so it is never changed
-        copy_file = self.pem_file.copy()
+        copy_file = copy_pem(self.pem_file)
 
         if method is not None:
             self.rotated_file = copy_file.rotate(method=method, soa=self.soa)
@@ -0,0 +1,147 @@
+import logging
+import os
+import threading
+import traceback
+
+from PySide2.QtCore import QObject, QRunnable, QThreadPool, QEventLoop, Signal, Slot
+
+from src.qt_py import CustomProgressDialog
+
+logger = logging.getLogger(__name__)
+
+
+class _JobSignals(QObject):
+    """
+    Signals of a job. Emitted from the worker thread and received in the thread of the JobRunner (the GUI thread).
+    """
+    finished = Signal(int, object)  # Job index, result
+    failed = Signal(int, str)  # Job index, error message
+
+
+class _Job(QRunnable):
+    """
+    Runs the transform on a single PEMFile in a thread of the thread pool.
+    """
+    def __init__(self, index, pem_file, transform, canceled, signals):
+        super().__init__()
+        self.index = index
+        self.pem_file = pem_file
+        self.transform = transform
+        self.canceled = canceled
+        self.signals = signals
+
+    def run(self):
+        if self.canceled.is_set():
+            self.signals.failed.emit(self.index, "Canceled")
+            return
+
+        try:
+            result = self.transform(self.pem_file)
+        except Exception as e:
+            logger.error(f"Error processing {self.pem_file.filepath.name}:\n{traceback.format_exc()}")
+            self.signals.failed.emit(self.index, str(e))
+        else:
+            self.signals.finished.emit(self.index, result)
+
+
+class JobRunner(QObject):
+    """
+    Runs a transform on a list of PEMFiles in a thread pool, so the GUI stays responsive while the files are processed.
+    The transform must not use any Qt widget. The results are received in the GUI thread, and returned together once
+    every file is processed so the caller can refresh the table once.
+    """
+    file_finished = Signal(object, object)  # PEMFile, result of the transform
+    file_failed = Signal(object, str)  # PEMFile, error message
+
+    def __init__(self, max_threads=None, parent=None):
+        """
+        :param max_threads: int, number of files processed at the same time. Defaults to the number of CPUs.
+        :param parent: QObject
+        """
+        super().__init__(parent)
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(max_threads or os.cpu_count() or 1)
+        self.canceled = threading.Event()
+
+        self._pem_files = []
+        self._results = []
+        self._errors = []
+        self._remaining = 0
+        self._dlg = None
+        self._loop = None
+
+    def is_running(self):
+        """
+        :return: bool, True while run() is waiting for jobs.
+        """
+        return self._loop is not None
+
+    def cancel(self):
+        """
+        Stop processing. Files already being processed are completed, the others are skipped.
+        """
+        self.canceled.set()
+
+    @Slot(int, object)
+    def _on_finished(self, index, result):
+        pem_file = self._pem_files[index]
+        self._results[index] = (pem_file, result)
+        self._dlg.setLabelText(f"Processed {pem_file.filepath.name}")
+        self.file_finished.emit(pem_file, result)
+        self._job_done()
+
+    @Slot(int, str)
+    def _on_failed(self, index, error):
+        pem_file = self._pem_files[index]
+        self._errors.append((pem_file, error))
+        self.file_failed.emit(pem_file, error)
+        self._job_done()
+
+    def _job_done(self):
+        self._remaining -= 1
+        self._dlg.setValue(len(self._pem_files) - self._remaining)
+        if self._dlg.wasCanceled():
+            self.cancel()
+        if self._remaining == 0:
+            self._loop.quit()
+
+    def run(self, pem_files, transform, title="Processing PEM Files..."):
+        """
+        Run the transform on every file and wait for all of them to finish, showing a progress dialog. Qt events are
+        processed while waiting.
+        :param pem_files: list of PEMFile objects
+        :param transform: callable, takes a PEMFile and returns the processed PEMFile (or any result).
+        :param title: str, label of the progress dialog
+        :return: tuple, list of (PEMFile, result) of the processed files in the order of pem_files, and list of
+        (PEMFile, error message) of the files that failed or were canceled.
+        """
+        if self.is_running():
+            # Events are processed while waiting, so a second run could be started from the GUI
+            raise RuntimeError("Files are already being processed.")
+        if not pem_files:
+            return [], []
+
+        self.canceled.clear()
+        self._pem_files = list(pem_files)
+        self._results = [None] * len(self._pem_files)
+        self._errors = []
+        self._remaining = len(self._pem_files)
+        self._loop = QEventLoop()
+
+        # The signals are connected to methods of this object, so they are queued to the thread of this object.
+        signals = _JobSignals()
+        signals.finished.connect(self._on_finished)
+        signals.failed.connect(self._on_failed)
+
+        try:
+            with CustomProgressDialog(title, 0, len(self._pem_files)) as self._dlg:
+                for i, pem_file in enumerate(self._pem_files):
+                    self.pool.start(_Job(i, pem_file, transform, self.canceled, signals))
+                self._loop.exec_()
+                self.pool.waitForDone()
+
+            results = [result for result in self._results if result is not None]
+            errors = self._errors
+        finally:
+            self._pem_files, self._results, self._errors, self._dlg, self._loop = [], [], [], None, None
+        return results, errors
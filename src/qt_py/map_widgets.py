@@ -26,9 +26,12 @@ from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 from scipy import interpolate as interp
 
-from src import app_data_dir, profile, timeit
+from src import app_data_dir
+from src.instrumentation import timed
 from src.qt_py import get_icon, CustomProgressDialog, NonScientific, get_line_color, MapToolbar, ScreenshotWindow
 from src.gps.gps_editor import BoreholeGeometry
+from src.pem.decay_matrix import average_pem, split_pem
+from src.pem.pem_copy import copy_pem
 from src.pem.pem_plotter import plot_line, plot_loop
 from src.ui.contour_map import Ui_ContourMap
 
@@ -217,7 +220,7 @@ class TileMapViewer(ScreenshotWindow):
         with CustomProgressDialog("Plotting PEM Files", 0, len(self.pem_files)) as dlg:
             # Plot the PEMs
             for pem_file in self.pem_files:
-                pem_file = pem_file.copy()  # Copy the PEM file so GPS conversions don't affect the original file
+                pem_file = copy_pem(pem_file)  # Copy the PEM file so GPS conversions don't affect the original file
                 if dlg.wasCanceled():
                     break
                 dlg.setLabelText(f"Plotting {pem_file.filepath.name}")
@@ -606,12 +609,12 @@ class ContourMapViewer(QWidget, Ui_ContourMap):
         # Averages any file not already averaged.
         if not all([pem_file.is_averaged() for pem_file in self.pem_files]):
             for pem_file in self.pem_files:
-                pem_file.average()
+                average_pem(pem_file)
 
         # Either all files must be split or all un-split
         if not all([pem_file.is_split() for pem_file in self.pem_files]):
             for pem_file in self.pem_files:
-                pem_file.split()
+                split_pem(pem_file)
 
         self.components = np.append(np.unique(np.hstack(np.array([file.get_components() for file in self.pem_files],
                                                         dtype=object))), 'TF')
@@ -635,7 +638,7 @@ class ContourMapViewer(QWidget, Ui_ContourMap):
 
         self.draw_map(self.figure)
 
-    @timeit
+    @timed(subsystem='map')
     def get_contour_data(self):
         """
         Create contour data (GPS + channel reading) for all PEMFiles.
@@ -660,8 +663,7 @@ class ContourMapViewer(QWidget, Ui_ContourMap):
         self.canvas.draw_idle()
 
 
-    @profile()
-    @timeit
+    @timed(subsystem='map')
     def draw_map(self, figure, channel=None):
         """
         Plot the map on the canvas
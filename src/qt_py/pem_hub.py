@@ -7,7 +7,9 @@ import re
 import shutil
 import subprocess
 import sys
+import threading
 import warnings
+from collections import OrderedDict
 from itertools import groupby
 from pathlib import Path
 
@@ -18,7 +20,6 @@ import numpy as np
 import pandas as pd
 import pyqtgraph as pg
 import simplekml
-import stopit
 import cartopy
 from PySide2.QtCore import Qt, QDir, Signal, QEvent, QTimer, QSettings, QSize, QPoint
 from PySide2.QtGui import QIcon, QColor, QFont, QIntValidator, QCursor
@@ -28,24 +29,34 @@ from PySide2.QtWidgets import (QMainWindow, QMessageBox, QGridLayout, QWidget, Q
                                QCalendarWidget, QFileSystemModel, QDoubleSpinBox, QHeaderView, QInputDialog,
                                QTableWidgetItem, QGroupBox, QFormLayout, QTextBrowser, QDialogButtonBox,
                                QTableWidget, QShortcut, QSizePolicy, QPushButton, QComboBox, QListWidgetItem,
-                               QAbstractItemView, QCheckBox, QScrollArea)
+                               QAbstractItemView, QCheckBox, QScrollArea, QTreeWidgetItem)
 from matplotlib import pyplot as plt
 from matplotlib.colors import LinearSegmentedColormap as LCMap
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 from pyproj import CRS
 
-from src import __version__, app_data_dir
+from src import __version__, app_data_dir, instrumentation
 from src.dxf.pem_dxf import PEMDXFDrawing
 from src.gps.gps_editor import (SurveyLine, TransmitterLoop, BoreholeCollar, BoreholeSegments, BoreholeGeometry)
-from src.pem.pem_file import PEMFile, PEMParser, DMPParser, PEMGetter
+from src.pem.decay_matrix import average_pem, split_pem
+from src.pem.pem_file import PEMFile, PEMParser, PEMGetter
+from src.pem import pem_writer
+from src.pem.pem_copy import copy_pem
+from src.pem.pem_header import PEMHeaderCache, header_columns, update_headers
+from src.pem.pem_journal import PEMJournal
+from src.pem.pem_registry import PEMRegistry
+from src.pem.pem_session import PEMSession
+from src.pem.pem_stream import parse_pem_files, convert_dmp_files
+from src.pem.pem_summary import get_summary, mark_modified
 from src.pem.step_file import StepParser
 from src.pem.pem_plotter import PEMPrinter
-from src.qt_py import (icons_path, get_extension_icon, get_icon, CustomProgressDialog, read_file, light_palette,
+from src.qt_py import (icons_path, get_extension_icon, get_icon, CustomProgressDialog, light_palette,
                        dark_palette, get_line_color, CRSSelector, df_to_table, clear_table)
 from src.qt_py.db_plot import DBPlotter
 from src.qt_py.derotator import Derotator
 from src.qt_py.gps_tools import GPXCreator, GPSConversionWidget, GPSExtractor
+from src.qt_py.job_runner import JobRunner
 from src.qt_py.loop_calculator import LoopCalculator
 from src.qt_py.map_widgets import Map3DViewer, ContourMapViewer, TileMapViewer, GPSViewer
 from src.qt_py.pem_geometry import PEMGeometry
@@ -55,6 +66,8 @@ from src.qt_py.pem_planner import LoopPlanner, GridPlanner
 from src.qt_py.pem_plot_editor import PEMPlotEditor
 from src.qt_py.ri_importer import BatchRIImporter
 from src.qt_py.unpacker import Unpacker
+from src.project_index import ProjectIndex, pem_extensions, gps_extensions
+from src.text_io import read_text
 from src.ui.pdf_plot_printer import Ui_PDFPlotPrinter
 from src.ui.plan_map_options import Ui_PlanMapOptions
 from src.ui.pem_hub import Ui_PEMHub
@@ -83,6 +96,8 @@ logger = logging.getLogger(__name__)
 
 # Keep a list of widgets so they don't get garbage collected
 refs = []
+# Maximum number of PEMFileInfoWidgets kept. The widgets of the least recently selected files are released.
+PIW_CACHE_SIZE = 20
 
 pg.setConfigOptions(antialias=True)
 pg.setConfigOption('crashWarning', True)
@@ -90,14 +105,16 @@ warnings.filterwarnings("ignore", category=matplotlib.cbook.mplDeprecation)  # I
 
 
 class PEMHub(QMainWindow, Ui_PEMHub):
+    project_index_updated = Signal(object)  # Emitted from the indexing thread, with the ProjectIndex
+
     def __init__(self, app, parent=None, splash_screen=None):
         super().__init__()
         self.app = app
         self.parent = parent
         self.splash_screen = splash_screen
 
-        self.pem_files = []
-        self.pem_info_widgets = []
+        self.pem_files = PEMRegistry()  # Opened PEMFiles, in the order of the table rows
+        self.pem_info_widgets = OrderedDict()  # PEMFileInfoWidgets of the recently selected files, by id of the PEMFile
         self.pem_editor_widgets = []
         self.tab_num = 1
         self.allow_signals = True
@@ -108,6 +125,29 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         self.gps_dir = None
         self.available_pems = []
         self.available_gps = []
+        self.pem_header_cache = PEMHeaderCache()
+        self.job_runner = JobRunner(parent=self)
+        self.journal = PEMJournal()  # Undo/redo history of the processing
+        self.session = PEMSession()
+        # Save the session shortly after the files change, so a burst of changes is saved once
+        self.session_timer = QTimer(self)
+        self.session_timer.setSingleShot(True)
+        self.session_timer.setInterval(2000)
+        self.session_timer.timeout.connect(self.save_session)
+        self.table_values = {}  # Numeric values of the colored table columns, by id of the PEMFile
+        self.dirty_pem_files = []  # Files waiting to be refreshed in the table
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(0)
+        self.refresh_timer.timeout.connect(self.flush_refresh)
+        self.project_index = None
+        self.index_thread = None
+        self.index_requested = threading.Event()
+        # Check the project directory for new, removed or renamed files
+        self.index_timer = QTimer(self)
+        self.index_timer.setInterval(5000)
+        self.index_timer.timeout.connect(self.update_project_index)
+        self.project_index_updated.connect(self.project_index_changed)
         self.selected_row = None
         self.selected_col = None
 
@@ -181,6 +221,8 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         self.open_quick_map_action = QAction("Quick Map", self)
         self.average_action = QAction("Average", self)
         self.split_action = QAction("Split Channels", self)
+        self.auto_clean_action = QAction("Auto Clean", self)
+        self.auto_clean_all_action = QAction("Auto Clean All PEM Files", self)
         self.scale_current_action = QAction("Scale Current", self)
         self.scale_ca_action = QAction("Scale Coil Area", self)
         self.reverse_x_component_action = QAction("X Polarity", self)
@@ -193,6 +235,9 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         self.rename_lines_action = QAction("Rename Lines/Holes", self)
         self.rename_files_action = QAction("Rename Files", self)
         self.change_suffix_action = QAction("Change Suffix", self)
+        self.undo_action = QAction("Undo", self)
+        self.redo_action = QAction("Redo", self)
+        self.performance_action = QAction("Performance", self)
         self.init_actions()
 
         # Project Directory
@@ -207,6 +252,12 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         if self.splash_screen:
             self.splash_screen.showMessage("Initializing table")
         self.table_columns = [self.table.horizontalHeaderItem(i).text() for i in range(self.table.columnCount())]
+        # PEMFile attribute of the editable header columns, by column
+        self.table_attributes = {self.table_columns.index(col): attr for col, attr in [
+            ('Date', 'date'), ('Client', 'client'), ('Grid', 'grid'), ('Line/Hole', 'line_name'), ('Loop', 'loop_name'),
+            ('Current', 'current'), ('Coil\nArea', 'coil_area')]}
+        self.pem_list.setHeaderLabels(['File'] + [col.replace('_', ' ') for col in header_columns])
+        self.pem_list.header().setSectionResizeMode(QHeaderView.ResizeToContents)
         header = self.table.horizontalHeader()
         header.hide()
         header.setSectionResizeMode(0, QHeaderView.Stretch)
@@ -291,7 +342,7 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             Helper function to run self.open_gps_share
             :param obj_str: str, either 'loop', 'line', 'collar', or 'segments'
             """
-            piw_widget = self.pem_info_widgets[self.table.currentRow()]
+            piw_widget = self.get_pem_info_widget(self.pem_files[self.table.currentRow()])
             if obj_str == 'loop':
                 gps_obj = piw_widget.get_loop()
             elif obj_str == 'line':
@@ -311,6 +362,7 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             if pem_file.is_derotated():
                 pem_file.prep_rotation("unrotate")
                 pem_file = pem_file.rotate(method="unrotate")
+                mark_modified(pem_file)
                 self.refresh_pem(pem_file)
                 self.update_selection_text()  # Update selection text since the file is currently selected
                 self.status_bar.showMessage("XY data rotation reverted.", 1500)
@@ -374,8 +426,8 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         self.calc_mag_dec_action.triggered.connect(self.open_mag_dec)
 
         # View GPS
-        self.view_loop_action.triggered.connect(lambda: self.pem_info_widgets[self.table.currentRow()].add_loop())
-        self.view_line_action.triggered.connect(lambda: self.pem_info_widgets[self.table.currentRow()].add_line())
+        self.view_loop_action.triggered.connect(lambda: self.current_pem_info_widget().add_loop())
+        self.view_line_action.triggered.connect(lambda: self.current_pem_info_widget().add_line())
 
         # Share GPS
         self.share_loop_action.triggered.connect(lambda: share_gps('loop'))
@@ -397,6 +449,8 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         self.average_action.setIcon(get_icon('average.png'))
         self.split_action.triggered.connect(lambda: self.split_pem_channels(selected=True))
         self.split_action.setIcon(get_icon('split.png'))
+        self.auto_clean_action.triggered.connect(lambda: self.auto_clean_pem_data(selected=True))
+        self.auto_clean_action.setStatusTip("Delete the outlier readings, as the auto-clean of the plot editor")
         self.scale_current_action.triggered.connect(lambda: self.scale_pem_current(selected=True))
         self.scale_current_action.setIcon(get_icon('current.png'))
         self.scale_ca_action.triggered.connect(lambda: self.scale_pem_coil_area(selected=True))
@@ -433,6 +487,16 @@ class PEMHub(QMainWindow, Ui_PEMHub):
 
         self.actionNRCan_Declination_Calculator.triggered.connect(self.open_nrcan_calculator)
 
+        # Undo and redo the processing
+        self.undo_action.setShortcut("Ctrl+Z")
+        self.undo_action.setIcon(get_icon('undo.png'))
+        self.undo_action.triggered.connect(self.undo_processing)
+        self.redo_action.setShortcut("Ctrl+Y")
+        self.redo_action.triggered.connect(self.redo_processing)
+        self.menuPEM.insertActions(self.menuPEM.actions()[0], [self.undo_action, self.redo_action])
+        self.menuPEM.insertSeparator(self.menuPEM.actions()[2])
+        self.update_undo_actions()
+
     def init_signals(self):
         if self.splash_screen:
             self.splash_screen.showMessage("Initializing signals")
@@ -466,25 +530,11 @@ class PEMHub(QMainWindow, Ui_PEMHub):
                         self.table.item(row, col).setText(str(old_path.name))
                     else:
                         pem_file.filepath = new_path
+                        self.pem_files.reindex()
                         self.fill_pem_list()
                         self.reorder_pems()
                         self.status_bar.showMessage(f"{old_path.name} renamed to {str(new_value)}", 2000)
 
-            elif col == self.table_columns.index('Date'):
-                pem_file.date = value
-
-            elif col == self.table_columns.index('Client'):
-                pem_file.client = value
-
-            elif col == self.table_columns.index('Grid'):
-                pem_file.grid = value
-
-            elif col == self.table_columns.index('Line/Hole'):
-                pem_file.line_name = value
-
-            elif col == self.table_columns.index('Loop'):
-                pem_file.loop_name = value
-
             elif col == self.table_columns.index('Current'):
                 try:
                     value = float(value)
@@ -493,7 +543,7 @@ class PEMHub(QMainWindow, Ui_PEMHub):
                     self.message.critical(self, 'Invalid Value', f"Current must be a number")
                     self.add_pem_to_table(pem_file, row)
                 else:
-                    pem_file.current = value
+                    self.update_pem_headers([pem_file], current=value)
 
             elif col == self.table_columns.index('Coil\nArea'):
                 try:
@@ -503,10 +553,10 @@ class PEMHub(QMainWindow, Ui_PEMHub):
                     self.message.critical(self, 'Invalid Value', f"Coil area Must be a number")
                     self.add_pem_to_table(pem_file, row)
                 else:
-                    pem_file.coil_area = value
+                    self.update_pem_headers([pem_file], coil_area=value)
 
-            self.format_row(row)
-            self.color_table_by_values()
+            elif col in self.table_attributes:
+                self.update_pem_headers([pem_file], **{self.table_attributes[col]: value})
 
             if self.allow_signals:
                 self.table.blockSignals(False)
@@ -538,6 +588,7 @@ class PEMHub(QMainWindow, Ui_PEMHub):
                 :param data: pd.DataFrame of the data with the stations re-named.
                 """
                 pem_file.data = data
+                mark_modified(pem_file)
                 self.refresh_pem(pem_file)
 
             if col == self.table_columns.index('Date'):
@@ -593,17 +644,17 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             """
             Update the header of each PEM file when the Apply button is clicked for the shared header.
             """
+            values = {}
             if self.share_client_cbox.isChecked():
-                for row in range(self.table.rowCount()):
-                    self.table.item(row, 2).setText(self.client_edit.text())
-
+                values['client'] = self.client_edit.text()
             if self.share_grid_cbox.isChecked():
-                for row in range(self.table.rowCount()):
-                    self.table.item(row, 3).setText(self.grid_edit.text())
-
+                values['grid'] = self.grid_edit.text()
             if self.share_loop_cbox.isChecked():
-                for row in range(self.table.rowCount()):
-                    self.table.item(row, 5).setText(self.loop_edit.text())
+                values['loop_name'] = self.loop_edit.text()
+
+            if values:
+                changed = self.update_pem_headers(self.pem_files, **values)
+                self.status_bar.showMessage(f"Header of {len(changed)} PEM file(s) updated.", 2000)
 
         def auto_name(which):
             """
@@ -635,6 +686,7 @@ class PEMHub(QMainWindow, Ui_PEMHub):
                     new_name = pem_file.auto_name_line()
                     self.table.item(row, column).setText(new_name)
 
+            self.pem_files.reindex()
             self.table.blockSignals(False)
             self.status_bar.showMessage(f"Renaming complete.", 1500)
 
@@ -662,12 +714,12 @@ class PEMHub(QMainWindow, Ui_PEMHub):
                 self.add_gps_btn.setEnabled(False)
                 self.remove_gps_btn.setEnabled(False)
 
-        def open_list_file(item):
+        def open_list_file(filename):
             """
             Signal slot, open the file that was double clicked in the PEM or GPS lists.
-            :param item: QListWidget item
+            :param filename: str, filepath relative to the project directory
             """
-            os.startfile(str(self.project_dir.joinpath(item.text())))
+            os.startfile(str(self.project_dir.joinpath(filename)))
 
         def add_pem_list_files(today=False):
             """
@@ -677,12 +729,14 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             if today is True:
                 date = datetime.date.today()
                 date_str = date.strftime('%m%d')
-                todays_pem_files = list(Path(self.project_dir).rglob(f"*_{date_str}*.pem"))
-                todays_dmp_files = list(Path(self.project_dir).rglob(f"*_{date_str}*.dmp*"))
+                project_files = [file for file, _, _ in self.get_project_index().get_files(pem_extensions)
+                                 if f"_{date_str}" in file.name]
+                todays_pem_files = [file for file in project_files if file.suffix.lower() == '.pem']
+                todays_dmp_files = [file for file in project_files if file.suffix.lower() != '.pem']
                 self.add_pem_files(todays_pem_files)
                 self.add_dmp_files(todays_dmp_files)
             else:
-                selected_files = [Path(self.project_dir, i.text()) for i in self.pem_list.selectedItems()]
+                selected_files = [Path(self.project_dir, i.text(0)) for i in self.pem_list.selectedItems()]
 
                 pem_filepaths = [j for j in selected_files if j.suffix.lower() == '.pem']
                 dmp_filepaths = [k for k in selected_files if k.suffix.lower() in ['.dmp', '.dmp2', '.dmp3', '.dmp4']]
@@ -705,11 +759,11 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             response = self.message.question(self, "Confirm Delete", f"Delete selected PEM file(s)?",
                                              self.message.Yes, self.message.No)
             if response == self.message.Yes:
-                selected_rows = [self.pem_list.row(i) for i in self.pem_list.selectedItems()]
+                selected_rows = [self.pem_list.indexOfTopLevelItem(i) for i in self.pem_list.selectedItems()]
                 for row in sorted(selected_rows, reverse=True):
                     print(f"Deleting {self.available_pems[row]}")
                     os.remove(self.available_pems[row])
-                    self.pem_list.takeItem(row)
+                    self.pem_list.takeTopLevelItem(row)
                     self.available_pems.pop(row)
 
         def remove_gps_list_files():
@@ -771,7 +825,7 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         self.table.installEventFilter(self)
         self.table.setFocusPolicy(Qt.StrongFocus)
 
-        self.table.itemSelectionChanged.connect(lambda: self.stackedWidget.setCurrentIndex(self.table.currentRow()))
+        self.table.itemSelectionChanged.connect(self.show_pem_info_widget)
         self.table.itemSelectionChanged.connect(self.update_selection_text)
         self.table.cellChanged.connect(table_value_changed)
         self.table.cellClicked.connect(cell_clicked)
@@ -787,8 +841,8 @@ class PEMHub(QMainWindow, Ui_PEMHub):
 
         self.pem_list.itemSelectionChanged.connect(toggle_pem_list_buttons)
         self.gps_list.itemSelectionChanged.connect(toggle_gps_list_buttons)
-        self.pem_list.itemDoubleClicked.connect(open_list_file)
-        self.gps_list.itemDoubleClicked.connect(open_list_file)
+        self.pem_list.itemDoubleClicked.connect(lambda item, col: open_list_file(item.text(0)))
+        self.gps_list.itemDoubleClicked.connect(lambda item: open_list_file(item.text()))
 
         self.add_pem_btn.clicked.connect(lambda: add_pem_list_files(today=False))
         self.add_today_pem_btn.clicked.connect(lambda: add_pem_list_files(today=True))
@@ -827,6 +881,10 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         self.actionRename_Suffixes.triggered.connect(lambda: self.change_suffix(selected=False))
         self.actionAverage_All_PEM_Files.triggered.connect(lambda: self.average_pem_data(selected=False))
         self.actionSplit_All_PEM_Files.triggered.connect(lambda: self.split_pem_channels(selected=False))
+        self.auto_clean_all_action.triggered.connect(lambda: self.auto_clean_pem_data(selected=False))
+        self.auto_clean_all_action.setStatusTip("Delete the outlier readings of all PEM files")
+        self.menuPEM.insertAction(self.actionScale_All_Currents, self.auto_clean_all_action)
+        self.menuPEM.insertSeparator(self.actionScale_All_Currents)
         self.actionScale_All_Currents.triggered.connect(lambda: self.scale_pem_current(selected=False))
         self.actionChange_All_Coil_Areas.triggered.connect(lambda: self.scale_pem_coil_area(selected=False))
         # self.actionOffset_Mag.triggered.connect(lambda: self.mag_offset_lastchn(selected=False))
@@ -873,6 +931,9 @@ class PEMHub(QMainWindow, Ui_PEMHub):
 
         # Help menu
         self.actionView_Logs.triggered.connect(open_logs)
+        self.performance_action.setStatusTip("Timings of the instrumented parts of PEMPro")
+        self.performance_action.triggered.connect(self.open_performance_viewer)
+        self.menuHelp.addAction(self.performance_action)
         self.enable_menus(False)
 
     def init_project_directory(self):
@@ -954,6 +1015,8 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         settings.setValue("auto_create_backup_files_cbox", self.auto_create_backup_files_cbox.isChecked())
         settings.setValue("delete_merged_files_cbox", self.delete_merged_files_cbox.isChecked())
         settings.setValue("actionRename_Merged_Files", self.actionRename_Merged_Files.isChecked())
+        # Subsystems enabled by the environment variable are not saved
+        settings.setValue("instrumented_subsystems", instrumentation.get_enabled_by_user())
 
         # Project directory
         settings.setValue("project_dir", self.project_dir)
@@ -998,6 +1061,12 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             settings.value("delete_merged_files_cbox", defaultValue=True, type=bool))
         self.actionRename_Merged_Files.setChecked(
             settings.value("actionRename_Merged_Files", defaultValue=True, type=bool))
+        # Subsystems enabled in the environment variable stay enabled
+        instrumented_subsystems = settings.value("instrumented_subsystems") or []
+        if isinstance(instrumented_subsystems, str):
+            instrumented_subsystems = [instrumented_subsystems]
+        if instrumented_subsystems:
+            instrumentation.enable(*instrumented_subsystems)
 
         # Project directory
         project_dir = settings.value("project_dir")
@@ -1011,7 +1080,16 @@ class PEMHub(QMainWindow, Ui_PEMHub):
 
         # Files
         last_opened_pems = settings.value("last_opened_files")
-        if last_opened_pems:
+        restored = False
+        if self.session.get_manifest() is not None:
+            response = self.message.question(self, 'Restore Session', "Restore the PEM files of the last session, "
+                                                                      "including any unsaved changes?",
+                                             self.message.Yes | self.message.No)
+            if response == self.message.Yes:
+                restored = self.restore_session()
+
+        # Declining or canceling the restore falls back to opening the last files from disk
+        if not restored and last_opened_pems:
             last_opened_pems: list
             response = self.message.question(self, 'Open Previous Files', "Open the last previously opened PEM files?",
                                              self.message.Yes | self.message.No)
@@ -1021,6 +1099,59 @@ class PEMHub(QMainWindow, Ui_PEMHub):
 
         settings.endGroup()
 
+    def save_session(self, wait=False):
+        """
+        Save the opened PEM files and the project information in the session, in the background. Only the files that
+        changed since the last save are written.
+        :param wait: bool, wait until the session is written.
+        """
+        self.session_timer.stop()
+        if self.job_runner.is_running():
+            # The files are being modified by the job runner, save them once it's done
+            self.session_timer.start()
+            return
+        crs = self.get_crs()
+        self.session.save(self.pem_files, wait=wait,
+                          crs=crs.to_wkt() if crs is not None else None,
+                          client=self.client_edit.text(),
+                          grid=self.grid_edit.text(),
+                          loop=self.loop_edit.text())
+
+    def restore_session(self):
+        """
+        Open the PEM files of the last session as they were, without parsing them again.
+        :return: bool, True if any file was restored.
+        """
+        with CustomProgressDialog("Restoring Session...", 0, 0) as dlg:
+            def is_canceled():
+                QApplication.processEvents()
+                return dlg.wasCanceled()
+
+            manifest, pem_files = self.session.load(is_canceled=is_canceled)
+        if not pem_files:
+            return False
+
+        logger.info(f"Restoring {len(pem_files)} PEM files from the last session.")
+        if manifest.get('crs'):
+            self.set_crs(CRS.from_wkt(manifest['crs']))
+        self.client_edit.setText(manifest.get('client', ''))
+        self.grid_edit.setText(manifest.get('grid', ''))
+        self.loop_edit.setText(manifest.get('loop', ''))
+        self.add_pem_files(pem_files)
+
+        # Put the files back in the order of the session
+        order = {id(pem_file): i for i, pem_file in enumerate(pem_files)}
+        if [id(pem_file) for pem_file in self.pem_files] != list(order):
+            self.table.setUpdatesEnabled(False)
+            self.table.blockSignals(True)
+            self.pem_files.sort(key=lambda x: order.get(id(x), len(order)))
+            for row, pem_file in enumerate(self.pem_files):
+                self.add_pem_to_table(pem_file, row)
+            self.table.setUpdatesEnabled(True)
+            self.table.blockSignals(False)
+        self.color_table_by_values()
+        return True
+
     def reset_settings(self):
         settings = QSettings("Crone Geophysics", "PEMPro")
         settings.clear()
@@ -1205,6 +1336,7 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             # Data editing
             self.right_click_menu.addAction(self.average_action)
             self.right_click_menu.addAction(self.split_action)
+            self.right_click_menu.addAction(self.auto_clean_action)
             self.right_click_menu.addAction(self.scale_current_action)
             self.right_click_menu.addAction(self.scale_ca_action)
             # self.menu.addAction(self.mag_offset_action)
@@ -1265,12 +1397,10 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             if event.type() == QEvent.KeyPress:
                 if self.pem_files:
                     if event.key() == Qt.Key_Left:
-                        current_tab = self.pem_info_widgets[0].tabs.currentIndex()
-                        self.change_pem_info_tab(current_tab - 1)
+                        self.change_pem_info_tab(self.tab_num - 1)
                         return True
                     elif event.key() == Qt.Key_Right:
-                        current_tab = self.pem_info_widgets[0].tabs.currentIndex()
-                        self.change_pem_info_tab(current_tab + 1)
+                        self.change_pem_info_tab(self.tab_num + 1)
                         return True
                     elif event.key() == Qt.Key_Escape:
                         self.table.clearSelection()
@@ -1308,7 +1438,7 @@ class PEMHub(QMainWindow, Ui_PEMHub):
                 e.ignore()
                 return
 
-            current_piw = self.stackedWidget.currentWidget()
+            current_piw = self.current_pem_info_widget()
             eligible_tabs = [current_piw.station_gps_tab,
                              current_piw.loop_gps_tab,
                              current_piw.geometry_tab]
@@ -1370,6 +1500,8 @@ class PEMHub(QMainWindow, Ui_PEMHub):
 
     def closeEvent(self, e):
         self.save_settings()
+        self.save_session(wait=True)
+        self.journal.clear()
         sys.exit(self.app.exec_())  # Close any other opened widgets
         # e.accept()
 
@@ -1381,14 +1513,10 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         if isinstance(file, PEMFile):
             file = file.filepath
 
-        if self.pem_files:
-            existing_filepaths = [file.filepath.absolute() for file in self.pem_files]
-            if file.absolute() in existing_filepaths:
-                logger.info(f"{file.name} is already opened.")
-                self.status_bar.showMessage(f"{file.name} is already opened", 2000)
-                return True
-            else:
-                return False
+        if self.pem_files.find(file) is not None:
+            logger.info(f"{file.name} is already opened.")
+            self.status_bar.showMessage(f"{file.name} is already opened", 2000)
+            return True
         else:
             return False
 
@@ -1398,9 +1526,106 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         :param tab_num: tab index number to change to
         """
         self.tab_num = tab_num
-        if len(self.pem_info_widgets) > 0:
-            for widget in self.pem_info_widgets:
-                widget.tabs.setCurrentIndex(self.tab_num)
+        for widget in self.pem_info_widgets.values():
+            widget.tabs.blockSignals(True)
+            widget.tabs.setCurrentIndex(self.tab_num)
+            widget.tabs.blockSignals(False)
+
+    def create_pem_info_widget(self, pem_file):
+        """
+        Create the PEMFileInfoWidget for the PEM file
+        :param pem_file: PEMFile object
+        :return: PEMFileInfoWidget object
+        """
+        def share_gps_object(obj):
+            """
+            Share a GPS object (loop, line, collar, segments) of one file with all other opened PEM files.
+            :param obj: BaseGPS object, which GPS object to share
+            """
+            df = obj.df.dropna()
+            if df.empty:
+                return
+
+            self.open_gps_share(obj, pem_info_widget)
+
+        pem_info_widget = PEMFileInfoWidget(parent=self, darkmode=self.darkmode)
+        pem_info_widget.blockSignals(True)
+
+        # Create the PEMInfoWidget for the PEM file
+        pem_info_widget.open_pem_file(pem_file)
+        # Change the current tab of this widget to the same as the opened ones
+        pem_info_widget.tabs.setCurrentIndex(self.tab_num)
+        # Connect a signal to change the tab when another PIW tab is changed
+        pem_info_widget.tabs.currentChanged.connect(self.change_pem_info_tab)
+
+        # Connect a signal to refresh the main table row when changes are made in the pem_info_widget tables
+        # The signal is emitted after the GPS of the file is changed in the pem_info_widget
+        pem_info_widget.refresh_row_signal.connect(lambda: self.refresh_pem(mark_modified(pem_info_widget.pem_file)))
+        # Ensure the CRS of each GPS object is always up to date
+        pem_info_widget.refresh_row_signal.connect(lambda: pem_file.set_crs(self.get_crs()))
+
+        pem_info_widget.share_loop_signal.connect(share_gps_object)
+        pem_info_widget.share_line_signal.connect(share_gps_object)
+        pem_info_widget.share_collar_signal.connect(share_gps_object)
+        pem_info_widget.share_segments_signal.connect(share_gps_object)
+
+        pem_info_widget.blockSignals(False)
+        return pem_info_widget
+
+    def get_pem_info_widget(self, pem_file):
+        """
+        Return the PEMFileInfoWidget of a PEM file, creating it if the file doesn't have one. Only the
+        PIW_CACHE_SIZE most recently used widgets are kept, the others are released. Everything shown in the widget is
+        kept in the PEMFile, so a released widget is simply created again.
+        :param pem_file: PEMFile object, file opened in PEMHub
+        :return: PEMFileInfoWidget object
+        """
+        key = id(pem_file)
+        if key in self.pem_info_widgets:
+            self.pem_info_widgets.move_to_end(key)
+            return self.pem_info_widgets[key]
+
+        logger.debug(f"Creating the PEMFileInfoWidget of {pem_file.filepath.name}.")
+        pem_info_widget = self.create_pem_info_widget(pem_file)
+        self.pem_info_widgets[key] = pem_info_widget
+        self.stackedWidget.addWidget(pem_info_widget)
+
+        # Release the least recently used widgets, other than the one currently shown
+        current_widget = self.stackedWidget.currentWidget()
+        for old_key in list(self.pem_info_widgets.keys()):
+            if len(self.pem_info_widgets) <= PIW_CACHE_SIZE:
+                break
+            if self.pem_info_widgets[old_key] is not current_widget:
+                self.release_pem_info_widget(self.pem_info_widgets.pop(old_key))
+        return pem_info_widget
+
+    def release_pem_info_widget(self, pem_info_widget):
+        """
+        Remove a PEMFileInfoWidget from the stacked widget and delete it.
+        :param pem_info_widget: PEMFileInfoWidget object
+        """
+        self.stackedWidget.removeWidget(pem_info_widget)
+        pem_info_widget.close()
+        pem_info_widget.deleteLater()
+
+    def current_pem_info_widget(self):
+        """
+        Return the PEMFileInfoWidget of the current row of the table, or of the first file if no row is selected.
+        :return: PEMFileInfoWidget object, or None if no file is opened.
+        """
+        if not self.pem_files:
+            return None
+        row = self.table.currentRow()
+        return self.get_pem_info_widget(self.pem_files[row if 0 <= row < len(self.pem_files) else 0])
+
+    def show_pem_info_widget(self):
+        """
+        Signal slot, show the PEMFileInfoWidget of the selected file. The widget is created the first time the
+        file is selected.
+        """
+        pem_info_widget = self.current_pem_info_widget()
+        if pem_info_widget is not None:
+            self.stackedWidget.setCurrentWidget(pem_info_widget)
 
     def add_dmp_files(self, dmp_files):
         """
@@ -1414,35 +1639,34 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             dmp_files = [dmp_files]
 
         dmp_files = [Path(f) for f in dmp_files]
+        errors = []
+        for file in [f for f in dmp_files if not f.exists()]:
+            errors.append(f"{file.name} does not exist.")
+        dmp_files = [f for f in dmp_files if f.exists()]
 
-        dmp_parser = DMPParser()
         pem_files = []
-
         with CustomProgressDialog("Converting DMP Files...", 0, len(dmp_files)) as dlg:
-            for file in dmp_files:
-                if dlg.wasCanceled():
-                    break
-                dlg.setLabelText(f"Converting {Path(file).name}")
+            def is_canceled():
+                QApplication.processEvents()
+                return dlg.wasCanceled()
 
-                if not file.exists():
-                    self.message.critical(self, "Error", f"{file.name} does not exist.")
+            # The files are converted in worker processes, and the errors are shown together at the end
+            for file, result, error in convert_dmp_files(dmp_files, is_canceled=is_canceled):
+                dlg.setLabelText(f"Converted {file.name}")
+                dlg += 1
+                if error is not None:
+                    logger.critical(f"{error}")
+                    errors.append(f"Error converting {file.name}: {error}")
                     continue
 
-                try:
-                    pem_file, inf_errors = dmp_parser.parse(file)
-                except Exception as e:
-                    logger.critical(f"{e}")
-                    self.error.showMessage(f"Error converting DMP file: {str(e)}")
-                    dlg += 1
-                    continue
-                else:
-                    if not inf_errors.empty:
-                        error_str = inf_errors.loc[:, ['Station', 'Component', 'Reading_number']].to_string()
-                        self.message.warning(self, f'{Path(file).name} Data Errors',
-                                             f'The following readings had INF values:\n{error_str}')
-                    pem_files.append(pem_file)
-                finally:
-                    dlg += 1
+                pem_file, inf_errors = result
+                if not inf_errors.empty:
+                    error_str = inf_errors.loc[:, ['Station', 'Component', 'Reading_number']].to_string()
+                    errors.append(f"{file.name} readings with INF values:\n{error_str}")
+                pem_files.append(pem_file)
+
+        if errors:
+            self.message.warning(self, 'DMP Conversion Errors', '\n\n'.join(errors))
 
         self.add_pem_files(pem_files)
 
@@ -1452,46 +1676,6 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         :param pem_files: list or str/Path, Filepaths for the PEM Files
         :param refresh: Bool, refresh (re-open) the PEMFile if it already opened.
         """
-        def add_piw_widget(pem_file):
-            """
-            Create the PEMFileInfoWidget for the PEM file
-            :param pem_file: PEMFile object
-            :return: None
-            """
-            def share_gps_object(obj):
-                """
-                Share a GPS object (loop, line, collar, segments) of one file with all other opened PEM files.
-                :param obj: BaseGPS object, which GPS object to share
-                """
-                df = obj.df.dropna()
-                if df.empty:
-                    return
-
-                self.open_gps_share(obj, pem_info_widget)
-
-            pem_info_widget = PEMFileInfoWidget(parent=self, darkmode=self.darkmode)
-            pem_info_widget.blockSignals(True)
-
-            # Create the PEMInfoWidget for the PEM file
-            pem_info_widget.open_pem_file(pem_file)
-            # Change the current tab of this widget to the same as the opened ones
-            pem_info_widget.tabs.setCurrentIndex(self.tab_num)
-            # Connect a signal to change the tab when another PIW tab is changed
-            pem_info_widget.tabs.currentChanged.connect(self.change_pem_info_tab)
-
-            # Connect a signal to refresh the main table row when changes are made in the pem_info_widget tables
-            pem_info_widget.refresh_row_signal.connect(lambda: self.refresh_pem(pem_info_widget.pem_file))
-            # Ensure the CRS of each GPS object is always up to date
-            pem_info_widget.refresh_row_signal.connect(lambda: pem_file.set_crs(self.get_crs()))
-
-            pem_info_widget.share_loop_signal.connect(share_gps_object)
-            pem_info_widget.share_line_signal.connect(share_gps_object)
-            pem_info_widget.share_collar_signal.connect(share_gps_object)
-            pem_info_widget.share_segments_signal.connect(share_gps_object)
-
-            pem_info_widget.blockSignals(False)
-            return pem_info_widget
-
         def get_insertion_point(pem_file):
             """
             Find the index to insert the pem_file (and associated widget)
@@ -1503,10 +1687,7 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             elif self.auto_sort_files_cbox.isChecked() is False:
                 i = self.table.rowCount()
             else:
-                pems = copy.deepcopy(self.pem_files)
-                pems.append(pem_file)
-                pems = natsort.os_sorted(pems, key=lambda x: x.filepath.name)
-                i = pems.index(pem_file)
+                i = self.pem_files.get_insertion_point(pem_file)
             return i
 
         def share_header(pem_file):
@@ -1527,8 +1708,31 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         if not isinstance(pem_files, list):
             pem_files = [pem_files]
 
+        # Parse the filepaths in worker processes. Only the widget and table insertion below runs in the GUI thread.
+        parsed_files = {}
+        filepaths = [file for file in pem_files if not isinstance(file, PEMFile)]
+        if filepaths:
+            with CustomProgressDialog("Parsing PEM Files...", 0, len(filepaths)) as dlg:
+                def is_canceled():
+                    QApplication.processEvents()
+                    return dlg.wasCanceled()
+
+                for filepath, pem_file, error in parse_pem_files(filepaths, is_canceled=is_canceled):
+                    if error is not None:
+                        logger.critical(error)
+                        self.error.showMessage(f"Error parsing {filepath}: {error}")
+                    else:
+                        parsed_files[filepath] = pem_file
+                        dlg.setLabelText(f"Parsed {pem_file.filepath.name}")
+                    dlg += 1
+
+                if dlg.wasCanceled():
+                    return
+
+        pem_files = [file if isinstance(file, PEMFile) else parsed_files.get(file) for file in pem_files]
+        pem_files = natsort.os_sorted([file for file in pem_files if file is not None], key=lambda x: x.filepath.name)
+
         count = 0
-        parser = PEMParser()
         self.table.blockSignals(True)
         self.allow_signals = False
         self.table.setUpdatesEnabled(False)  # Suspends the animation of the table getting populated
@@ -1539,22 +1743,11 @@ class PEMHub(QMainWindow, Ui_PEMHub):
                 if dlg.wasCanceled():
                     break
 
-                # Create a PEMFile object if a filepath was passed
-                if not isinstance(pem_file, PEMFile):
-                    try:
-                        pem_file = parser.parse(pem_file)
-                    except Exception as e:
-                        logger.critical(str(e))
-                        self.error.showMessage(f"Error parsing {pem_file}: {str(e)}")
-                        dlg += 1
-                        continue
-
                 logger.info(f"Adding {pem_file.filepath.name} to hub.")
                 # Check if the file is already opened in the table. Won't open if it is, unless 'refresh' is True
                 if self.is_opened(pem_file):
                     if refresh is True:
-                        existing_filepaths = [file.filepath.absolute() for file in self.pem_files]
-                        ind = existing_filepaths.index(pem_file.filepath.absolute())
+                        ind = self.pem_files.index(self.pem_files.find(pem_file.filepath))
                         self.remove_pem_file([ind])
                     else:
                         logger.info(f"{pem_file.filepath.name} already opened.")
@@ -1563,8 +1756,6 @@ class PEMHub(QMainWindow, Ui_PEMHub):
                         continue
 
                 dlg.setLabelText(f"Opening {pem_file.filepath.name}")
-                # Create the PEMInfoWidget
-                pem_widget = add_piw_widget(pem_file)
 
                 # Fill the shared header text boxes and move the project directory
                 if not self.pem_files:
@@ -1592,8 +1783,6 @@ class PEMHub(QMainWindow, Ui_PEMHub):
 
                 i = get_insertion_point(pem_file)
                 self.pem_files.insert(i, pem_file)
-                self.pem_info_widgets.insert(i, pem_widget)
-                self.stackedWidget.insertWidget(i, pem_widget)
                 self.table.insertRow(i)
                 self.add_pem_to_table(pem_file, i)
 
@@ -1605,10 +1794,12 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         self.table.blockSignals(False)
 
         self.table.horizontalHeader().show()
+        self.show_pem_info_widget()
         self.status_bar.showMessage(f"{count} PEM files opened.", 1500)
 
         # Save the settings incase it crashes
         self.save_settings()
+        self.session_timer.start()
 
     def add_pem_to_table(self, pem_file, row):
         """
@@ -1621,6 +1812,13 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         assert self.table.rowCount() >= row, f"PEM file to be added to row {row}, but {self.table.rowCount()} exist."
         self.table.blockSignals(True)
 
+        summary = get_summary(pem_file)
+        min_station, max_station = summary.min_station, summary.max_station
+        # Keep the numeric values of the colored columns, so the table can be colored without reading the cells
+        self.table_values[id(pem_file)] = np.array([pem_file.current, pem_file.coil_area,
+                                                    np.nan if min_station is None else min_station,
+                                                    np.nan if max_station is None else max_station], dtype=float)
+
         # Get the information for each column
         row_info = [
             pem_file.filepath.name,
@@ -1631,14 +1829,14 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             pem_file.loop_name,
             pem_file.current,
             pem_file.coil_area,
-            pem_file.get_min_station(),
-            pem_file.get_max_station(),
-            pem_file.is_averaged(),
-            pem_file.is_split(),
-            pem_file.get_number_gps_warnings(),
-            len(pem_file.get_suffix_warnings()),
-            len(pem_file.get_repeats()),
-            "N/A" if not pem_file.has_all_gps() else ', '.join(pem_file.get_reversed_components())
+            min_station,
+            max_station,
+            summary.is_averaged,
+            summary.is_split,
+            summary.number_gps_warnings,
+            summary.number_suffix_warnings,
+            summary.number_repeats,
+            "N/A" if not summary.has_all_gps else ', '.join(summary.reversed_components)
         ]
 
         # Set the information into each cell. Columns from First Station and on can't be edited.
@@ -1661,7 +1859,7 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         of the PEMInfoWidget is currently selected.
         :param gps_files: list or str, filepaths of text file or GPX files
         """
-        pem_info_widget = self.stackedWidget.currentWidget()
+        pem_info_widget = self.current_pem_info_widget()
         current_crs = self.get_crs()
 
         if not isinstance(gps_files, list):
@@ -1703,7 +1901,7 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         :param ri_files: list, str filepaths with step plot information in them
         """
         ri_file = ri_files[0]
-        pem_info_widget = self.stackedWidget.currentWidget()
+        pem_info_widget = self.current_pem_info_widget()
         pem_info_widget.open_ri_file(ri_file)
 
     def enable_menus(self, enable):
@@ -1730,22 +1928,15 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             for row in reversed(range(self.table.rowCount())):
                 self.table.removeRow(row)
 
-            for widget in reversed(self.pem_info_widgets):
-                self.stackedWidget.removeWidget(widget)
-
-            sorted_objects = natsort.os_sorted((zip(self.pem_files, self.pem_info_widgets)),
-                                        key=lambda x: str(x[0].filepath))
+            self.pem_files.sort(key=natsort.os_sort_keygen(key=lambda x: str(x.filepath)))
 
-            for i, (pem, piw) in enumerate(sorted_objects):
+            for i, pem in enumerate(self.pem_files):
                 self.table.insertRow(i)
-                self.stackedWidget.insertWidget(i, piw)
                 self.add_pem_to_table(pem, i)
 
-            self.pem_files = [i[0] for i in sorted_objects]
-            self.pem_info_widgets = [i[1] for i in sorted_objects]
-
             self.table.setUpdatesEnabled(True)
             self.table.blockSignals(False)
+            self.session_timer.start()
 
     def remove_pem_file(self, rows=None):
         """
@@ -1763,10 +1954,12 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         for row in rows:
             logger.info(f"Removing {self.pem_files[row].filepath.name}.")
             self.table.removeRow(row)
-            self.stackedWidget.removeWidget(self.stackedWidget.widget(row))
+            pem_info_widget = self.pem_info_widgets.pop(id(self.pem_files[row]), None)
+            if pem_info_widget is not None:
+                self.release_pem_info_widget(pem_info_widget)
+            self.table_values.pop(id(self.pem_files[row]), None)
+            self.journal.forget(self.pem_files[row])
             del self.pem_files[row]
-            self.pem_info_widgets[row].close()
-            del self.pem_info_widgets[row]
 
         if len(self.pem_files) == 0:
             self.table.horizontalHeader().hide()
@@ -1781,6 +1974,7 @@ class PEMHub(QMainWindow, Ui_PEMHub):
 
         self.reset_selection_labels()
         self.setUpdatesEnabled(True)
+        self.session_timer.start()
 
     def open_in_text_editor(self):
         """
@@ -1830,6 +2024,7 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             Re-open the PEM file. File is actually saved in PEMPlotEditor.
             :param pem_file: PEMFile object emitted by the signal
             """
+            mark_modified(pem_file)
             self.refresh_pem(pem_file)
 
         def close_editor(editor):
@@ -1837,6 +2032,8 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             Remove the editor from the list of pem_editors, and update the information in the table.
             :param editor: PEMPlotEditor object emitted by the signal
             """
+            # The editor changes the data of the file
+            mark_modified(editor.pem_file)
             self.refresh_pem(editor.pem_file)
             self.pem_editor_widgets.remove(editor)
 
@@ -1867,6 +2064,7 @@ class PEMHub(QMainWindow, Ui_PEMHub):
     def open_derotator(self):
         def accept_file(rotated_pem):
             self.pem_files[row] = rotated_pem
+            mark_modified(rotated_pem)
             self.refresh_pem(rotated_pem)
 
         pem_files, rows = self.get_pem_files(selected=True)
@@ -1886,6 +2084,7 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         def accept_geometry(seg):
             for file in pem_files:
                 file.segments = seg
+                mark_modified(file)
                 self.refresh_pem(file)
             self.status_bar.showMessage(f"Geometry updated for {', '.join([file.filepath.name for file in pem_files])}."
                                         , 2000)
@@ -2009,7 +2208,7 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         # Gather the RI files
         ri_files = []
         for row, pem_file in zip(rows, pem_files):
-            ri_files.append(self.pem_info_widgets[row].ri_file)
+            ri_files.append(getattr(pem_file, 'ri_file', None))
 
         # Disable plan map creation if no CRS is selected or if the CRS is geographic.
         crs = self.get_crs()
@@ -2094,6 +2293,7 @@ class PEMHub(QMainWindow, Ui_PEMHub):
                     os.rename(str(self.pem_files[row].filepath), str(self.pem_files[row].filepath.with_name(new_names[i])))
                     pem_files[row].filepath = pem_files[row].filepath.with_name(new_names[i])
                     self.pem_files[row].filepath = self.pem_files[row].filepath.with_name(new_names[i])
+            self.pem_files.reindex()
             self.table.blockSignals(False)
             batch_name_editor.open(pem_files, kind=kind)
 
@@ -2115,8 +2315,7 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         def open_ri_files(files):
             if len(files) > 0:
                 for pem_file, ri_file in files.items():
-                    ind = self.pem_files.index(pem_file)
-                    self.pem_info_widgets[ind].open_ri_file(ri_file)
+                    self.get_pem_info_widget(pem_file).open_ri_file(ri_file)
                 self.status_bar.showMessage(f"Imported {len(files)} RI files", 2000)
             else:
                 pass
@@ -2193,6 +2392,8 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         """
         def apply_conversion(new_crs):
             self.set_crs(new_crs)
+            for pem_file in self.pem_files:
+                mark_modified(pem_file)  # The GPS of every file is converted
             self.refresh_pems()
 
         current_crs = self.get_crs()
@@ -2215,105 +2416,73 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         """
         def share_gps(mask):
             """
-            Add the gps_object to the selected files.
+            Add the gps_object to the selected files. The GPS is set in the PEMFiles, and the widgets of the files
+            are updated when the files are refreshed.
             :param mask: list, mask of which files were selected
             """
-            pem_info_widgets = np.array(piws)[mask]  # Filtered PIWs
+            selected_files = [f for f, selected in zip(pem_files, mask) if selected]
+            source_file = source_widget.pem_file
+            crs = self.get_crs()
 
-            with CustomProgressDialog('Sharing GPS...', 0, len(pem_info_widgets)) as dlg:
-                # Share each GPS object
-                if gps_object == 'all':
-                    for widget in pem_info_widgets:
-                        if dlg.wasCanceled():
-                            break
-                        dlg.setLabelText(f"Setting GPS of {widget.pem_file.filepath.name}")
+            with CustomProgressDialog('Sharing GPS...', 0, len(selected_files)) as dlg:
+                for pem_file in selected_files:
+                    if dlg.wasCanceled():
+                        break
+                    dlg.setLabelText(f"Setting GPS of {pem_file.filepath.name}")
 
+                    # Share each GPS object
+                    if gps_object == 'all':
                         # Share the collar and segments if the source is a borehole
-                        if source_widget.pem_file.is_borehole():
-                            widget.fill_gps_table(source_widget.get_collar().df, widget.collar_table)
-                            widget.fill_gps_table(source_widget.get_segments().df, widget.segments_table)
-                            widget.gps_object_changed(widget.collar_table, refresh=False)
-                            widget.gps_object_changed(widget.segments_table, refresh=False)
+                        if source_file.is_borehole():
+                            pem_file.collar = BoreholeCollar(source_widget.get_collar().df.copy())
+                            pem_file.segments = BoreholeSegments(source_widget.get_segments().df.copy())
                         # Share the line GPS if it's a surface line
                         else:
-                            widget.fill_gps_table(source_widget.get_line().df, widget.line_table)
-                            widget.gps_object_changed(widget.line_table, refresh=False)
+                            pem_file.line = SurveyLine(source_widget.get_line().df.copy())
 
                         # Share the loop
-                        widget.fill_gps_table(source_widget.get_loop().df, widget.loop_table)
-                        widget.gps_object_changed(widget.loop_table, refresh=True)  # Only refresh at the end
-                        dlg += 1
+                        pem_file.loop = TransmitterLoop(source_widget.get_loop().df.copy())
 
-                else:
                     # Detect what kind of GPS object is being shared and share that object.
-                    if isinstance(gps_object, TransmitterLoop):
-                        for widget in pem_info_widgets:
-                            if dlg.wasCanceled():
-                                break
-                            dlg.setLabelText(f"Setting GPS of {widget.pem_file.filepath.name}")
-
-                            widget.fill_gps_table(gps_object.df, widget.loop_table)
-                            widget.gps_object_changed(widget.loop_table, refresh=True)
-                            dlg += 1
+                    elif isinstance(gps_object, TransmitterLoop):
+                        pem_file.loop = TransmitterLoop(gps_object.df.copy())
 
                     elif isinstance(gps_object, SurveyLine):
-                        for widget in pem_info_widgets:
-                            if dlg.wasCanceled():
-                                break
-                            dlg.setLabelText(f"Setting GPS of {widget.pem_file.filepath.name}")
-
-                            widget.fill_gps_table(gps_object.df, widget.line_table)
-                            widget.gps_object_changed(widget.line_table, refresh=True)
-                            dlg += 1
+                        pem_file.line = SurveyLine(gps_object.df.copy())
 
                     elif isinstance(gps_object, BoreholeCollar):
-                        for widget in pem_info_widgets:
-                            if dlg.wasCanceled():
-                                break
-                            dlg.setLabelText(f"Setting GPS of {widget.pem_file.filepath.name}")
-
-                            widget.fill_gps_table(gps_object.df, widget.collar_table)
-                            widget.gps_object_changed(widget.collar_table, refresh=True)
-                            dlg += 1
+                        pem_file.collar = BoreholeCollar(gps_object.df.copy())
 
                     elif isinstance(gps_object, BoreholeSegments):
-                        for widget in pem_info_widgets:
-                            if dlg.wasCanceled():
-                                break
-                            dlg.setLabelText(f"Setting GPS of {widget.pem_file.filepath.name}")
+                        pem_file.segments = BoreholeSegments(gps_object.df.copy())
 
-                            widget.fill_gps_table(gps_object.df, widget.segments_table)
-                            widget.gps_object_changed(widget.segments_table, refresh=True)
-                            dlg += 1
+                    pem_file.set_crs(crs)
+                    mark_modified(pem_file)
+                    self.refresh_pem(pem_file)
+                    dlg += 1
 
+        source_pem_file = source_widget.pem_file
         if gps_object == 'all':
-            is_borehole = source_widget.pem_file.is_borehole()
+            is_borehole = source_pem_file.is_borehole()
             # Filter PEM files to only include the same survey type as the selected file.
-            pem_files, piws = zip(*filter(lambda x: x[0].is_borehole() == is_borehole,
-                                          zip(self.pem_files, self.pem_info_widgets)))
+            pem_files = [f for f in self.pem_files if f.is_borehole() == is_borehole]
         else:
-            # Filter the PEM Files and PIWs based on the GPS object
+            # Filter the PEM Files based on the GPS object
             if isinstance(gps_object, TransmitterLoop):
-                pem_files, piws = self.pem_files, self.pem_info_widgets
+                pem_files = self.pem_files
 
             elif isinstance(gps_object, SurveyLine):
-                pem_files, piws = zip(*filter(lambda x: not x[0].is_borehole(),
-                                              zip(self.pem_files, self.pem_info_widgets)))
+                pem_files = [f for f in self.pem_files if not f.is_borehole()]
 
-            elif isinstance(gps_object, BoreholeCollar):
-                pem_files, piws = zip(*filter(lambda x: x[0].is_borehole(),
-                                              zip(self.pem_files, self.pem_info_widgets)))
-
-            elif isinstance(gps_object, BoreholeSegments):
-                pem_files, piws = zip(*filter(lambda x: x[0].is_borehole(),
-                                              zip(self.pem_files, self.pem_info_widgets)))
+            elif isinstance(gps_object, (BoreholeCollar, BoreholeSegments)):
+                pem_files = [f for f in self.pem_files if f.is_borehole()]
             else:
-                pem_files, piws = [], []
+                pem_files = []
 
         if len(pem_files) < 2:
             return
 
-        source_index = piws.index(source_widget)
+        source_index = pem_files.index(source_pem_file)
 
         gps_share = GPSShareWidget()
         refs.append(gps_share)
@@ -2386,6 +2555,11 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         refs.append(freq_converter)
         freq_converter.show()
 
+    def open_performance_viewer(self):
+        performance_viewer = PerformanceViewer(parent=self)
+        refs.append(performance_viewer)
+        performance_viewer.show()
+
     def open_gps_converter(self):
         gps_converter = GPSConversionWidget(parent=self)
         refs.append(gps_converter)
@@ -2584,18 +2758,73 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             self.fill_gps_list()
             self.fill_pem_list()
 
+    def get_project_index(self):
+        """
+        Return the index of the files in the project directory. The saved index of the directory is used right away,
+        and is brought up to date in the background.
+        :return: ProjectIndex object
+        """
+        if self.project_index is None or self.project_index.root != Path(self.project_dir).absolute():
+            self.project_index = ProjectIndex(self.project_dir)
+        self.update_project_index()
+        return self.project_index
+
+    def update_project_index(self):
+        """
+        Update the project index in a background thread. project_index_updated is emitted when files were added,
+        removed, renamed or edited.
+        """
+        if self.project_index is None:
+            return
+
+        self.index_requested.set()
+        if self.index_thread is not None and self.index_thread.is_alive():
+            return
+
+        index = self.project_index
+
+        def update_index():
+            first_update = not index.is_complete
+            while self.index_requested.is_set():
+                self.index_requested.clear()
+                try:
+                    changed = index.update(is_canceled=lambda: index is not self.project_index)
+                    # The headers shown in the PEM list are parsed here, so filling the list never reads the files
+                    pem_files = index.get_files(['.pem'])
+                    headers_changed = self.pem_header_cache.update(
+                        pem_files, is_canceled=lambda: index is not self.project_index)
+                    if headers_changed:
+                        self.pem_header_cache.save()
+                except Exception as e:
+                    logger.error(f"Error indexing {index.root}: {e}")
+                    return
+                if changed or headers_changed or first_update:
+                    self.project_index_updated.emit(index)
+                    first_update = False
+
+        self.index_thread = threading.Thread(target=update_index, daemon=True)
+        self.index_thread.start()
+        self.index_timer.start()
+
+    def project_index_changed(self, index):
+        """
+        Signal slot, fill the file lists again when the files of the project directory changed.
+        :param index: ProjectIndex object
+        """
+        if index is self.project_index:
+            self.fill_pem_list()
+            self.fill_gps_list()
+
     def fill_gps_list(self):
         """
         Populate the GPS files list based on the files found in the nearest 'GPS' folder in the project directory
         """
-        @stopit.threading_timeoutable(default='timeout')
         def find_gps_files():
-            files = list(natsort.os_sorted(self.project_dir.rglob('*.txt')))
-            files.extend(natsort.os_sorted(self.project_dir.rglob('*.csv')))
-            files.extend(natsort.os_sorted(self.project_dir.rglob('*.gpx')))
-            files.extend(natsort.os_sorted(self.project_dir.rglob('*.xlsx')))
-            files.extend(natsort.os_sorted(self.project_dir.rglob('*.xls')))
-            return files
+            files = [file for file, _, _ in index.get_files(gps_extensions)]
+            sorted_files = []
+            for ext in gps_extensions:
+                sorted_files.extend(natsort.os_sorted([file for file in files if file.suffix.lower() == ext]))
+            return sorted_files
 
         def get_filtered_gps(gps_files):
             """
@@ -2677,33 +2906,28 @@ class PEMHub(QMainWindow, Ui_PEMHub):
 
         self.gps_list.clear()
 
-        # Try to find a GPS folder, but time out after 0.5 second
-        gps_files = find_gps_files(timeout=0.5)
-
-        if gps_files is None:
-            return
-        elif gps_files == 'timeout':
-            logger.warning(f"Searching for GPS files timed out.")
-            self.status_bar.showMessage(f"Searching for GPS files timed out.", 1000)
+        # The files are listed from the project index. The list is filled again once the index is up to date.
+        index = self.get_project_index()
+        if not index.is_complete:
+            self.status_bar.showMessage(f"Searching for GPS files in {self.project_dir}...", 2000)
             return
-        else:
-            self.available_gps = get_filtered_gps(gps_files)
-            for file in self.available_gps:
-                self.gps_list.addItem(QListWidgetItem(get_extension_icon(file),
-                                                      f"{str(file.relative_to(self.project_dir))}"))
+
+        self.available_gps = get_filtered_gps(find_gps_files())
+        for file in self.available_gps:
+            self.gps_list.addItem(QListWidgetItem(get_extension_icon(file),
+                                                  f"{str(file.relative_to(self.project_dir))}"))
 
     def fill_pem_list(self):
         """
         Populate the pem_list with all *.pem files found in the project_dir.
         """
-        @stopit.threading_timeoutable(default='timeout')
         def find_pem_files():
-            files = []
-            # Find all .PEM, .DMP, and .DMP2 files in the project directory
-            files.extend(natsort.os_sorted(list(self.project_dir.rglob('*.PEM'))))
-            files.extend(natsort.os_sorted(list(self.project_dir.rglob('*.DMP'))))
-            files.extend(natsort.os_sorted(list(self.project_dir.rglob('*.DMP2'))))
-            return files
+            # All .PEM, .DMP, and .DMP2 files in the project directory
+            files = list(file_stats)
+            sorted_files = []
+            for ext in pem_extensions:
+                sorted_files.extend(natsort.os_sorted([file for file in files if file.suffix.lower() == ext]))
+            return sorted_files
 
         def get_filtered_pems(pem_files):
             """
@@ -2780,6 +3004,14 @@ class PEMHub(QMainWindow, Ui_PEMHub):
                     [re.sub(r'[\*\.]', '', f.lower()) != p.suffix.lower()[1:] for f in exclude_exts if f]
                 )]
 
+            # Filter by the header values. Files without a header (i.e. DMP files) are removed by any header filter.
+            for column, edit in self.pem_list_filter.header_edits.items():
+                values = [v.lower() for v in strip(edit.text().split(',')) if v]
+                if values:
+                    filtered_pems = [p for p in filtered_pems if headers.get(p) and any(
+                        [v in str(headers[p][column]).lower() for v in values]
+                    )]
+
             return filtered_pems
 
         if not self.project_dir:
@@ -2789,20 +3021,30 @@ class PEMHub(QMainWindow, Ui_PEMHub):
 
         self.pem_list.clear()
 
-        # Try to find .PEM files, but time out after 0.5 seconds
-        pem_files = find_pem_files(timeout=0.5)
-
-        if pem_files is None:
+        # The files are listed from the project index. The list is filled again once the index is up to date.
+        index = self.get_project_index()
+        if not index.is_complete:
+            self.status_bar.showMessage(f"Searching for PEM/DMP files in {self.project_dir}...", 2000)
             return
-        elif pem_files == 'timeout':
-            logger.warning(f"Searching for PEM/DMP files timed out.")
-            self.status_bar.showMessage(f"Searching for PEM/DMP files timed out.", 1000)
-            return
-        else:
-            self.available_pems = get_filtered_pems(pem_files)
-            for file in self.available_pems:
-                self.pem_list.addItem(QListWidgetItem(get_extension_icon(file),
-                                                      f"{str(file.relative_to(self.project_dir))}"))
+
+        # Size and modification time of each file, from the index
+        file_stats = {file: (size, mtime) for file, size, mtime in index.get_files(pem_extensions)}
+        pem_files = find_pem_files()
+
+        # Only the cached headers are shown. Missing headers are parsed by the indexing thread, which fills the list
+        # again once they are cached.
+        headers = {}
+        for file in pem_files:
+            if file.suffix.lower() == '.pem':
+                headers[file] = self.pem_header_cache.lookup(file, *file_stats[file])
+
+        self.available_pems = get_filtered_pems(pem_files)
+        for file in self.available_pems:
+            header = headers.get(file) or {}
+            item = QTreeWidgetItem([f"{str(file.relative_to(self.project_dir))}"] +
+                                   [str(header.get(col, '')) for col in header_columns])
+            item.setIcon(0, get_extension_icon(file))
+            self.pem_list.addTopLevelItem(item)
 
     def save_pem_files(self, selected=False):
         """
@@ -2812,24 +3054,35 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         pem_files, rows = self.get_pem_files(selected=selected)
         crs = self.get_crs()
 
+        # Add the CRS note if CRS isn't None
+        if crs:
+            for pem_file in pem_files:
+                pem_file.set_crs(crs)
+
+        # The files are about to be overwritten, so write the backups of the files as they were before processing
+        if self.auto_create_backup_files_cbox.isChecked():
+            self.journal.write_backups(pem_files)
+
+        count = 0
         with CustomProgressDialog('Saving PEM Files...', 0, len(pem_files)) as dlg:
             for pem_file in pem_files:
                 if dlg.wasCanceled():
                     break
 
                 dlg.setLabelText(f"Saving {pem_file.filepath.name}")
-
-                # Add the CRS note if CRS isn't None
-                if crs:
-                    pem_file.set_crs(crs)
-
                 # Save the PEM file and refresh it in the table
-                pem_file.save()
-                self.refresh_pem(pem_file)
+                try:
+                    pem_file.save()
+                except Exception as e:
+                    logger.error(f"Error saving {pem_file.filepath.name}: {e}")
+                    self.error.showMessage(f"Error saving {pem_file.filepath.name}: {e}")
+                else:
+                    self.refresh_pem(pem_file)
+                    count += 1
                 dlg += 1
 
         self.fill_pem_list()
-        self.status_bar.showMessage(f'Save Complete. {len(pem_files)} file(s) saved.', 2000)
+        self.status_bar.showMessage(f'Save Complete. {count} file(s) saved.', 2000)
 
     def save_pem_file_as(self):
         """
@@ -3011,7 +3264,7 @@ class PEMHub(QMainWindow, Ui_PEMHub):
 
         # Grouping up the loops, lines and boreholes into lists.
         for pem_file in pem_files:
-            pem_file = pem_file.copy()  # Copy the PEM file so the GPS conversions don't affect the original
+            pem_file = copy_pem(pem_file)  # Copy the PEM file so the GPS conversions don't affect the original
             pem_file.set_crs(crs)
 
             # Save the loop
@@ -3130,26 +3383,24 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         file_dir = self.file_dialog.getExistingDirectory(self, '', str(self.project_dir))
 
         if file_dir:
+            errors = []
             with CustomProgressDialog("Exporting XYZ Files...", 0, len(pem_files)) as dlg:
-
-                for pem_file in pem_files:
-                    if dlg.wasCanceled():
-                        break
-
-                    file_name = str(Path(file_dir).joinpath(pem_file.filepath.name).with_suffix(".XYZ"))
-                    dlg.setLabelText(f"Exporting {file_name}")
-                    try:
-                        xyz_file = pem_file.to_xyz()
-                    except Exception as e:
-                        logger.critical(f"{e}")
-                        self.message.critical(self, 'Error', str(e))
-                        continue
+                def is_canceled():
+                    QApplication.processEvents()
+                    return dlg.wasCanceled()
+
+                for pem_file, file_name, error in pem_writer.export_xyz_files(pem_files, file_dir,
+                                                                             is_canceled=is_canceled):
+                    if error is not None:
+                        logger.critical(f"{error}")
+                        errors.append(f"{pem_file.filepath.name}: {error}")
                     else:
-                        logger.info(F"Exporting {file_name}.")
-                        with open(file_name, 'w+') as file:
-                            file.write(xyz_file)
-                    finally:
-                        dlg += 1
+                        logger.info(F"Exported {file_name}.")
+                        dlg.setLabelText(f"Exported {Path(file_name).name}")
+                    dlg += 1
+
+            if errors:
+                self.message.critical(self, 'Error', '\n'.join(errors))
 
     def export_pem_files(self, selected=False, legacy=False, processed=False):
         """
@@ -3195,31 +3446,44 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             self.status_bar.showMessage('Cancelled.', 2000)
             return
 
-        with CustomProgressDialog("Exporting PEM Files...", 0, len(pem_files)) as dlg:
-            for pem_file, row in zip(pem_files, rows):
-                if dlg.wasCanceled():
-                    break
-
-                pem_file.set_crs(crs)
-                if all([pem_file.is_borehole(), pem_file.has_xy(), not pem_file.is_derotated(), processed is True]):
-                    response = self.message.question(self, 'Rotated XY',
-                                                     f'File {pem_file.filepath.name} has not been de-rotated. '
-                                                     f'Do you wish to automatically de-rotate it?',
-                                                     self.message.Yes | self.message.No)
-                    if response == self.message.No:
-                        continue
+        # Questions are asked first, then the files are exported in worker processes
+        export_files = []
+        for pem_file, row in zip(pem_files, rows):
+            pem_file.set_crs(crs)
+            if all([pem_file.is_borehole(), pem_file.has_xy(), not pem_file.is_derotated(), processed is True]):
+                response = self.message.question(self, 'Rotated XY',
+                                                 f'File {pem_file.filepath.name} has not been de-rotated. '
+                                                 f'Do you wish to automatically de-rotate it?',
+                                                 self.message.Yes | self.message.No)
+                if response == self.message.No:
+                    continue
 
-                pem_file: PEMFile
-                file_name = pem_file.filepath.name
-                pem_file = pem_file.copy()
-                logger.info(f"Exporting {file_name}.")
+            export_files.append(copy_pem(pem_file))
 
-                pem_file.filepath = Path(file_dir).joinpath(file_name)
-                pem_file.save(legacy=legacy, processed=processed, rename=True)
+        count = 0
+        errors = []
+        with CustomProgressDialog("Exporting PEM Files...", 0, len(export_files)) as dlg:
+            def is_canceled():
+                QApplication.processEvents()
+                return dlg.wasCanceled()
+
+            for pem_file, filepaths, error in pem_writer.export_pem_files(export_files, file_dir, legacy=legacy,
+                                                                          processed=processed,
+                                                                          is_canceled=is_canceled):
+                if error is not None:
+                    logger.critical(f"Error exporting {pem_file.filepath.name}: {error}")
+                    errors.append(f"{pem_file.filepath.name}: {error}")
+                else:
+                    logger.info(f"Exported {', '.join([f.name for f in filepaths])}.")
+                    dlg.setLabelText(f"Exported {pem_file.filepath.name}")
+                    count += 1
                 dlg += 1
 
+        if errors:
+            self.message.critical(self, 'Export Errors', '\n'.join(errors))
+
         self.fill_pem_list()
-        self.status_bar.showMessage(f"Save complete. {len(pem_files)} PEM file(s) exported", 2000)
+        self.status_bar.showMessage(f"Save complete. {count} PEM file(s) exported", 2000)
 
     def export_gps(self, selected=False):
         """
@@ -3421,7 +3685,7 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             repeat_col = self.table_columns.index('Repeat\nWarnings')
             polarity_col = self.table_columns.index('Polarity\nWarnings')
 
-            if not self.pem_files[row].has_all_gps():
+            if not get_summary(self.pem_files[row]).has_all_gps:
                 color_row_background(row, 'blue')
 
             for col in [average_col, split_col, gps_warnings_col, suffix_col, repeat_col, polarity_col]:
@@ -3462,14 +3726,13 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             red_color = QColor("#FFC0C0" if dark_mode else "#FF4040")
             default_color = Qt.white if dark_mode else Qt.black
 
-            for row in range(self.table.rowCount()):
-                if self.table.item(row, date_column):
-                    date = self.table.item(row, date_column).text()
-                    year = str(date.split(' ')[-1])
-                    if year != current_year:
-                        self.table.item(row, date_column).setForeground(red_color)
-                    else:
-                        self.table.item(row, date_column).setForeground(default_color)
+            if self.table.item(row, date_column):
+                date = self.table.item(row, date_column).text()
+                year = str(date.split(' ')[-1])
+                if year != current_year:
+                    self.table.item(row, date_column).setForeground(red_color)
+                else:
+                    self.table.item(row, date_column).setForeground(default_color)
 
         self.table.blockSignals(True)
 
@@ -3483,151 +3746,55 @@ class PEMHub(QMainWindow, Ui_PEMHub):
     def color_table_by_values(self):
         """
         Color the background of the cells based on their values for the current, coil area, and station ranges.
+        The values are taken from the values cached by add_pem_to_table, not from the text of the cells.
         """
-        def color_currents():
-            current_col = self.table_columns.index("Current")
-            currents = np.array([self.table.item(row, current_col).text() for row in range(self.table.rowCount())],
-                                dtype=float)
-
-            # Normalize column values for color mapping
-            mn, mx, count = currents.min(), currents.max(), len(currents)
-            norm = plt.Normalize(mn, mx)
-
-            # Create a custom color map
-            cm = LCMap.from_list('Custom', [mpl_red, mpl_blue])
-
-            # Apply the color map to the values in the column
-            colors = cm(norm(currents))
-
-            for row in range(self.table.rowCount()):
-                item = self.table.item(row, current_col)
-
-                # Color the text
-                item.setForeground(QColor(255, 255, 255))
-                item.setTextAlignment(Qt.AlignCenter)
-
-                # Color the background based on the value
-                color = QColor(colors[row][0] * 255,
-                               colors[row][1] * 255,
-                               colors[row][2] * 255,
-                               alpha)
-                item.setBackground(color)
-
-                count += 1
-
-        def color_coil_areas():
-            coil_area_col = self.table_columns.index("Coil\nArea")
-            coil_areas = np.array([self.table.item(row, coil_area_col).text() for row in range(self.table.rowCount())],
-                                  dtype=float)
-
-            # Normalize column values for color mapping
-            mn, mx, count = coil_areas.min(), coil_areas.max(), len(coil_areas)
-            norm = plt.Normalize(mn, mx)
-
-            # Create a custom color map
-            cm = LCMap.from_list('Custom', [mpl_red, mpl_blue])
-
-            # Apply the color map to the values in the column
-            colors = cm(norm(coil_areas))
-
-            for row in range(self.table.rowCount()):
-                item = self.table.item(row, coil_area_col)
-
-                # Color the text
-                item.setForeground(QColor(255, 255, 255))
-                item.setTextAlignment(Qt.AlignCenter)
-
-                # Color the background based on the value
-                color = QColor(colors[row][0] * 255,
-                               colors[row][1] * 255,
-                               colors[row][2] * 255,
-                               alpha)
-                item.setBackground(color)
-
-                count += 1
-
-        def color_station_starts():
-            start_col = self.table_columns.index("First\nStation")
-
-            # Don't use the values in the table, that way stations with no un-deleted stations can stay blank.
-            # station_starts = np.array([self.table.item(row, start_col).text() for row in range(self.table.rowCount())],
-            #                           dtype=float)
-            station_starts = np.array([pem_file.get_min_station() for pem_file in self.pem_files])
-
-            # Normalize column values for color mapping
-            mn, mx, count = station_starts.min(), station_starts.max(), len(station_starts)
-            norm = plt.Normalize(mn, mx)
-
-            # Create a custom color map
-            cm = LCMap.from_list('Custom', [mpl_red, mpl_blue])
-
-            # Apply the color map to the values in the column
-            colors = cm(norm(station_starts))
-
-            for row in range(self.table.rowCount()):
-                item = self.table.item(row, start_col)
-
-                # Color the text
-                item.setForeground(QColor(255, 255, 255))
-                item.setTextAlignment(Qt.AlignCenter)
-
-                # Color the background based on the value
-                color = QColor(colors[row][0] * 255,
-                               colors[row][1] * 255,
-                               colors[row][2] * 255,
-                               alpha)
-                item.setBackground(color)
-
-                count += 1
-
-        def color_station_ends():
-            end_col = self.table_columns.index("Last\nStation")
-
-            # station_ends = np.array([self.table.item(row, end_col).text() for row in range(self.table.rowCount())],
-            #                         dtype=float)
-            # Don't use the values in the table, that way stations with no un-deleted stations can stay blank.
-            station_ends = np.array([pem_file.get_max_station() for pem_file in self.pem_files])
+        def color_column(col, values):
+            """
+            Color the cells of a column using a color map of the values.
+            :param col: int, column of the table
+            :param values: numpy array of float, value of each row. Rows with NaN values (e.g. files with no
+            un-deleted stations) aren't colored.
+            """
+            if np.isnan(values).all():
+                return
 
             # Normalize column values for color mapping
-            mn, mx, count = station_ends.min(), station_ends.max(), len(station_ends)
-            norm = plt.Normalize(mn, mx)
-
-            # Create a custom color map
-            cm = LCMap.from_list('Custom', [mpl_red, mpl_blue])
+            norm = plt.Normalize(np.nanmin(values), np.nanmax(values))
 
             # Apply the color map to the values in the column
-            colors = cm(norm(station_ends))
+            colors = (cm(norm(values)) * 255).astype(int)
 
-            for row in range(self.table.rowCount()):
-                item = self.table.item(row, end_col)
+            for row, (r, g, b, _) in enumerate(colors):
+                item = self.table.item(row, col)
+                if item is None:
+                    continue
 
                 # Color the text
                 item.setForeground(QColor(255, 255, 255))
                 item.setTextAlignment(Qt.AlignCenter)
 
                 # Color the background based on the value
-                color = QColor(colors[row][0] * 255,
-                               colors[row][1] * 255,
-                               colors[row][2] * 255,
-                               alpha)
-                item.setBackground(color)
-
-                count += 1
+                if not np.isnan(values[row]):
+                    item.setBackground(QColor(r, g, b, alpha))
 
         if not self.pem_files:
             return
 
-        print("Coloring table by values")
+        logger.debug("Coloring table by values.")
         self.table.blockSignals(True)
         mpl_red, mpl_blue = np.array([34, 79, 214]) / 256, np.array([247, 42, 42]) / 256
         alpha = 250
 
-        color_currents()
-        color_coil_areas()
-        color_station_starts()
-        color_station_ends()
+        # Create a custom color map
+        cm = LCMap.from_list('Custom', [mpl_red, mpl_blue])
 
-        self.table.blockSignals(False)
+        values = np.array([self.table_values.get(id(pem_file), [np.nan] * 4) for pem_file in self.pem_files],
+                          dtype=float)
+        for i, column in enumerate(["Current", "Coil\nArea", "First\nStation", "Last\nStation"]):
+            color_column(self.table_columns.index(column), values[:, i])
+
+        if self.allow_signals:
+            self.table.blockSignals(False)
 
     def refresh_table(self):
         for row in range(self.table.rowCount()):
@@ -3635,25 +3802,94 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         self.color_table_by_values()
 
     def refresh_pems(self):
-        for pem_file in self.pem_files:
-            self.refresh_pem(pem_file)
+        self.refresh_pem_files(self.pem_files)
 
     def refresh_pem(self, pem_file):
         """
         Refresh the PEM file by re-opening its PIW and refreshing the information in its row in PEMHub.
         File must be in the list of PEM Files opened in PEMHub (cannot be a copy).
+        The refresh is done at the next iteration of the event loop (see flush_refresh), so a file refreshed many
+        times, or many files refreshed one after the other, only update the table once.
+        Refreshing doesn't invalidate the cached summary of the file, mark_modified must be called where the file is
+        changed.
         :param pem_file: PEMFile object
         """
         if pem_file in self.pem_files:
+            if not any(pem_file is file for file in self.dirty_pem_files):
+                self.dirty_pem_files.append(pem_file)
+            self.refresh_timer.start()
+        else:
+            logger.error(f"PEMFile {pem_file.filepath.name} is not in the table.")
+            # raise IndexError(f"PEMFile ID {id(pem_file)} is not in the table.")
+
+    def update_pem_headers(self, pem_files, **values):
+        """
+        Set header values (see pem_header.header_attributes) of many PEM files at once, and update their table cells
+        together. The rows and the PIWs are not re-opened, only the info tab of the existing PIWs is filled again.
+        :param pem_files: list of PEMFile objects, files opened in PEMHub.
+        :param values: new values, by PEMFile attribute
+        :return: list of the PEMFile objects that changed
+        """
+        changed = update_headers(pem_files, **values)
+        if not changed:
+            return changed
+
+        columns = {attr: col for col, attr in self.table_attributes.items() if attr in values}
+        self.table.blockSignals(True)
+        self.table.setUpdatesEnabled(False)
+        for pem_file in changed:
+            row = self.pem_files.index(pem_file)
+            for attr, col in columns.items():
+                self.table.item(row, col).setText(str(getattr(pem_file, attr)))
+            self.table_values[id(pem_file)][:2] = [float(pem_file.current), float(pem_file.coil_area)]
+
+            pem_info_widget = self.pem_info_widgets.get(id(pem_file))
+            if pem_info_widget is not None:
+                pem_info_widget.fill_info_tab()
+        self.table.setUpdatesEnabled(True)
+        if self.allow_signals:
+            self.table.blockSignals(False)
+
+        if 'date' in values:
+            # The anomalies of the row (i.e. the year of the date) are colored by format_row
+            for pem_file in changed:
+                self.format_row(self.pem_files.index(pem_file))
+        if 'current' in values or 'coil_area' in values:
+            self.color_table_by_values()
+        self.session_timer.start()
+        return changed
+
+    def refresh_pem_files(self, pem_files):
+        """
+        Refresh multiple PEM files at once.
+        :param pem_files: list of PEMFile objects, files opened in PEMHub.
+        """
+        for pem_file in pem_files:
+            self.refresh_pem(pem_file)
+
+    def flush_refresh(self):
+        """
+        Refresh the rows of the PEM files waiting to be refreshed, then color the table once.
+        """
+        self.refresh_timer.stop()
+        dirty_pem_files, self.dirty_pem_files = self.dirty_pem_files, []
+
+        refreshed = False
+        for pem_file in dirty_pem_files:
+            # The file may have been removed since it was marked for refresh
+            if pem_file not in self.pem_files:
+                continue
+
             logger.info(f"Refreshing {pem_file.filepath.name}.")
             ind = self.pem_files.index(pem_file)
-            self.pem_info_widgets[ind].open_pem_file(pem_file, refresh=True)
+            if id(pem_file) in self.pem_info_widgets:
+                self.pem_info_widgets[id(pem_file)].open_pem_file(pem_file, refresh=True)
             self.add_pem_to_table(pem_file, ind)
-            self.format_row(ind)
+            refreshed = True
+
+        if refreshed:
             self.color_table_by_values()
-        else:
-            logger.error(f"PEMFile {pem_file.filepath.name} is not in the table.")
-            # raise IndexError(f"PEMFile ID {id(pem_file)} is not in the table.")
+            self.session_timer.start()
 
     def update_selection_text(self):
         """
@@ -3664,35 +3900,36 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         if not pem_files:
             return
 
+        summaries = [get_summary(pem_file) for pem_file in pem_files]
         if len(pem_files) == 1:
-            file = pem_files[0]
+            file, summary = pem_files[0], summaries[0]
             self.status_bar.showMessage(f"{file.filepath}")
             timebase = f"Timebase: {file.timebase}ms"
-            if pem_files[0].is_averaged():
+            if summary.is_averaged:
                 reading_groups = ""
                 stacks = ""
             else:
-                reading_groups = f"Read Groupings: {', '.join(sorted(file.data['Readings_per_set'].unique().astype(str)))}"
-                stacks = f"Stacks: {', '.join(sorted(file.data['Number_of_stacks'].unique().astype(str)))}"
-            zts = f"ZTS: {', '.join(file.data.ZTS.unique().astype(int).astype(str))}"
-            survey_type = f"Survey Type: {file.get_survey_type()}"
-            if file.is_pp():
+                reading_groups = f"Read Groupings: {', '.join(summary.readings_per_set)}"
+                stacks = f"Stacks: {', '.join(summary.number_of_stacks)}"
+            zts = f"ZTS: {', '.join(summary.zts)}"
+            survey_type = f"Survey Type: {summary.survey_type}"
+            if summary.is_pp:
                 survey_type += " PP"
 
-            if file.is_borehole() and file.has_xy():
-                derotated = f"De-rotated: {file.is_derotated()}"
+            if summary.is_borehole and summary.has_xy:
+                derotated = f"De-rotated: {summary.is_derotated}"
             else:
                 derotated = ""
         else:
             self.status_bar.showMessage("")
             timebase = f"Timebases: {', '.join(natsort.os_sorted(np.unique([str(f.timebase) + 'ms' for f in pem_files])))}"
-            zts = f"ZTS: {', '.join(np.unique(np.concatenate([f.data.ZTS.unique().astype(int).astype(str) for f in pem_files])))}"
-            survey_type = f"Survey Types: {', '.join(np.unique([f.get_survey_type() for f in pem_files]))}"
+            zts = f"ZTS: {', '.join(np.unique(np.concatenate([s.zts for s in summaries])))}"
+            survey_type = f"Survey Types: {', '.join(np.unique([s.survey_type for s in summaries]))}"
             derotated = ""
             reading_groups = ""
             stacks = ""
 
-        components = np.unique(np.concatenate([pem.get_components() for pem in pem_files]))
+        components = np.unique(np.concatenate([s.components for s in summaries]))
         self.selection_files_label.setText(f"Selected: {len(pem_files)}")
         self.selection_components_label.setText(f"Component(s): {', '.join(components)}")
         self.selection_timebase_label.setText(timebase)
@@ -3710,7 +3947,9 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         logger.info(f"Backing up PEM files.")
         for pem_file in self.pem_files:
             pem_file.save(backup=True)
-        self.status_bar.showMessage(f'Backup complete. Backed up {len(self.pem_files)} PEM files.', 2000)
+        # Also write the backups of the files as they were before they were processed
+        count = self.journal.write_backups(self.pem_files)
+        self.status_bar.showMessage(f'Backup complete. Backed up {len(self.pem_files) + count} PEM files.', 2000)
 
     def get_current_project_path(self):
         """
@@ -3769,7 +4008,7 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             :param filepath: str
             :return: dict with crs system, zone, and datum
             """
-            file = read_file(filepath)
+            file = read_text(filepath)
             crs_dict = dict()
             crs_dict['System'] = re.search(r'Coordinate System:\W+(?P<System>.*)', file).group(1)
             crs_dict['Zone'] = re.search(r'Coordinate Zone:\W+(?P<Zone>.*)', file).group(1)
@@ -3811,7 +4050,7 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         self.selection_derotation_label.setStyleSheet(f'color: {text_color}')
 
         self.unpacker.darkmode = self.darkmode
-        for piw in self.pem_info_widgets:
+        for piw in self.pem_info_widgets.values():
             piw.darkmode = self.darkmode
 
         self.refresh_table()
@@ -3834,6 +4073,102 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         self.fill_pem_list()
         self.fill_gps_list()
 
+    def run_batch(self, pem_files, transform, title):
+        """
+        Run a transform on PEM files in the background with the job runner, then refresh the table once for all the
+        processed files. The errors of all files are shown together.
+        The opened files are modified by the worker threads while the events are processed, so the actions of PEMHub
+        (processing, undo, saving, etc.) are disabled and the session isn't saved until the transform is done.
+        :param pem_files: list of PEMFile objects, files opened in PEMHub.
+        :param transform: callable, takes a PEMFile and modifies it. Must not use any widget.
+        :param title: str, title of the progress dialog
+        :return: list of PEMFile, the files that were processed.
+        """
+        if self.job_runner.is_running():
+            logger.warning(f"Files are already being processed.")
+            self.status_bar.showMessage(f"Files are already being processed.", 2000)
+            return []
+
+        self.session_timer.stop()
+        disabled_actions = [action for action in self.findChildren(QAction) if action.isEnabled()]
+        for action in disabled_actions:
+            action.setEnabled(False)
+        self.table.setEnabled(False)
+        try:
+            results, errors = self.job_runner.run(pem_files, transform, title=title)
+        finally:
+            for action in disabled_actions:
+                action.setEnabled(True)
+            self.table.setEnabled(True)
+
+        processed = [pem_file for pem_file, _ in results]
+        self.refresh_pem_files(processed)
+
+        failed = [(pem_file, error) for pem_file, error in errors if error != "Canceled"]
+        if failed:
+            error_text = '\n'.join([f"{pem_file.filepath.name}: {error}" for pem_file, error in failed])
+            self.message.warning(self, 'Processing Errors', f"The following files could not be processed:\n"
+                                                            f"{error_text}")
+        return processed
+
+    def run_operation(self, pem_files, operation, *args, title, label):
+        """
+        Run a processing operation (see pem_journal.operations) on PEM files with run_batch, recording it in the journal
+        so it can be undone.
+        :param pem_files: list of PEMFile objects, files opened in PEMHub.
+        :param operation: str, name of the operation
+        :param args: arguments of the operation
+        :param title: str, title of the progress dialog
+        :param label: str, name of the command in the Undo and Redo menu items.
+        :return: list of PEMFile, the files that were processed.
+        """
+        batch = self.journal.batch(label)
+        processed = self.run_batch(pem_files, lambda pem_file: batch.apply(pem_file, operation, *args), title)
+        self.journal.push(batch)
+        self.update_undo_actions()
+        return processed
+
+    def update_undo_actions(self):
+        """
+        Update the text and state of the Undo and Redo actions from the journal.
+        """
+        undo_batch, redo_batch = self.journal.undo_batch, self.journal.redo_batch
+        self.undo_action.setText(f"Undo {undo_batch.label}" if undo_batch else "Undo")
+        self.undo_action.setEnabled(undo_batch is not None)
+        self.redo_action.setText(f"Redo {redo_batch.label}" if redo_batch else "Redo")
+        self.redo_action.setEnabled(redo_batch is not None)
+
+    def undo_processing(self, redo=False):
+        """
+        Undo (or redo) the last processing command, for all the files it was applied to.
+        :param redo: bool, redo the last command undone instead.
+        """
+        batch = self.journal.redo_batch if redo else self.journal.undo_batch
+        if batch is None:
+            return
+
+        action = "Redo" if redo else "Undo"
+        if not batch.is_current():
+            response = self.message.question(self, f'{action} {batch.label}',
+                                             f"Some of the files were changed since '{batch.label}'. "
+                                             f"{action} anyway?", self.message.Yes, self.message.No)
+            if response != self.message.Yes:
+                return
+
+        batch, errors = self.journal.redo() if redo else self.journal.undo()
+        self.refresh_pem_files([pem_file for pem_file in batch.pem_files if pem_file in self.pem_files])
+        batch.stamp()
+        self.update_undo_actions()
+
+        if errors:
+            error_text = '\n'.join([f"{pem_file.filepath.name}: {error}" for pem_file, error in errors])
+            self.message.warning(self, f'{action} Errors', f"The following files could not be restored:\n"
+                                                           f"{error_text}")
+        self.status_bar.showMessage(f"{action} {batch.label} complete.", 2000)
+
+    def redo_processing(self):
+        self.undo_processing(redo=True)
+
     def average_pem_data(self, selected=False):
         """
         Average the data of each PEM File selected
@@ -3851,33 +4186,44 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             self.status_bar.showMessage(f"No un-averaged PEM files opened.", 2000)
             return
 
-        with CustomProgressDialog('Averaging PEM Files...', 0, len(pem_files)) as dlg:
-            for pem_file in pem_files:
-                if dlg.wasCanceled():
-                    break
-
-                dlg.setLabelText(f"Averaging {pem_file.filepath.name}")
+        # Ask about rotated borehole files before processing, since the processing runs in the background
+        filt_list = []
+        for pem_file in pem_files:
+            if pem_file.is_borehole() and pem_file.has_xy() and not pem_file.is_derotated():
+                logger.warning(f"{pem_file.filepath.name} is a borehole file with rotated XY data.")
+                response = self.message.question(self, 'Rotated PEM File',
+                                                 f"{pem_file.filepath.name} has not been de-rotated. "
+                                                 f"Continue with averaging?",
+                                                 self.message.Yes, self.message.No)
+                if response != self.message.Yes:
+                    continue
+            filt_list.append(pem_file)
 
-                if pem_file.is_borehole() and pem_file.has_xy() and not pem_file.is_derotated():
-                    logger.warning(f"{pem_file.filepath.name} is a borehole file with rotated XY data.")
-                    response = self.message.question(self, 'Rotated PEM File',
-                                                     f"{pem_file.filepath.name} has not been de-rotated. "
-                                                     f"Continue with averaging?",
-                                                     self.message.Yes, self.message.No)
-                    if response == self.message.Yes:
-                        pass
-                    else:
-                        continue
+        processed = self.run_operation(filt_list, 'average', title='Averaging PEM Files...', label='Average')
+        self.status_bar.showMessage(f"Process complete. {len(processed)} PEM files averaged.", 2000)
 
-                # Save a backup of the un-averaged file first
-                if self.auto_create_backup_files_cbox.isChecked():
-                    pem_file.save(backup=True, tag='[-A]')
+    def auto_clean_pem_data(self, selected=False):
+        """
+        Flag the outlier readings of each PEM File for deletion, with the default settings of the plot editor.
+        :param selected: bool, True will only process selected rows.
+        """
+        pem_files, rows = self.get_pem_files(selected=selected)
+        if not pem_files:
+            logger.warning(f"No PEM files opened.")
+            self.status_bar.showMessage(f"No PEM files opened.", 2000)
+            return
 
-                pem_file = pem_file.average()
-                self.refresh_pem(pem_file)
-                dlg += 1
+        filt_list = [f for f in pem_files if not f.is_averaged()]
+        if len(filt_list) == 0:
+            logger.warning(f"No un-averaged PEM files opened.")
+            self.status_bar.showMessage(f"No un-averaged PEM files opened.", 2000)
+            return
 
-        self.status_bar.showMessage(f"Process complete. {len(pem_files)} PEM files averaged.", 2000)
+        num_deleted = sum(f.data.Deleted.astype(bool).sum() for f in filt_list)
+        processed = self.run_operation(filt_list, 'auto_clean', title='Auto-cleaning PEM Files...', label='Auto Clean')
+        num_deleted = sum(f.data.Deleted.astype(bool).sum() for f in filt_list) - num_deleted
+        self.status_bar.showMessage(f"Process complete. {num_deleted} reading(s) of {len(processed)} PEM files "
+                                    f"automatically deleted.", 2000)
 
     def split_pem_channels(self, selected=False):
         """
@@ -3899,22 +4245,8 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             self.status_bar.showMessage(f"No un-split PEM files opened.", 2000)
             return
 
-        with CustomProgressDialog('Splitting PEM Files...', 0, len(filt_list)) as dlg:
-            for pem_file in filt_list:
-                if dlg.wasCanceled():
-                    break
-
-                dlg.setLabelText(f"Splitting channels for {pem_file.filepath.name}")
-
-                # Save a backup file
-                if self.auto_create_backup_files_cbox.isChecked():
-                    pem_file.save(backup=True, tag='[-S]')
-
-                pem_file = pem_file.split()
-                self.refresh_pem(pem_file)
-                dlg += 1
-
-        self.status_bar.showMessage(f"Process complete. {len(filt_list)} PEM files split.", 2000)
+        processed = self.run_operation(filt_list, 'split', title='Splitting PEM Files...', label='Split Channels')
+        self.status_bar.showMessage(f"Process complete. {len(processed)} PEM files split.", 2000)
 
     def scale_pem_coil_area(self, selected=False):
         """
@@ -3937,18 +4269,10 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         if not ok_pressed:
             return
 
-        with CustomProgressDialog('Scaling PEM File Coil Area...', 0, len(pem_files)) as dlg:
-            for pem_file, row in zip(pem_files, rows):
-                if dlg.wasCanceled():
-                    break
-                dlg.setLabelText(f"Scaling coil area of {pem_file.filepath.name}")
-
-                pem_file = pem_file.scale_coil_area(coil_area)
-                self.refresh_pem(pem_file)
-                dlg += 1
-
+        processed = self.run_operation(pem_files, 'scale_coil_area', coil_area, title='Scaling PEM File Coil Area...',
+                                       label='Scale Coil Area')
         self.status_bar.showMessage(f"Process complete. "
-                                    f"Coil area of {len(pem_files)} PEM files scaled to {coil_area}.", 2000)
+                                    f"Coil area of {len(processed)} PEM files scaled to {coil_area}.", 2000)
 
     def scale_pem_current(self, selected=False):
         """
@@ -3965,16 +4289,10 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         default = pem_files[0].current
         current, ok_pressed = QInputDialog.getDouble(self, "Scale Current", "Current:", default)
         if ok_pressed:
-            with CustomProgressDialog('Scaling PEM File Current...', 0, len(pem_files)) as dlg:
-                for pem_file, row in zip(pem_files, rows):
-                    dlg.setLabelText(f"Scaling current of {pem_file.filepath.name}")
-
-                    pem_file = pem_file.scale_current(current)
-                    self.refresh_pem(pem_file)
-                    dlg += 1
-
+            processed = self.run_operation(pem_files, 'scale_current', current, title='Scaling PEM File Current...',
+                                           label='Scale Current')
             self.status_bar.showMessage(f"Process complete. "
-                                        f"Current of {len(pem_files)} PEM files scaled to {current}.", 2000)
+                                        f"Current of {len(processed)} PEM files scaled to {current}.", 2000)
 
     def mag_offset_lastchn(self, selected=False):
         """
@@ -3987,16 +4305,10 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             self.status_bar.showMessage(f"No PEM files opened.", 2000)
             return
 
-        with CustomProgressDialog(f'Mag offsetting to last channel...', 0, len(pem_files)) as dlg:
-            for pem_file, row in zip(pem_files, rows):
-                dlg.setLabelText(f"Mag offsetting data of {pem_file.filepath.name}")
-                pem_file: PEMFile
-                pem_file = pem_file.mag_offset()
-                self.refresh_pem(pem_file)
-                dlg += 1
-
+        processed = self.run_operation(pem_files, 'mag_offset', title='Mag offsetting to last channel...',
+                                       label='Mag Offset')
         self.status_bar.showMessage(f"Process complete. "
-                                    f"Mag offset of {len(pem_files)} PEM file(s) complete.", 2000)
+                                    f"Mag offset of {len(processed)} PEM file(s) complete.", 2000)
 
     def change_suffix(self, selected=False):
         pem_files, rows = self.get_pem_files(selected=selected)
@@ -4007,17 +4319,9 @@ class PEMHub(QMainWindow, Ui_PEMHub):
         new_suffix, ok_pressed = QInputDialog.getItem(self, "Change Suffix", "New Suffix:", ['N', 'E', 'S', 'W'],
                                                       current=0)
         if ok_pressed:
-            with CustomProgressDialog(f'Changing Suffixes...', 0, len(pem_files)) as dlg:
-                for pem_file in pem_files:
-                    dlg.setLabelText(f"Changing suffixes of {pem_file.filepath.name}")
-                    if dlg.wasCanceled():
-                        break
-
-                    pem_file.change_suffix(new_suffix)
-                    self.refresh_pem(pem_file)
-                    dlg += 1
-
-                self.status_bar.showMessage(F"Suffixes changed to '{new_suffix}'")
+            self.run_operation(pem_files, 'change_suffix', new_suffix, title='Changing Suffixes...',
+                               label='Change Suffix')
+            self.status_bar.showMessage(F"Suffixes changed to '{new_suffix}'")
 
     def reverse_component_data(self, comp, selected=False):
         """
@@ -4032,15 +4336,11 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             self.status_bar.showMessage(f"No PEM files opened.", 2000)
             return
 
-        with CustomProgressDialog(f'Reversing {comp} Component Polarity...', 0, len(pem_files)) as dlg:
-            for pem_file, row in zip(pem_files, rows):
-                dlg.setLabelText(f"Reversing {comp} component data of {pem_file.filepath.name}")
-                pem_file = pem_file.reverse_component(comp)
-                self.refresh_pem(pem_file)
-                dlg += 1
-
+        processed = self.run_operation(pem_files, 'reverse_component', comp,
+                                       title=f'Reversing {comp} Component Polarity...',
+                                       label=f'Reverse {comp} Polarity')
         self.status_bar.showMessage(f"Process complete. "
-                                    f"{comp.upper()} of {len(pem_files)} PEM file(s) reversed.", 2000)
+                                    f"{comp.upper()} of {len(processed)} PEM file(s) reversed.", 2000)
 
     def reverse_station_order(self, selected=False):
         pem_files, rows = self.get_pem_files(selected=selected)
@@ -4050,15 +4350,10 @@ class PEMHub(QMainWindow, Ui_PEMHub):
             self.status_bar.showMessage(f"No PEM files opened.", 2000)
             return
 
-        with CustomProgressDialog('Reversing Station Order...', 0, len(pem_files)) as dlg:
-            for pem_file, row in zip(pem_files, rows):
-                dlg.setLabelText(f"Reversing station order of {pem_file.filepath.name}")
-                pem_file = pem_file.reverse_station_numbers()
-                self.refresh_pem(pem_file)
-                dlg += 1
-
+        processed = self.run_operation(pem_files, 'reverse_stations', title='Reversing Station Order...',
+                                       label='Reverse Station Order')
         self.status_bar.showMessage(f"Process complete. "
-                                    f"Station order of {len(pem_files)} PEM file(s) reversed.", 2000)
+                                    f"Station order of {len(processed)} PEM file(s) reversed.", 2000)
 
     # def auto_merge_pem_files(self):
     #
@@ -4226,6 +4521,14 @@ class PathFilter(QWidget):
         self.exclude_exts_edit = QLineEdit()
         self.exclude_exts_edit.setToolTip("Separate items with commas [,]")
 
+        # Filters of the header values, only for PEM files
+        self.header_edits = {}
+        if self.filetype == 'PEM':
+            for column in header_columns:
+                edit = QLineEdit()
+                edit.setToolTip("Separate items with commas [,]")
+                self.header_edits[column] = edit
+
         # Buttons frame
         frame = QFrame()
         frame.setLayout(QHBoxLayout())
@@ -4268,6 +4571,15 @@ class PathFilter(QWidget):
 
         self.layout().addRow(extensions_gbox)
 
+        if self.header_edits:
+            header_gbox = QGroupBox('Header')
+            header_gbox.setAlignment(Qt.AlignCenter)
+            header_gbox.setLayout(QFormLayout())
+            for column, edit in self.header_edits.items():
+                header_gbox.layout().addRow(QLabel(f"{column.replace('_', ' ')}:"), edit)
+
+            self.layout().addRow(header_gbox)
+
         self.layout().addRow(frame)
 
         # Signals
@@ -4309,11 +4621,14 @@ class PathFilter(QWidget):
         self.exclude_folders_edit.setText('DUMP, Backup')
         self.include_exts_edit.setText('')
         self.exclude_exts_edit.setText('')
+        for edit in self.header_edits.values():
+            edit.setText('')
 
     def get_settings(self):
         filter_settings = []
         for filts in [self.include_files_edit, self.exclude_files_edit, self.include_folders_edit,
-                      self.exclude_folders_edit, self.include_exts_edit, self.exclude_exts_edit]:
+                      self.exclude_folders_edit, self.include_exts_edit, self.exclude_exts_edit,
+                      *self.header_edits.values()]:
             filter_settings.append(filts.text())
         return filter_settings
 
@@ -4322,7 +4637,7 @@ class PathFilter(QWidget):
             return
 
         edits = [self.include_files_edit, self.exclude_files_edit, self.include_folders_edit,
-                 self.exclude_folders_edit, self.include_exts_edit, self.exclude_exts_edit]
+                 self.exclude_folders_edit, self.include_exts_edit, self.exclude_exts_edit, *self.header_edits.values()]
         for setting, edit in zip(settings, edits):
             edit.setText(setting)
         if refresh is True:
@@ -4415,6 +4730,105 @@ class FrequencyConverter(QWidget):
         e.accept()
 
 
+class PerformanceViewer(QWidget):
+    """
+    Report of the timers and counters of src.instrumentation. Subsystems are enabled and disabled with the check boxes,
+    and the report is refreshed every second.
+    """
+    def __init__(self, parent=None):
+        super().__init__()
+        self.parent = parent
+
+        self.setWindowTitle('Performance')
+        self.setWindowIcon(get_icon('table.png'))
+        self.resize(900, 400)
+        self.setLayout(QVBoxLayout())
+
+        # One check box per subsystem
+        self.subsystem_box = QGroupBox('Instrumented Subsystems')
+        self.subsystem_box.setLayout(QHBoxLayout())
+        for name in instrumentation.get_subsystems():
+            cbox = QCheckBox(name)
+            cbox.setChecked(instrumentation.is_enabled(name))
+            cbox.toggled.connect(lambda checked, name=name: self.toggle_subsystem(name, checked))
+            self.subsystem_box.layout().addWidget(cbox)
+        self.subsystem_box.layout().addStretch()
+        self.layout().addWidget(self.subsystem_box)
+
+        self.table = QTableWidget()
+        self.table.setColumnCount(len(instrumentation.report_columns))
+        self.table.setHorizontalHeaderLabels(instrumentation.report_columns)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.verticalHeader().hide()
+        self.layout().addWidget(self.table)
+
+        self.reset_btn = QPushButton('Reset')
+        self.export_btn = QPushButton('Export CSV')
+        btn_layout = QHBoxLayout()
+        btn_layout.addWidget(QLabel("Times are in milliseconds."))
+        btn_layout.addStretch()
+        btn_layout.addWidget(self.reset_btn)
+        btn_layout.addWidget(self.export_btn)
+        self.layout().addLayout(btn_layout)
+
+        self.reset_btn.clicked.connect(self.reset)
+        self.export_btn.clicked.connect(self.export_csv)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(1000)
+        self.refresh_timer.timeout.connect(self.fill_table)
+        self.refresh_timer.start()
+        self.fill_table()
+
+    def keyPressEvent(self, e):
+        if e.key() == Qt.Key_Escape:
+            self.close()
+
+    def closeEvent(self, e):
+        self.refresh_timer.stop()
+        self.deleteLater()
+        e.accept()
+
+    def toggle_subsystem(self, name, enabled):
+        if enabled:
+            instrumentation.enable(name)
+        else:
+            instrumentation.disable(name)
+
+    def fill_table(self):
+        report = instrumentation.get_report()
+        self.table.setRowCount(len(report))
+        for row, stats in enumerate(report):
+            for col, column in enumerate(instrumentation.report_columns):
+                value = stats[column]
+                # Counters are shown as they are, timers in milliseconds
+                if column in ['Subsystem', 'Name', 'Kind', 'Count']:
+                    text = str(value)
+                elif stats['Kind'] == 'counter':
+                    text = f"{value:g}"
+                else:
+                    text = f"{value:.2f}"
+                item = QTableWidgetItem(text)
+                item.setTextAlignment(Qt.AlignCenter)
+                self.table.setItem(row, col, item)
+
+    def reset(self):
+        instrumentation.reset()
+        self.fill_table()
+
+    def export_csv(self):
+        default_path = str(Path(self.parent.project_dir or app_data_dir).joinpath("PEMPro Performance.csv"))
+        filepath = QFileDialog.getSaveFileName(self, 'Export Performance Report', default_path, 'CSV Files (*.CSV)')[0]
+        if not filepath:
+            return
+
+        try:
+            instrumentation.export_csv(filepath)
+        except OSError as e:
+            QMessageBox.warning(self, 'Error', f"Could not export the report: {e}")
+
+
 class PDFPlotPrinter(QWidget, Ui_PDFPlotPrinter):
     """
     Widget to handle printing PDF plots for PEM/RI files.
@@ -4490,9 +4904,9 @@ class PDFPlotPrinter(QWidget, Ui_PDFPlotPrinter):
 
         for pem_file in self.pem_files:
             if not pem_file.is_averaged():
-                pem_file = pem_file.average()
+                pem_file = average_pem(pem_file)
             if not pem_file.is_split():
-                pem_file = pem_file.split()
+                pem_file = split_pem(pem_file)
 
         fill_share_range()
 
@@ -5137,6 +5551,7 @@ class StationSplitter(QWidget):
 
             # Remove the selected stations from the original file.
             self.pem_file.data = self.pem_file.data.loc[~filt]
+            mark_modified(self.pem_file)
             self.parent.refresh_pem(self.pem_file)
 
             self.close()
@@ -314,12 +314,25 @@ class PEMFileInfoWidget(QWidget, Ui_PEMInfoWidget):
         self.fill_info_tab()
         self.fill_gps_table(self.pem_file.get_loop_gps(), self.loop_table)
 
+        # The RI file is kept in the PEMFile, so it is shown again when the widget is re-created
+        ri_file = getattr(self.pem_file, 'ri_file', None)
+        if ri_file is not None and ri_file is not self.ri_file:
+            self.show_ri_file(ri_file)
+
     def open_ri_file(self, filepath):
         """
         Action of opening an RI file. Adds the contents of the RI file to the RIFileTable.
         :param filepath: Filepath of the RI file.
         :return: None
         """
+        self.show_ri_file(self.ri_editor.open(filepath))
+
+    def show_ri_file(self, ri_file):
+        """
+        Fill the RIFileTable with an RI file and keep the RI file in the PEMFile.
+        :param ri_file: RIFile object
+        :return: None
+        """
         def make_ri_table():
             columns = self.ri_file.columns
             self.ri_table.setColumnCount(len(columns))
@@ -346,7 +359,8 @@ class PEMFileInfoWidget(QWidget, Ui_PEMInfoWidget):
             self.ri_file.header['Current'] = self.pem_file.current
             self.ri_file.survey = self.pem_file.get_survey_type()
 
-        self.ri_file = self.ri_editor.open(filepath)
+        self.ri_file = ri_file
+        self.pem_file.ri_file = ri_file
         make_ri_table()
         fill_ri_table()
         add_header_from_pem()
@@ -754,6 +768,8 @@ class PEMFileInfoWidget(QWidget, Ui_PEMInfoWidget):
         while self.ri_table.rowCount() > 0:
             self.ri_table.removeRow(0)
         self.ri_file = None
+        if self.pem_file is not None:
+            self.pem_file.ri_file = None
 
     def remove_extra_gps(self):
         """
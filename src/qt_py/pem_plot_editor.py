@@ -6,21 +6,23 @@ import re
 import sys
 import time
 import keyboard
-import cProfile
 import pyqtgraph as pg
 import numpy as np
 import pandas as pd
-import pylineclip as lc
 from PySide2.QtCore import Qt, Signal, QEvent, QTimer, QPointF, QRectF, QSettings
 from PySide2.QtGui import QColor, QFont, QTransform, QBrush, QPen, QKeySequence, QCursor
 from PySide2.QtWidgets import (QMainWindow, QMessageBox, QFileDialog, QLabel, QApplication, QWidget,
                                QInputDialog, QPushButton, QShortcut, QVBoxLayout)
 from scipy import spatial, signal
 
-from src import timeit, profile
+from src.instrumentation import timed, count
+from src.line_clip import lines_in_rect
 from src.pem import convert_station
+from src.pem.decay_matrix import DecayMatrix, find_outliers, get_auto_clean_settings
+from src.pem.profile_means import ProfileMeans
 from src.pem.pem_file import PEMParser, PEMGetter
 from src.qt_py import get_icon, get_line_color
+from src.qt_py.decay_lines import DecayLines
 from src.ui.pem_plot_editor import Ui_PEMPlotEditor
 # from src.logger import Log
 
@@ -75,7 +77,8 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
         self.fallback_file = None
         self.units = None
 
-        self.profile_data = pd.DataFrame()
+        self.profile_means = None  # Mean decay of each component and station, for the profile plots
+        self.decay_matrix = None
         self.channel_bounds = None
         self.theory_data = pd.DataFrame()
         self.stations = np.array([])
@@ -85,13 +88,13 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
         self.line_selected = False
         self.selected_station = None
         self.selected_data = pd.DataFrame()
-        self.selected_lines = []
+        self.selected_rows = []  # Positions of the selected decays in decay_data
         self.deleted_lines = []
         self.selected_profile_stations = np.array([])
         self.selected_profile_component = None
         self.component_profile_plot_items = {}
         self.component_stations = {}
-        self.nearest_decay = None
+        self.nearest_row = None  # Position in decay_data of the decay nearest the mouse
         self.mag_curves = []
         self.last_offtime_channel = None  # For auto-clean lines
 
@@ -99,7 +102,6 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
         self.active_ax_ind = None
         self.last_active_ax = None  # last_active_ax is always a plotitem object, and never None after the init.
         self.last_active_ax_ind = None  # last_active_ax is always a plotitem object, and never None after the init.
-        self.plotted_decay_lines = []
         self.decay_data = pd.DataFrame()
 
         # Status bar formatting
@@ -135,6 +137,8 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
         # self.decay_layout.ci.layout.setRowStretchFactor(1, 1)
         self.decay_axes = np.array([self.x_decay_plot, self.y_decay_plot, self.z_decay_plot])
         self.active_decay_axes = []
+        # The decays plotted in each decay axes
+        self.decay_lines = [DecayLines(darkmode=self.darkmode) for ax in self.decay_axes]
 
         # Lines for auto cleaning thresholds.
         self.x_decay_lower_threshold_line = pg.PlotCurveItem(pen=pg.mkPen(self.autoclean_color,
@@ -191,7 +195,9 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
         self.y_profile_layout.ci.layout.setSpacing(5)  # Spacing between plots
         self.z_profile_layout.ci.layout.setSpacing(5)  # Spacing between plots
 
-        self.profile_plots = {}  # Save all profile plot lines for quicket plotting with setData()
+        # Profile plot items of each profile axes, re-used and updated with setData()
+        self.profile_plots = {}  # Axes: list of curve and scatter items, one pair per channel
+        self.theory_pp_plots = {}  # Axes: theoretical PP curve
 
         # Configure the profile plots
         # X axis lin plots
@@ -323,9 +329,8 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
 
             scalings = []
             for component in self.pem_file.get_components():
-                # Profile data is already split, so use index 0 for the PP channel.
-                measured_pp = self.profile_data[self.profile_data.Component == component].groupby(
-                    "Station", as_index=False).mean().loc[:, 0].reset_index(drop=True)
+                # Profile means are already split, so use index 0 for the PP channel.
+                measured_pp = pd.Series(self.profile_means.get_means(component)[1][:, 0])
                 theory_pp = self.theory_data.loc[:, component]
 
                 scaling = (measured_pp - theory_pp) / measured_pp
@@ -539,22 +544,22 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
 
         # Flip the decay when the F key is pressed
         elif event.key() == Qt.Key_F:
-            if self.selected_lines:
+            if self.selected_rows:
                 self.flip_decays(source='decay')
 
         # Change the component of the readings to X
         elif event.key() == Qt.Key_X:
-            if self.selected_lines:
+            if self.selected_rows:
                 self.change_component('X', source='decay')
 
         # Change the component of the readings to Y
         elif event.key() == Qt.Key_Y:
-            if self.selected_lines:
+            if self.selected_rows:
                 self.change_component('Y', source='decay')
 
         # Change the component of the readings to Z
         elif event.key() == Qt.Key_Z:
-            if self.selected_lines:
+            if self.selected_rows:
                 self.change_component('Z', source='decay')
 
         # Reset the ranges of the plots when the space bar is pressed
@@ -626,41 +631,22 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
         QApplication.clipboard().setPixmap(self.grab())
         self.status_bar.showMessage(f"Image saved to clipboard.", 1500)
 
-    @timeit
-    def set_profile_plots(self):
+    def get_profile_items(self, ax, num_channels):
         """
-        Add the profile plot items for faster profile plotting through setData().
+        Return the profile plot items of an axes, adding items when there are fewer than needed. Items are never
+        removed, the unused ones are hidden.
+        :param ax: pg.PlotItem
+        :param num_channels: int, number of channels plotted in the axes
+        :return: list of tuples, curve and scatter item of each channel
         """
-        for component in ["X", "Y", "Z"]:  # Add all components incase some are added during editing
-            print(f"{component=}")
-            self.profile_plots[component] = {}
-            if component == 'X':
-                axes = self.x_layout_axes
-            elif component == 'Y':
-                axes = self.y_layout_axes
-            else:
-                axes = self.z_layout_axes
-
-            # Add the plot items for the single axis profile
-            self.profile_plots[component][0] = []
-            ax = axes[0]
-            for channel in range(len(self.pem_file.get_offtime_channels())):
-                print(f"{channel=}")
-                plot_line = pg.PlotItem()
-                self.profile_plots[component][0].append(plot_line)
-                ax.addItem(plot_line)
-
-            # Add the plot items for the split profile
-            for i, bounds in enumerate(self.channel_bounds):
-                print(f"{bounds=}")
-                ax = axes[i + 1]  # axes[0] is the single profile ax
-                self.profile_plots[component][i + 1] = []
-
-                for channel in range(bounds[0], bounds[1] + 1):
-                    print(f"{channel=}")
-                    plot_line = pg.PlotItem()
-                    self.profile_plots[component][i + 1].append(plot_line)
-                    ax.addItem(plot_line)
+        items = self.profile_plots.setdefault(ax, [])
+        while len(items) < num_channels:
+            curve = pg.PlotCurveItem(pen=pg.mkPen(self.foreground_color, width=1))
+            scatter = pg.ScatterPlotItem(pen=pg.mkPen(self.foreground_color, width=1.), symbol='o', size=1., brush='w')
+            ax.addItem(curve)
+            ax.addItem(scatter)
+            items.append((curve, scatter))
+        return items
 
     def open(self, pem_file):
         """
@@ -720,16 +706,8 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
 
         # Set the units of the decay plots
         self.units = self.pem_file.units
-        if self.units == 'pT':
-            if "SQUID" in self.pem_file.get_survey_type():
-                self.auto_clean_std_sbox.setValue(7)
-            else:
-                self.auto_clean_std_sbox.setValue(20)
-        else:
-            if self.pem_file.is_borehole():
-                self.auto_clean_std_sbox.setValue(2)
-            else:
-                self.auto_clean_std_sbox.setValue(1.5)
+        threshold, window_size = get_auto_clean_settings(self.pem_file)
+        self.auto_clean_std_sbox.setValue(threshold)
 
         if not self.pem_file.has_all_gps():
             self.calculate_coil_area_btn.setEnabled(False)
@@ -738,7 +716,7 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
         off_time_channels = self.pem_file.get_offtime_channels()
         self.last_offtime_channel = off_time_channels.index[-1]
         self.auto_clean_window_sbox.setMaximum(self.last_offtime_channel + 1)
-        self.auto_clean_window_sbox.setValue(int(self.last_offtime_channel / 4))
+        self.auto_clean_window_sbox.setValue(window_size)
         # self.min_ch_sbox.setMaximum(1)
         self.max_ch_sbox.setMaximum(len(off_time_channels) - 1)
         self.max_ch_sbox.setValue(len(off_time_channels) - 1)
@@ -765,7 +743,6 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
             ax.setLabel('bottom', 'Channel number')
 
         # Plot the LIN profiles
-        # self.set_profile_plots()
         self.plot_profiles(components='all')
         self.move_profile_hover_line(self.stations.min())
 
@@ -945,9 +922,7 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
             if self.link_y_cbox.isChecked():
                 # Auto range the X, then manually set the Y.
                 self.active_decay_axes[0].autoRange()
-                filt = self.pem_file.data.cStation == self.selected_station
-                min_y = self.pem_file.data.loc[filt].Reading.map(lambda x: x.min()).min()
-                max_y = self.pem_file.data.loc[filt].Reading.map(lambda x: x.max()).max()
+                min_y, max_y = self.decay_matrix.get_range(station=self.selected_station)
                 self.active_decay_axes[0].setYRange(min_y, max_y)
             else:
                 for ax in self.decay_axes:
@@ -963,10 +938,12 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
         """
         Change the Y limits of the decay plots to be zoomed on the late off-time channels.
         """
-        filt = self.pem_file.data.cStation == self.selected_station
-        channel_mask = ~self.pem_file.channel_times.Remove.astype(bool)
-        min_y = self.pem_file.data.loc[filt].Reading.map(lambda x: x[channel_mask][-3:].min()).min() - 1
-        max_y = self.pem_file.data.loc[filt].Reading.map(lambda x: x[channel_mask][-3:].max()).max() + 1
+        # Only use the last 3 off-time channels
+        off_time_channels = np.flatnonzero(~self.pem_file.channel_times.Remove.astype(bool))
+        channel_mask = np.zeros(len(self.pem_file.channel_times), dtype=bool)
+        channel_mask[off_time_channels[-3:]] = True
+        min_y, max_y = self.decay_matrix.get_range(station=self.selected_station, channel_mask=channel_mask)
+        min_y, max_y = min_y - 1, max_y + 1
 
         # If the y axes are linked, manually set the Y limit
         if self.link_y_cbox.isChecked():
@@ -978,79 +955,70 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
             for ax in self.decay_axes:
                 ax.setYRange(min_y, max_y)
 
-    @profile(sort_by='cumtime', lines_to_print=20, strip_dirs=True, output_file="plot_profile.txt")
-    @timeit
+    @timed(subsystem='plot_editor')
     def plot_profiles(self, components=None):
         """
-        Plot the PEM file in a LIN plot style, with both components in separate plots
+        Plot the PEM file in a LIN plot style, with both components in separate plots. The plot items are kept and
+        updated with the cached profile means (see data_edited), so nothing is re-calculated here.
         :param components: list of str, components to plot. If None it will plot every component in the file.
         """
-        def clear_plots(components):
+        def plot_channels(ax, channels, stations, means, reading_stations, readings):
             """
-            Clear the plots of the given components. Does not clear the mag plots.
-            :param components: list of str
+            Set the data of the lines and scatter plot markers of each channel plotted in the ax, and hide the others.
+            :param ax: pyqtgraph PlotItem
+            :param channels: list of int
+            :param stations: numpy array, station of each mean
+            :param means: 2D numpy array, (stations x channels) mean of each station
+            :param reading_stations: numpy array, station of each reading, for the scatter plots
+            :param readings: 2D numpy array, (readings x channels) values of each reading, for the scatter plots
             """
-            axes = []
-
-            if 'X' in components:
-                axes.extend(self.x_layout_axes)
-            if 'Y' in components:
-                axes.extend(self.y_layout_axes)
-            if 'Z' in components:
-                axes.extend(self.z_layout_axes)
-
-            for ax in axes:
-                # Don't clear the mag plots. They only need to be plotted once.
-                if ax not in [self.mag_x_ax, self.mag_y_ax, self.mag_z_ax]:
-                    ax.clearPlots()
-
-        @timeit
-        def plot_lin(profile_data, axes):
-            def plot_lines(df, ax):
-                """
-                Plot the lines on the pyqtgraph ax
-                :param df: DataFrame of filtered data
-                :param ax: pyqtgraph PlotItem
-                """
-                df_avg = df.groupby('Station').mean()
-                x, y = df_avg.index.to_numpy(), df_avg.to_numpy()
-
-                curve = pg.PlotCurveItem(x=x, y=y, pen=pg.mkPen(self.foreground_color, width=1))
-                ax.addItem(curve)
-
-            def plot_scatters(df, ax):
-                """
-                Plot the scatter plot markers
-                :param df: DataFrame of filtered data
-                :param ax: pyqtgraph PlotItem
-                :return:
-                """
-                x, y = df.index.to_numpy(), df.to_numpy()
-
-                scatter = pg.ScatterPlotItem(x=x, y=y,
-                                             pen=pg.mkPen(self.foreground_color, width=1.),
-                                             symbol='o',
-                                             size=1.,
-                                             brush='w')
-
-                ax.addItem(scatter)
-
-            def plot_theory_pp(df, ax):
-                """
-                Plot the theoretical PP values
-                :param df: DataFrame, calculated theoretical total magnetic field strength.
-                :param ax: pyqtgraph PlotItem for the PP frame
-                :return: None
-                """
-                if not df.empty:
-                    df = df.sort_values("Station")
-                    pp_plot_item = pg.PlotCurveItem(x=df.Station.to_numpy(), y=df[component].to_numpy(),
-                                                    pen=pg.mkPen(self.selection_color, width=1.5, style=Qt.DotLine),
-                                                    name="PP Theory")
-                    ax.addItem(pp_plot_item)
-
-            # Since toggling the self.split_profile_cboxs needs to call plot_profiles(), there's no point in plotting
-            # both the split profiles and single profile.
+            channels = [channel for channel in channels if channel < means.shape[1]]
+            show_scatter = self.show_scatter_cbox.isChecked()
+            for i, (curve, scatter) in enumerate(self.get_profile_items(ax, len(channels))):
+                if i < len(channels):
+                    curve.setData(x=stations, y=means[:, channels[i]])
+                    curve.show()
+                else:
+                    curve.setData(x=np.array([]), y=np.array([]))
+                    curve.hide()
+
+                if i < len(channels) and show_scatter:
+                    scatter.setData(x=reading_stations, y=readings[:, channels[i]])
+                    scatter.show()
+                else:
+                    scatter.setData(x=np.array([]), y=np.array([]))
+                    scatter.hide()
+
+        def plot_theory_pp(ax, component, show):
+            """
+            Plot the theoretical PP values
+            :param ax: pyqtgraph PlotItem for the PP frame
+            :param component: str
+            :param show: bool, hide the theoretical PP if False
+            """
+            item = self.theory_pp_plots.get(ax)
+            if item is None:
+                item = pg.PlotCurveItem(pen=pg.mkPen(self.selection_color, width=1.5, style=Qt.DotLine),
+                                        name="PP Theory")
+                ax.addItem(item)
+                self.theory_pp_plots[ax] = item
+
+            df = self.theory_data
+            if show and not df.empty and component in df.columns:
+                df = df.sort_values("Station")
+                item.setData(x=df.Station.to_numpy(), y=df[component].to_numpy())
+                item.show()
+            else:
+                item.setData(x=np.array([]), y=np.array([]))
+                item.hide()
+
+        @timed('PEMPlotEditor.plot_lin', subsystem='plot_editor')
+        def plot_lin(component, axes):
+            stations, means = self.profile_means.get_means(component)
+            reading_stations, readings = self.profile_means.get_readings(component)
+
+            # Since toggling the self.split_profile_cboxs needs to call plot_profiles(), only the visible axes are
+            # plotted.
             if self.split_profile_cbox.isChecked():
                 # Plot the split profile axes
                 for i, bounds in enumerate(self.channel_bounds):
@@ -1063,69 +1031,34 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
                         ax.setLabel('left', f"Channel {bounds[0]} to {bounds[1]}",
                                     units=self.units)
 
-                    # Plot the data
-                    for channel in range(bounds[0], bounds[1] + 1):
-                        # print(f"{channel=}")
-                        data = profile_data.loc[:, channel]
-                        plot_lines(data, ax)
-                        if self.show_scatter_cbox.isChecked():
-                            plot_scatters(data, ax)
-
-                    # ax.autoRange()  # Is there ever a reason not to auto range the profile axes?
-                plot_theory_pp(self.theory_data, axes[1])
-                # axes[1].autoRange()  # Auto range again after the PP line is added
+                    plot_channels(ax, range(bounds[0], bounds[1] + 1), stations, means, reading_stations, readings)
+                plot_theory_pp(axes[1], component, show=True)
             else:
                 # Plot the single profile ax
                 min_ch, max_ch = self.min_ch_sbox.value(), self.max_ch_sbox.value()
                 ax = axes[0]
-                for channel in range(min_ch, max_ch + 1):
-                    ax.setLabel('left', f"Channel {'PP' if min_ch == 0 else min_ch} to {max_ch}", units=self.units)
-                    data = profile_data.loc[:, channel]
-                    plot_lines(data, ax)
-                    if self.show_scatter_cbox.isChecked():
-                        plot_scatters(data, ax)
-
-                # ax.autoRange()  # Is there ever a reason not to auto range the profile axes?
+                ax.setLabel('left', f"Channel {'PP' if min_ch == 0 else min_ch} to {max_ch}", units=self.units)
+                plot_channels(ax, range(min_ch, max_ch + 1), stations, means, reading_stations, readings)
+
                 # Only plot the theoretical value if the PP is plotted.
-                if min_ch == 0:
-                    plot_theory_pp(self.theory_data, ax)
+                plot_theory_pp(ax, component, show=min_ch == 0)
 
-        file = copy.deepcopy(self.pem_file)
-        file.data = file.data.loc[~file.data.Deleted.astype(bool)]  # Remove deleted data for the profile plots.
         self.update_()
-        self.number_of_readings.setText(f"{len(file.data)} reading(s)")
+        self.number_of_readings.setText(f"{(~self.pem_file.data.Deleted.astype(bool)).sum()} reading(s)")
 
         if not isinstance(components, np.ndarray):
             # Get the components
             if components is None or components == 'all':
-                components = file.get_components()
-
-        clear_plots(components)
+                components = self.pem_file.get_components()
 
         for component in components:
-            # print(f"{component=}")
-            filt = (self.profile_data.Component == component) & (self.profile_data.Deleted == False)
-            profile_data = self.profile_data[filt].set_index("Station", drop=True)
-
             # For nearest station calculation
             self.component_stations[component] = self.pem_file.get_stations(component=component,
                                                                             converted=True,
                                                                             incl_deleted=True)
-            if profile_data.empty:
-                continue
-
-            # Select the correct axes based on the component
-            if component == 'X':
-                axes = self.x_layout_axes
-            elif component == 'Y':
-                axes = self.y_layout_axes
-            else:
-                axes = self.z_layout_axes
-
-            plot_lin(profile_data, axes)
+            plot_lin(component, self.get_component_profile_axes(component))
 
-    @profile(sort_by='cumtime', lines_to_print=20, strip_dirs=True, output_file="plot_decays.txt")
-    @timeit
+    @timed(subsystem='plot_editor')
     def plot_decays(self, station, preserve_selection=False):
         """
         Plot the decay lines for each component of the given station
@@ -1154,58 +1087,6 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
                 station_text = ''
             self.station_text.setText(station_text)
 
-        def plot_decay(row):
-            """
-            Plot the decay line (Reading) of the row
-            :param row: pandas Series
-            """
-            # Select which axes to plot on
-            if row.Component == 'X':
-                ax = self.x_decay_plot
-            elif row.Component == 'Y':
-                ax = self.y_decay_plot
-            else:
-                ax = self.z_decay_plot
-
-            # Add the ax to the list of active decay axes
-            if ax not in self.active_decay_axes:
-                self.active_decay_axes.append(ax)
-
-            # Change the pen if the data is flagged for deletion or overload
-            if row.Deleted is False:
-                color = get_line_color("foreground", "pyqt", self.darkmode, alpha=255)
-                z_value = 2
-            else:
-                color = get_line_color("red", "pyqt", self.darkmode, alpha=200)
-                z_value = 1
-
-            # Use a dotted line for readings that are flagged as Overloads
-            if row.Overload is True:
-                style = Qt.DashDotDotLine
-            else:
-                style = Qt.SolidLine
-
-            # For all other lines
-            pen = pg.mkPen(color, width=1., style=style)
-
-            # Remove the on-time channels if the checkbox is checked
-            if self.plot_ontime_decays_cbox.isChecked():
-                y = row.Reading
-            else:
-                y = row.Reading[~self.pem_file.channel_times.Remove.astype(bool)]
-
-            # Create and configure the line item
-            decay_line = pg.PlotCurveItem(y=y, pen=pen)
-            decay_line.setClickable(True, width=5)
-            decay_line.setZValue(z_value)
-
-            # Add the line at y=0
-            ax.addLine(y=0, pen=pg.mkPen(self.foreground_color, width=0.15))
-            # Plot the decay
-            ax.addItem(decay_line)
-            # Add the plot item to the list of plotted items
-            self.plotted_decay_lines.append(decay_line)
-
         self.selected_station = station
 
         # Move the selected vertical line
@@ -1213,19 +1094,14 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
             selected_v_line = ax.items[2]  # Clicked vertical station line
             selected_v_line.setPos(station)
 
-        index_of_selected = []
-        # Keep the same lines highlighted after data modification
-        if preserve_selection is False:
-            self.selected_lines.clear()
-        else:
-            ax_lines = [line for line in self.selected_lines if line.name() is None]  # Ignore median lines
-            index_of_selected = [self.plotted_decay_lines.index(line) for line in ax_lines]
+        # Keep the same decays selected after data modification
+        selected_rows = self.selected_rows if preserve_selection is True else []
 
-        for ax in self.decay_axes:
+        for ax, decay_lines in zip(self.decay_axes, self.decay_lines):
             ax.clear()
+            decay_lines.add_to(ax)
 
-        self.plotted_decay_lines.clear()
-        self.nearest_decay = None
+        self.nearest_row = None
 
         # Filter the data
         filt = self.pem_file.data['cStation'] == station
@@ -1253,8 +1129,28 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
         self.y_decay_plot.setTitle(f"Station {station} - Y Component")
         self.z_decay_plot.setTitle(f"Station {station} - Z Component")
 
-        # Plot the decays
-        self.decay_data.apply(plot_decay, axis=1)
+        # Plot the decays. Each decay is identified by its position in decay_data.
+        rows = np.arange(len(self.decay_data))
+        if rows.size:
+            values = np.stack(self.decay_data.Reading.to_numpy())
+            # Remove the on-time channels unless the checkbox is checked
+            if not self.plot_ontime_decays_cbox.isChecked():
+                values = values[:, ~self.pem_file.channel_times.Remove.astype(bool).to_numpy()]
+        else:
+            values = np.empty((0, 0))
+        deleted = self.decay_data.Deleted.fillna(True).to_numpy(dtype=bool)
+        overload = self.decay_data.Overload.fillna(False).to_numpy(dtype=bool)
+        component = self.decay_data.Component.to_numpy()
+        self.selected_rows = [row for row in selected_rows if row < len(rows)]
+
+        masks = [component == 'X', component == 'Y', (component != 'X') & (component != 'Y')]
+        for ax, decay_lines, mask in zip(self.decay_axes, self.decay_lines, masks):
+            # Add the ax to the list of active decay axes
+            if mask.any() and ax not in self.active_decay_axes:
+                self.active_decay_axes.append(ax)
+            decay_lines.set_data(rows[mask], values[mask], deleted[mask], overload[mask],
+                                 selected_rows=self.selected_rows)
+        count('decays_plotted', 'plot_editor', len(rows))
 
         self.update_auto_clean_lines()
 
@@ -1269,7 +1165,6 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
 
         # Re-select lines that were selected
         if preserve_selection is True:
-            self.selected_lines = [self.plotted_decay_lines[i] for i in index_of_selected]
             self.highlight_lines()
         else:
             self.decay_selection_text.hide()
@@ -1296,20 +1191,21 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
         :return: None
         """
         window_size = self.auto_clean_window_sbox.value()
+        station_meta, station_values = self.decay_matrix.station_view(self.selected_station)
         for ax in self.decay_axes:
             if ax == self.x_decay_plot:
-                comp_filt = self.decay_data.Component == "X"
+                comp_filt = station_meta.Component.to_numpy() == "X"
                 thresh_line_1, thresh_line_2 = self.x_decay_lower_threshold_line, self.x_decay_upper_threshold_line
             elif ax == self.y_decay_plot:
-                comp_filt = self.decay_data.Component == "Y"
+                comp_filt = station_meta.Component.to_numpy() == "Y"
                 thresh_line_1, thresh_line_2 = self.y_decay_lower_threshold_line, self.y_decay_upper_threshold_line
             else:
-                comp_filt = self.decay_data.Component == "Z"
+                comp_filt = station_meta.Component.to_numpy() == "Z"
                 thresh_line_1, thresh_line_2 = self.z_decay_lower_threshold_line, self.z_decay_upper_threshold_line
 
             # Ignore deleted data when calculating median
-            existing_data = self.decay_data[comp_filt][~self.decay_data[comp_filt].Deleted.astype(bool)]
-            if existing_data.empty:
+            existing_data = station_values[comp_filt & ~station_meta.Deleted.to_numpy()]
+            if existing_data.size == 0:
                 thresh_line_1.hide()
                 thresh_line_2.hide()
                 continue
@@ -1318,19 +1214,16 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
                 thresh_line_2.show()
 
             # Excludes next on-time data, but keep the first on-time since we may want to clean that
-            median_data = pd.DataFrame.from_records(existing_data.Reading.reset_index(drop=True))
             if self.plot_ontime_decays_cbox.isChecked():
-                median_data = median_data.iloc[:, :self.last_offtime_channel + 1]
+                median_data = existing_data[:, :self.last_offtime_channel + 1]
                 last_channel = self.last_offtime_channel
             else:
-                on_time_channels = self.pem_file.channel_times.Remove.astype(bool)
-                # Reset for the X axis values when not plotting on-time
-                median_data = median_data.loc[:, ~on_time_channels]
-                median_data.rename(dict(zip(median_data.columns, range(len(median_data.columns)))),
-                                   inplace=True, axis=1)
-                last_channel = median_data.columns[-1]
-
-            median = median_data.median(axis=0).to_numpy()
+                on_time_channels = self.pem_file.channel_times.Remove.to_numpy(dtype=bool)
+                # The X axis values are reset when not plotting on-time
+                median_data = existing_data[:, ~on_time_channels]
+                last_channel = median_data.shape[1] - 1
+
+            median = np.median(median_data, axis=0)
             if self.pem_file.number_of_channels > 10:
                 # median = signal.savgol_filter(median, 5, 3)
                 median = signal.medfilt(median, 3)
@@ -1368,7 +1261,7 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
             """
             Update the status bar with information about the selected lines
             """
-            if self.selected_lines and selected_data is not None:
+            if self.selected_rows and selected_data is not None:
                 decay_selection_text = []
                 # Show the range of reading numbers and reading indexes if multiple decays are selected
                 if len(selected_data) > 1:
@@ -1430,11 +1323,11 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
             else:
                 self.decay_selection_text.hide()
 
-        if not self.plotted_decay_lines:
+        if not any(len(decay_lines) for decay_lines in self.decay_lines):
             return
 
         # Enable decay editing buttons
-        if len(self.selected_lines) > 0:
+        if len(self.selected_rows) > 0:
             self.change_comp_decay_btn.setEnabled(True)
             if not self.pem_file.is_borehole():
                 self.change_decay_suffix_btn.setEnabled(True)
@@ -1447,40 +1340,9 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
             self.change_station_decay_btn.setEnabled(False)
             self.flip_decay_btn.setEnabled(False)
 
-        # Change the color of the plotted lines
-        for line, Deleted, overload in zip(self.plotted_decay_lines,
-                                           self.decay_data.Deleted,
-                                           self.decay_data.Overload):
-
-            # Change the pen if the data is flagged for deletion
-            if Deleted is False:
-                color = get_line_color("foreground", "pyqt", self.darkmode, alpha=200)
-                z_value = 2
-            else:
-                color = get_line_color("red", "pyqt", self.darkmode, alpha=150)
-                z_value = 1
-
-            # Change the line style if the reading is overloaded
-            if overload is True:
-                style = Qt.DashDotDotLine
-            else:
-                style = Qt.SolidLine
-
-            # Colors for the lines if they selected
-            if line in self.selected_lines:
-                if Deleted is False:
-                    color = get_line_color("teal", "pyqt", self.darkmode, alpha=250)
-                    z_value = 4
-                else:
-                    color = get_line_color("red", "pyqt", self.darkmode, alpha=200)
-                    z_value = 3
-
-                line.setPen(color, width=2, style=style)
-                line.setZValue(z_value)
-            else:
-                # Color the lines that aren't selected
-                line.setPen(color, width=1, style=style)
-                line.setZValue(z_value)
+        # Change the style of the selected decays
+        for decay_lines in self.decay_lines:
+            decay_lines.set_selection(self.selected_rows)
 
         set_decay_selection_text(self.get_selected_decay_data())
 
@@ -1489,7 +1351,7 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
         Signal slot, clear all selections (decay and profile plots)
         """
         self.selected_data = None
-        self.selected_lines = []
+        self.selected_rows = []
         self.highlight_lines()
         self.selected_profile_stations = np.array([])
 
@@ -1589,17 +1451,6 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
         Highlights the decay line closest to the mouse.
         :param evt: MouseMovement event
         """
-        def normalize(point):
-            """
-            Normalize a point so it works as a percentage of the view box data coordinates.
-            :param point: QPoint object
-            :return: normalized QPointF object
-            """
-            view = vb.viewRect()
-            nx = (point.x() + view.x()) / view.width()
-            ny = (point.y() + view.y()) / view.height()
-            return QPointF(nx, ny)
-
         self.active_ax = None
 
         # print(f"\nEvt: {evt}")
@@ -1614,50 +1465,25 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
                 break
 
         if self.active_ax is not None:
-            line_distances = []
-            ax_lines = [line for line in self.active_ax.curves if line.name() is None]  # Ignore median lines
+            decay_lines = self.decay_lines[self.active_ax_ind]
             vb = self.active_ax.vb
 
-            if not ax_lines:
+            if not len(decay_lines):
                 return
 
-            # Change the mouse coordinates to be in the plot's native coordinates (not data coordinates)
+            # Distances are scaled by the size of the view so they work as a percentage of the view box
             m_pos = vb.mapSceneToView(evt)
-            m_pos = normalize(m_pos)
-            mouse_point = (m_pos.x(), m_pos.y())
-            # logger.info(f"Mouse pos: {mouse_point[0]:.2f}, {mouse_point[1]:.2f}")
-
-            for line in ax_lines:
-                xi, yi = line.xData, line.yData
-                interp_xi = np.linspace(xi.min(), xi.max(), 100)
-                interp_yi = np.interp(interp_xi, xi, yi)  # Interp for when the mouse in between two points
-                line_qpoints = [normalize(QPointF(x, y)) for x, y in zip(interp_xi, interp_yi)]
-                line_points = np.array([(p.x(), p.y()) for p in line_qpoints])
-
-                # logger.info(f"Line data pos: {np.average([p[0] for p in line_points]):.2f}, "
-                #             f"{np.average([p[1] for p in line_points]):.2f}")
-
-                # Calculate the distance between each point of the line and the mouse position
-                distances = spatial.distance.cdist(np.array([mouse_point]), line_points, metric='euclidean')
-                line_distances.append(distances)
-
-            # Find the index of the smallest overall distance
-            ind_of_min = np.array([l.min() for l in line_distances]).argmin()
-            # logger.info(f"Line {ind_of_min} is nearest the mouse.")
-
-            self.nearest_decay = ax_lines[ind_of_min]
-            for line in ax_lines:
-                if line == self.nearest_decay:
-                    line_color = line.opts.get('pen').color()
-                    line.setShadowPen(pg.mkPen(line_color, width=2.5, cosmetic=True))
-                else:
-                    line.setShadowPen(None)
+            view = vb.viewRect()
+            self.nearest_row = decay_lines.nearest(m_pos.x(), m_pos.y(), view.width(), view.height())
 
         # Reset everything when the mouse is moved outside of an axes
         else:
-            self.nearest_decay = None
-            for line in self.plotted_decay_lines:
-                line.setShadowPen(None)
+            self.nearest_row = None
+
+        # Draw a shadow behind the nearest decay
+        for decay_lines in self.decay_lines:
+            if decay_lines.hover_row != self.nearest_row:
+                decay_lines.set_hover(self.nearest_row)
 
     def decay_plot_clicked(self, evt):
         """
@@ -1669,14 +1495,15 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
             self.current_component = ["X", "Y", "Z"][self.active_ax_ind]
             self.profile_tab_widget.setCurrentIndex(self.active_ax_ind)
 
-            if self.nearest_decay:
+            if self.nearest_row is not None:
                 self.line_selected = True
                 if keyboard.is_pressed('ctrl'):
-                    self.selected_lines.append(self.nearest_decay)
+                    if self.nearest_row not in self.selected_rows:
+                        self.selected_rows.append(self.nearest_row)
                     self.highlight_lines()
                 else:
                     self.selected_data = None
-                    self.selected_lines = [self.nearest_decay]
+                    self.selected_rows = [self.nearest_row]
                     self.highlight_lines()
         else:
             logger.warning(f"No nearest decay.")
@@ -1689,35 +1516,18 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
         def change_profile_tab():
             self.profile_tab_widget.setCurrentIndex(self.last_active_ax_ind)
 
-        def intersects_rect(line):
-            """
-            Uses cohen-sutherland algorithm to find if a line intersects the rectangle at any point.
-            :param line: pg.PlotCurveItem
-            :return: bool
-            """
-            xi, yi = line.xData, line.yData
-
-            # Line is broken down into segments for the algorithm
-            for i, (x, y) in enumerate(zip(xi[:-1], yi[:-1])):
-                x1, y1 = float(x), y
-                x2, y2 = float(xi[i + 1]), yi[i + 1]
-                x3, y3, x4, y4 = lc.cohensutherland(left, top, right, bottom, x1, y1, x2, y2)
-
-                if any([x3, y3, x4, y4]):
-                    return True
-
         # Change the profile tab to the same component as the decay plot that was clicked
         change_profile_tab()
 
-        # Create the clip window for the line clipping algorithm.
+        # Every segment of every decay of the axes is tested against the rectangle at once
         left, top, right, bottom = min(rect.left(), rect.right()), max(rect.top(), rect.bottom()), \
                                    max(rect.left(), rect.right()), min(rect.top(), rect.bottom())
-        lines = [line for line in self.last_active_ax.curves if intersects_rect(line)]
+        rows = self.decay_lines[self.last_active_ax_ind].in_rect(left, bottom, right, top)
 
         if keyboard.is_pressed('ctrl'):
-            self.selected_lines.extend(lines)
+            self.selected_rows.extend([row for row in rows if row not in self.selected_rows])
         else:
-            self.selected_lines = lines
+            self.selected_rows = rows
         self.selected_data = None
 
         self.highlight_lines()
@@ -1780,15 +1590,10 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
         Return the corresponding data of the decay lines that are currently selected
         :return: pandas DataFrame
         """
-        ind = []
-        for line in self.selected_lines:
-            if line in self.plotted_decay_lines:
-                ind.append(self.plotted_decay_lines.index(line))
-        if not ind:
-            # print(f"Line is not in the list of decay lines.")
+        if not self.selected_rows:
             return
         else:
-            data = self.decay_data.iloc[ind]
+            data = self.decay_data.iloc[sorted(self.selected_rows)]
             return data
 
     def get_selected_profile_data(self):
@@ -1850,7 +1655,8 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
 
             # Update the data in the pem file object
             self.pem_file.data.loc[selected_data.index] = selected_data
-            self.refresh_plots(components=selected_data.Component.unique(), preserve_selection=True)
+            self.refresh_plots(components=selected_data.Component.unique(), preserve_selection=True,
+                               index=selected_data.index)
 
     def undelete_selected_lines(self):
         """
@@ -1864,7 +1670,8 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
 
             # Update the data in the pem file object
             self.pem_file.data.loc[selected_data.index] = selected_data
-            self.refresh_plots(components=selected_data.Component.unique(), preserve_selection=True)
+            self.refresh_plots(components=selected_data.Component.unique(), preserve_selection=True,
+                               index=selected_data.index)
 
     def undelete_all(self):
         """
@@ -1907,7 +1714,8 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
 
             # Update the data in the pem file object
             self.pem_file.data.iloc[selected_data.index] = selected_data
-            self.refresh_plots(components=[old_comp, new_component], preserve_selection=True)
+            self.refresh_plots(components=[old_comp, new_component], preserve_selection=True,
+                               index=selected_data.index)
 
     def change_suffix_dialog(self, source=None):
         """
@@ -1944,7 +1752,7 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
         """
         Opens a input dialog to change the station number of the selected data.
         """
-        if self.selected_lines:
+        if self.selected_rows:
             selected_data = self.get_selected_decay_data()
             selected_station = selected_data.Station.unique()[0]
             original_number = re.match(r"-?\d+", selected_station).group()
@@ -1974,22 +1782,30 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
             print("Plotting profile")
             self.plot_profiles("all")
 
-    def data_edited(self):
+    def data_edited(self, index=None):
         """
         Signal slot, when PEM data is modified, update the data used for profile plotting.
         Removing the calculation of the profile data out of plot_profiles() helps speed up plotting when cycling thorugh
         channels in the single profile plot.
+        :param index: list-like, index of the readings that were edited in PEMFile.data, when the edit doesn't change
+        any station. Only the profile means of the stations of these readings and these readings of the decay matrix
+        are calculated again. If None, everything is calculated again.
         :return: None
         """
-        pem_file = self.pem_file.copy()
-        # Calculate the lin plot axes channel bounds (for split profile plots only)
-        self.channel_bounds = pem_file.get_channel_bounds()
-        self.theory_data = pem_file.get_theory_pp()
+        channel_mask = ~self.pem_file.channel_times.Remove.to_numpy(dtype=bool)
+        if index is None or self.profile_means is None or \
+                not np.array_equal(self.profile_means.channel_mask, channel_mask):
+            pem_file = self.pem_file.copy()
+            # Calculate the lin plot axes channel bounds (for split profile plots only)
+            self.channel_bounds = pem_file.get_channel_bounds()
+            self.theory_data = pem_file.get_theory_pp()
+            self.profile_means = ProfileMeans(self.pem_file.data, channel_mask)
+        else:
+            self.profile_means.update(self.pem_file.data, index)
 
-        self.profile_data = pem_file.get_profile_data(averaged=False,
-                                                      converted=True,
-                                                      ontime=False,
-                                                      incl_deleted=True).dropna()
+        # Only the edited readings of the decay matrix are updated, unless the edit moved readings between stations
+        if index is None or self.decay_matrix is None or not self.decay_matrix.update(self.pem_file.data, index):
+            self.decay_matrix = DecayMatrix.from_pem_file(self.pem_file)
 
     def shift_stations(self):
         """
@@ -2033,7 +1849,8 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
 
             # Update the data in the pem file object
             self.pem_file.data.iloc[selected_data.index] = selected_data
-            self.refresh_plots(components=selected_data.Component.unique(), preserve_selection=True)
+            self.refresh_plots(components=selected_data.Component.unique(), preserve_selection=True,
+                               index=selected_data.index)
 
     def remove_stations(self):
         """
@@ -2046,7 +1863,8 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
 
             # Update the data in the pem file object
             self.pem_file.data.iloc[selected_data.index] = selected_data
-            self.refresh_plots(components=selected_data.Component.unique(), preserve_selection=True)
+            self.refresh_plots(components=selected_data.Component.unique(), preserve_selection=True,
+                               index=selected_data.index)
 
     def cycle_profile_component(self):
         """
@@ -2102,120 +1920,69 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
         Change the selected decay
         :param direction: str, direction to cycle decays. Either 'up' or 'down'.
         """
-        if not self.selected_lines:
+        if not self.selected_rows:
             return
 
         # Cycle through highlighted decays backwards
         if direction == 'down':
             new_selection = []
             # For each decay axes, find any selected lines and cycle to the next line in that axes
-            for ax in self.active_decay_axes:
-                num_plotted = len(ax.curves)
+            for decay_lines in self.decay_lines:
+                rows = decay_lines.rows.tolist()
+                num_plotted = len(rows)
                 # Find the index of any lines in the current ax that is selected
-                index_of_selected = [ax.curves.index(line) for line in self.selected_lines if line in ax.curves]
+                index_of_selected = [rows.index(row) for row in self.selected_rows if row in rows]
                 if index_of_selected:
                     old_index = index_of_selected[0]  # Only take the first selected decay
                     if old_index == 0:
                         new_index = num_plotted - 1
                     else:
                         new_index = old_index - 1
-                    new_selection.append(ax.curves[new_index])
-            self.selected_lines = new_selection
+                    new_selection.append(rows[new_index])
+            self.selected_rows = new_selection
             self.highlight_lines()
 
         # Cycle through highlighted decays forwards
         elif direction == 'up':
             new_selection = []
             # For each decay axes, find any selected lines and cycle to the next line in that axes
-            for ax in self.active_decay_axes:
-                num_plotted = len(ax.curves)
+            for decay_lines in self.decay_lines:
+                rows = decay_lines.rows.tolist()
+                num_plotted = len(rows)
                 # Find the index of any lines in the current ax that is selected
-                index_of_selected = [ax.curves.index(line) for line in self.selected_lines if line in ax.curves]
+                index_of_selected = [rows.index(row) for row in self.selected_rows if row in rows]
                 if index_of_selected:
                     old_index = index_of_selected[0]  # Only take the first selected decay
                     if old_index < num_plotted - 1:
                         new_index = old_index + 1
                     else:
                         new_index = 0
-                    new_selection.append(ax.curves[new_index])
-            self.selected_lines = new_selection
+                    new_selection.append(rows[new_index])
+            self.selected_rows = new_selection
             self.highlight_lines()
 
     def auto_clean(self):
         """
-        Automatically detect and delete readings with outlier values.
+        Automatically detect and delete readings with outlier values. Readings are compared with the median of their
+        station and component over the last channels of the window (see decay_matrix.find_outliers), and at least 2
+        readings are kept for each station and component.
         """
-        def eval_decay(reading, std, median, max_removable):
-            """
-            Evaluate the reading and calculate if it should be flagged for deletion. Will stop deleting when
-            only 2 readings are left. Evaluates in two passes, the first pass is a large sweep of every channel
-            using a high confidence interval, and the second only looks at the last 3 channels and uses a low
-            confidence interval.
-            :param reading: list, decay values for each channel
-            :param std: int, a fixed standard deviation number to be used as a basis for calculating the data cutoff
-            limits
-            :param median: list, the median value of each channel decay value for the given group.
-            :param max_removable: int, the maximum number of readings that can be removed before reaching the
-            limit
-            :return: bool, True if the reading should be deleted.
-            """
-            global count, local_count
-            # TODO count not working, sometimes one reading remains
-            if local_count < max_removable:
-                # 68, 96, 99
-                # Second pass, looking at the last 5 off-time channels, and using 68% confidence interval
-                min_cutoff = median[mask][-window_size:] - std[mask][-window_size:]
-                max_cutoff = median[mask][-window_size:] + std[mask][-window_size:]
-                if any(reading[mask][-window_size:] < min_cutoff) or any(reading[mask][-window_size:] > max_cutoff):
-                    count += 1
-                    local_count += 1
-                    return True
-            else:
-                logger.info(f"Max removable limit reached.")
-
-            return False
-
         if self.pem_file.is_averaged():
             return
 
-        global count, mask, threshold_value, window_size
-        count = 0
-
-        # Use a fixed standard deviation value for cleaning across all channels
-        threshold_value = self.auto_clean_std_sbox.value()
-        window_size = self.auto_clean_window_sbox.value()
-
-        # Filter the data to only see readings that aren't already flagged for deletion
-        data = self.pem_file.data[~self.pem_file.data.Deleted.astype(bool)]
-        # Filter the readings to only consider off-time channels
-        mask = np.asarray(~self.pem_file.channel_times.Remove.astype(bool))
-
-        # Clean the data
-        cleaned_data = pd.DataFrame()
-        for id, group in data.groupby(['Station', 'Component'], as_index=False, group_keys=False):
-            readings = np.array(group[~group.Deleted.astype(bool)].Reading.to_list())
-            data_std = np.array([threshold_value] * len(readings[0]))
-            data_median = np.median(group[~group.Deleted.astype(bool)].Reading.to_list(), axis=0)
-
-            if len(group.loc[~group.Deleted.astype(bool)]) > 2:
-                global local_count
-                local_count = 0  # The number of readings that have been deleted so far for this group.
-                max_removable = len(group) - 2  # Maximum number of readings that are allowed to be deleted.
-                # Order the group by degree of deviation from the median
-                group["Deviation"] = group.Reading.map(lambda y: abs(y - data_median).sum())
-                group = group.sort_values(by="Deviation", ascending=False).drop("Deviation", axis=1)
-                group.Deleted = group.Reading.map(lambda x: eval_decay(x, data_std, data_median, max_removable))
-
-            cleaned_data = pd.concat([cleaned_data, group], axis=0)
+        channel_mask = np.asarray(~self.pem_file.channel_times.Remove.astype(bool))
+        index = find_outliers(self.pem_file.data, channel_mask,
+                              threshold=self.auto_clean_std_sbox.value(),
+                              window_size=self.auto_clean_window_sbox.value())
 
         # Update the data
-        self.pem_file.data.update(cleaned_data)
-        self.refresh_plots(components="all")
+        self.pem_file.data.loc[index, 'Deleted'] = True
+        self.refresh_plots(components="all", index=index)
 
         # Reset the range for only the profile axes.
         self.reset_range(decays=False, profiles=True)
 
-        self.message.information(self, 'Auto-clean results', f"{count} reading(s) automatically deleted.")
+        self.message.information(self, 'Auto-clean results', f"{len(index)} reading(s) automatically deleted.")
 
     def rename_repeats(self):
         """
@@ -2247,8 +2014,15 @@ class PEMPlotEditor(QMainWindow, Ui_PEMPlotEditor):
 
         self.message.information(self, 'Auto-rename results', f"{len(repeats)} reading(s) automatically renamed.")
 
-    def refresh_plots(self, components='all', preserve_selection=False):
-        self.data_edited()
+    def refresh_plots(self, components='all', preserve_selection=False, index=None):
+        """
+        Update the plots after the data is edited.
+        :param components: list of str, components of the profile plots to update.
+        :param preserve_selection: bool, keep the selected decays.
+        :param index: list-like, index of the edited readings in PEMFile.data, when no station was changed. Only the
+        profiles of these readings are calculated again.
+        """
+        self.data_edited(index=index)
         self.plot_profiles(components=components)
         self.plot_decays(self.selected_station, preserve_selection=preserve_selection)
 
@@ -2737,28 +2511,18 @@ class PPViewer(QMainWindow):
         Signal slot, select all lines that intersect the drawn rectangle.
         :param rect: QRectF object
         """
-        def intersects_rect(line):
-            """
-            Uses cohen-sutherland algorithm to find if a line intersects the rectangle at any point.
-            :param line: pg.PlotCurveItem
-            :return: bool
-            """
-            xi, yi = line.xData, line.yData
-
-            # Line is broken down into segments for the algorithm
-            for i, (x, y) in enumerate(zip(xi[:-1], yi[:-1])):
-                x1, y1 = float(x), y
-                x2, y2 = float(xi[i + 1]), yi[i + 1]
-                x3, y3, x4, y4 = lc.cohensutherland(left, top, right, bottom, x1, y1, x2, y2)
-
-                if any([x3, y3, x4, y4]):
-                    return True
-
-        # Create the clip window for the line clipping algorithm.
         left, top, right, bottom = min(rect.left(), rect.right()), max(rect.top(), rect.bottom()), \
                                    max(rect.left(), rect.right()), min(rect.top(), rect.bottom())
-        curves = [line for line in self.decay_plot.curves if isinstance(line, pg.PlotCurveItem)]
-        lines = [line for line in curves if intersects_rect(line)]
+        curves = [line for line in self.decay_plot.curves
+                  if isinstance(line, pg.PlotCurveItem) and line.xData is not None and len(line.xData)]
+
+        # Pad the curves with NaN so every segment of every curve is tested against the rectangle at once
+        length = max([len(line.xData) for line in curves], default=0)
+        xi, yi = np.full((len(curves), length), np.nan), np.full((len(curves), length), np.nan)
+        for i, line in enumerate(curves):
+            xi[i, :len(line.xData)], yi[i, :len(line.yData)] = line.xData, line.yData
+        intersects = lines_in_rect(xi, yi, left, bottom, right, top)
+        lines = [line for line, intersect in zip(curves, intersects) if intersect]
 
         if keyboard.is_pressed('ctrl'):
             self.selected_lines.extend(lines)
@@ -10,6 +10,7 @@ from PySide2.QtWidgets import (QMessageBox, QWidget, QVBoxLayout, QApplication,
                                QTableWidget, QAbstractScrollArea)
 
 from src.pem import convert_station
+from src.text_io import read_text
 
 logger = logging.getLogger(__name__)
 
@@ -31,18 +32,17 @@ class RIFile:
         self.filepath = filepath
         self.data = []
 
-        with open(filepath, 'rt') as in_file:
-            step_info = re.split('\$\$', in_file.read())[-1]
-            raw_file = step_info.splitlines()
-            raw_file = [line.split() for line in raw_file[1:]]  # Removing the header row
-            # Creating the remaining off-time channel columns for the header
-            [self.columns.append('Ch' + str(num + 11)) for num in range(len(raw_file[0]) - len(self.columns))]
-
-            for row in raw_file:
-                station = {}
-                for i, column in enumerate(self.columns):
-                    station[column] = row[i]
-                self.data.append(station)
+        step_info = re.split('\$\$', read_text(filepath))[-1]
+        raw_file = step_info.splitlines()
+        raw_file = [line.split() for line in raw_file[1:]]  # Removing the header row
+        # Creating the remaining off-time channel columns for the header
+        [self.columns.append('Ch' + str(num + 11)) for num in range(len(raw_file[0]) - len(self.columns))]
+
+        for row in raw_file:
+            station = {}
+            for i, column in enumerate(self.columns):
+                station[column] = row[i]
+            self.data.append(station)
         return self
 
     def get_components(self):
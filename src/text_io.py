@@ -0,0 +1,211 @@
+import codecs
+import logging
+import mmap
+import os
+import shutil
+import stat
+import tempfile
+from pathlib import Path
+
+import chardet
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Number of bytes at the start of a file used to detect its encoding
+SNIFF_SIZE = 64 * 1024
+# Size of the chunks (in bytes) files are read and decoded in
+CHUNK_SIZE = 1024 ** 2
+# Files at least this large (in bytes) are memory-mapped instead of read
+MMAP_SIZE_THRESHOLD = 16 * 1024 ** 2
+
+boms = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+
+def detect_encoding(prefix):
+    """
+    Detect the encoding of text from the first bytes of a file. Pure ASCII and valid UTF-8 are checked first, so
+    chardet only runs on the prefix of files in other encodings. ASCII text is reported as UTF-8, since the rest of the
+    file can have non-ASCII characters.
+    :param prefix: bytes
+    :return: str, encoding name
+    """
+    for bom, encoding in boms:
+        if prefix.startswith(bom):
+            return encoding
+
+    if prefix.isascii():
+        return 'utf-8'
+
+    try:
+        # The prefix can end in the middle of a multi-byte character
+        codecs.getincrementaldecoder('utf-8')().decode(prefix, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    encoding = chardet.detect(prefix).get('encoding') or 'latin-1'
+    logger.debug(f"Detected {encoding} encoding.")
+    return encoding
+
+
+def get_encoding(filepath):
+    """
+    Detect the encoding of a file using the first SNIFF_SIZE bytes.
+    :param filepath: str or Path
+    :return: str, encoding name
+    """
+    with open(filepath, 'rb') as byte_file:
+        return detect_encoding(byte_file.read(SNIFF_SIZE))
+
+
+def get_fallback_encoding(filepath, encoding):
+    """
+    Detect the encoding of a file from all of its contents, used when the file can't be decoded with the encoding
+    detected from its first bytes.
+    :param filepath: str or Path
+    :param encoding: str, encoding which failed
+    :return: str, encoding name
+    """
+    with open(filepath, 'rb') as byte_file:
+        fallback = chardet.detect(byte_file.read()).get('encoding')
+    if not fallback or codecs.lookup(fallback).name == codecs.lookup(encoding).name:
+        fallback = 'latin-1'
+    logger.warning(f"{Path(str(filepath)).name} is not valid {encoding}, using {fallback} encoding.")
+    return fallback
+
+
+def _decode_file(filepath, encoding, errors='strict'):
+    """
+    Read and decode a file in chunks, so the whole file is never held as bytes and text at the same time. Files of at
+    least MMAP_SIZE_THRESHOLD bytes are memory-mapped and decoded from slices of the mapping, which aren't copied into
+    bytes objects.
+    :param filepath: str or Path
+    :param encoding: str
+    :param errors: str, error handling of the decoder
+    :return: str
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors)
+    pieces = []
+    with open(filepath, 'rb') as byte_file:
+        size = os.fstat(byte_file.fileno()).st_size
+        if size >= MMAP_SIZE_THRESHOLD:
+            with mmap.mmap(byte_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                for start in range(0, size, CHUNK_SIZE):
+                    # Slices must be released before the mapping is closed
+                    with view[start:start + CHUNK_SIZE] as chunk:
+                        pieces.append(decoder.decode(chunk))
+        else:
+            for chunk in iter(lambda: byte_file.read(CHUNK_SIZE), b''):
+                pieces.append(decoder.decode(chunk))
+    pieces.append(decoder.decode(b'', final=True))
+    return ''.join(pieces)
+
+
+def read_text(filepath):
+    """
+    Read and decode a text file. If the file isn't valid in the encoding detected from its first bytes, the encoding
+    is detected again from the whole file.
+    :param filepath: str or Path
+    :return: str
+    """
+    encoding = get_encoding(filepath)
+    logger.info(f"Using {encoding} encoding for {Path(str(filepath)).name}.")
+    try:
+        return _decode_file(filepath, encoding)
+    except UnicodeDecodeError:
+        return _decode_file(filepath, get_fallback_encoding(filepath, encoding), errors='replace')
+
+
+def iter_lines(filepath):
+    """
+    Generator of the decoded lines of a text file, without line endings. Only one line is held in memory at a time.
+    If the file isn't valid in the encoding detected from its first bytes, the remaining lines are decoded with the
+    encoding detected from the whole file.
+    :param filepath: str or Path
+    """
+    encoding = get_encoding(filepath)
+    num_lines = 0
+    try:
+        with open(filepath, 'r', encoding=encoding, newline=None) as in_file:
+            for line in in_file:
+                yield line.rstrip('\n')
+                num_lines += 1
+        return
+    except UnicodeDecodeError:
+        encoding = get_fallback_encoding(filepath, encoding)
+
+    with open(filepath, 'r', encoding=encoding, errors='replace', newline=None) as in_file:
+        for i, line in enumerate(in_file):
+            if i >= num_lines:
+                yield line.rstrip('\n')
+
+
+def read_tokens(filepath):
+    """
+    Read a text file as a list of the whitespace-separated tokens of each line.
+    :param filepath: str or Path
+    :return: list of lists of str
+    """
+    return [line.split() for line in iter_lines(filepath)]
+
+
+def tokenize(text, dtype=float):
+    """
+    Split text on whitespace into a numpy array.
+    :param text: str
+    :param dtype: numpy dtype of the array. Use str to keep the tokens as text.
+    :return: 1D numpy array
+    :raises ValueError: if a token can't be converted to dtype
+    """
+    return np.array(text.split(), dtype=dtype)
+
+
+def get_umask():
+    """
+    Read the umask of the process from /proc/self/status, which doesn't change it like os.umask() does.
+    :return: int, or None where /proc isn't available (Windows, macOS, old kernels)
+    """
+    try:
+        with open('/proc/self/status') as status_file:
+            for line in status_file:
+                if line.startswith('Umask:'):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def write_text_atomic(filepath, text, encoding=None):
+    """
+    Write text to a temporary file in the same folder, then rename it to filepath. The file is either fully written
+    or left unchanged, even if the writing is interrupted. The permissions of an existing file are kept. New files get
+    the default permissions where the umask can be read (see get_umask), otherwise they keep the permissions of the
+    temporary file, which is only readable by its owner.
+    :param filepath: str or Path
+    :param text: str
+    :param encoding: str, defaults to the system encoding, the same as open().
+    """
+    filepath = Path(filepath)
+    fd, temp_path = tempfile.mkstemp(dir=filepath.parent, prefix=f".{filepath.stem}_", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding=encoding) as temp_file:
+            temp_file.write(text)
+        if filepath.exists():
+            shutil.copymode(filepath, temp_path)
+        else:
+            umask = get_umask()
+            if umask is not None:
+                os.chmod(temp_path, (stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IWGRP | stat.S_IROTH |
+                                     stat.S_IWOTH) & ~umask)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -521,7 +521,10 @@ class Ui_PEMHub(object):
         self.gridLayout_14 = QGridLayout(self.available_pems_frame)
         self.gridLayout_14.setObjectName(u"gridLayout_14")
         self.gridLayout_14.setContentsMargins(6, 6, 6, 6)
-        self.pem_list = QListWidget(self.available_pems_frame)
+        self.pem_list = QTreeWidget(self.available_pems_frame)
+        __qtreewidgetitem = QTreeWidgetItem()
+        __qtreewidgetitem.setText(0, u"File");
+        self.pem_list.setHeaderItem(__qtreewidgetitem)
         self.pem_list.setObjectName(u"pem_list")
         sizePolicy5.setHeightForWidth(self.pem_list.sizePolicy().hasHeightForWidth())
         self.pem_list.setSizePolicy(sizePolicy5)
@@ -531,6 +534,8 @@ class Ui_PEMHub(object):
         self.pem_list.setDragDropMode(QAbstractItemView.NoDragDrop)
         self.pem_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.pem_list.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.pem_list.setRootIsDecorated(False)
+        self.pem_list.setUniformRowHeights(True)
 
         self.gridLayout_14.addWidget(self.pem_list, 1, 0, 4, 1)
 
@@ -1153,10 +1158,10 @@ class Ui_PEMHub(object):
 #endif // QT_CONFIG(statustip)
         self.auto_create_backup_files_cbox.setText(QCoreApplication.translate("PEMHub", u"Backup Files Automatically", None))
 #if QT_CONFIG(tooltip)
-        self.auto_create_backup_files_cbox.setToolTip(QCoreApplication.translate("PEMHub", u"Automatically create backup files.", None))
+        self.auto_create_backup_files_cbox.setToolTip(QCoreApplication.translate("PEMHub", u"Write a backup of processed files, as they were before processing, when they are saved.", None))
 #endif // QT_CONFIG(tooltip)
 #if QT_CONFIG(statustip)
-        self.auto_create_backup_files_cbox.setStatusTip(QCoreApplication.translate("PEMHub", u"Automatically create backup files.", None))
+        self.auto_create_backup_files_cbox.setStatusTip(QCoreApplication.translate("PEMHub", u"Write a backup of processed files, as they were before processing, when they are saved.", None))
 #endif // QT_CONFIG(statustip)
         self.delete_merged_files_cbox.setText(QCoreApplication.translate("PEMHub", u"Remove Merged Files", None))
 #if QT_CONFIG(tooltip)
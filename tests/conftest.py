@@ -0,0 +1,71 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+class FakePEMFile:
+    """
+    PEMFile with only the attributes used by the data processing, since PEMFile needs the whole GUI environment.
+    """
+
+    def __init__(self, data, filepath='line.PEM', number_of_channels=None):
+        self.data = data
+        self.filepath = Path(filepath)
+        self.number_of_readings = len(data)
+        self.number_of_channels = number_of_channels or len(data.Reading.iloc[0])
+        self.channel_times = pd.DataFrame({
+            'Start': np.arange(self.number_of_channels, dtype=float),
+            'Remove': np.arange(self.number_of_channels) < 2,  # The first channels are on-time
+        })
+
+    def is_averaged(self):
+        return not self.data.duplicated(['Station', 'Component']).any()
+
+    def is_split(self):
+        return not self.channel_times.Remove.any()
+
+
+def make_data(rng, num_stations=20, num_repeats=4, num_channels=12, components='XYZ'):
+    """
+    Raw survey data, with the readings of the stations and components in a random order.
+    :param rng: numpy random Generator
+    :return: pandas DataFrame, the same columns as PEMFile.data
+    """
+    stations = np.repeat([f"{s * 25}{'N' if s % 2 else 'S'}" for s in range(num_stations)],
+                         len(components) * num_repeats)
+    comps = np.tile(np.repeat(list(components), num_repeats), num_stations)
+    data = pd.DataFrame({
+        'Station': stations,
+        'Component': comps,
+        'Reading_index': 1,
+        'Gain': 0,
+        'Rx_type': 'A',
+        'ZTS': 12.5,
+        'Coil_delay': 1000,
+        'Number_of_stacks': rng.integers(64, 512, len(stations)),
+        'Readings_per_set': 4,
+        'Reading_number': np.arange(len(stations)),
+        'RAD_tool': None,
+        'Deleted': rng.random(len(stations)) < 0.1,
+        'Overload': False,
+        'RAD_ID': 0,
+    })
+    data['Reading'] = pd.Series(list(rng.normal(size=(len(data), num_channels))), dtype=object)
+    return data.sample(frac=1, random_state=0).reset_index(drop=True)
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+@pytest.fixture
+def data(rng):
+    return make_data(rng)
+
+
+@pytest.fixture
+def pem_file(data):
+    return FakePEMFile(data)
@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+
+from src.pem.decay_matrix import DecayMatrix, average_pem, find_outliers, split_pem
+
+
+def pandas_average(data):
+    """
+    Average of each station and component with groupby, weighted by the number of stacks.
+    :return: dict of (Station, Component): (summed stacks, averaged decay)
+    """
+    averages = {}
+    for key, group in data.groupby(['Station', 'Component']):
+        values = np.stack(group.Reading.to_numpy())
+        averages[key] = (group.Number_of_stacks.sum(), np.average(values, axis=0, weights=group.Number_of_stacks))
+    return averages
+
+
+def pandas_outliers(data, threshold, channels, min_remaining=2):
+    """
+    Outliers of each station and component found one group at a time, removed from the furthest to the nearest to the
+    median of the group, with ties broken by the order of the readings.
+    :return: set of the index of the outlier readings
+    """
+    outliers = set()
+    for _, group in data.groupby(['Station', 'Component']):
+        values = np.stack(group.Reading.to_numpy())
+        difference = np.abs(values - np.median(values, axis=0))
+        is_outlier = (difference[:, channels] > threshold).any(axis=1)
+        deviation = difference.sum(axis=1)
+        removable = max(len(group) - min_remaining, 0)
+        for i in sorted(range(len(group)), key=lambda i: (-deviation[i], i)):
+            if is_outlier[i] and removable > 0:
+                outliers.add(group.index[i])
+                removable -= 1
+    return outliers
+
+
+def test_from_data_sorts_groups(data):
+    matrix = DecayMatrix.from_data(data)
+    groups = matrix.get_groups()
+
+    assert len(groups) == len(data.groupby(['Station', 'Component']))
+    assert np.all(np.diff(matrix.c_stations) >= 0)
+    for group in groups.itertuples():
+        rows = data.loc[matrix.meta.index[group.Start:group.Stop]]
+        assert (rows.Station == group.Station).all() and (rows.Component == group.Component).all()
+        # Readings of a group keep the order of the data
+        assert rows.index.is_monotonic_increasing
+    np.testing.assert_array_equal(matrix.values, np.stack(data.Reading.loc[matrix.meta.index].to_numpy()))
+
+
+def test_average_matches_pandas(data):
+    data = data[~data.Deleted]
+    expected = pandas_average(data)
+    averaged = DecayMatrix.from_data(data).average()
+
+    assert len(averaged) == len(expected)
+    for station, component, stacks, values in zip(averaged.stations, averaged.components,
+                                                   averaged.meta.Number_of_stacks, averaged.values):
+        expected_stacks, expected_values = expected[(station, component)]
+        assert stacks == expected_stacks
+        np.testing.assert_allclose(values, expected_values)
+
+
+def test_average_pem(pem_file):
+    expected = pandas_average(pem_file.data[~pem_file.data.Deleted])
+    average_pem(pem_file)
+
+    assert pem_file.is_averaged()
+    assert pem_file.number_of_readings == len(pem_file.data) == len(expected)
+    for reading in pem_file.data.itertuples():
+        expected_stacks, expected_values = expected[(reading.Station, reading.Component)]
+        assert reading.Number_of_stacks == expected_stacks
+        np.testing.assert_allclose(reading.Reading, expected_values)
+
+
+def test_split_pem(pem_file):
+    channel_mask = ~pem_file.channel_times.Remove.to_numpy()
+    expected = np.stack(pem_file.data.Reading.to_numpy())[:, channel_mask]
+    split_pem(pem_file)
+
+    assert pem_file.is_split()
+    assert pem_file.number_of_channels == len(pem_file.channel_times) == channel_mask.sum()
+    np.testing.assert_array_equal(np.stack(pem_file.data.Reading.to_numpy()), expected)
+
+
+def test_find_outliers_matches_pandas(data):
+    channel_mask = np.arange(len(data.Reading.iloc[0])) >= 2
+    threshold, window_size = 1.5, 4
+    channels = np.flatnonzero(channel_mask)[-window_size:]
+
+    outliers = find_outliers(data, channel_mask, threshold, window_size)
+    expected = pandas_outliers(data[~data.Deleted], threshold, channels)
+
+    assert len(expected) > 0
+    assert set(outliers) == expected
+
+
+def test_find_outliers_keeps_min_remaining(rng):
+    data = pd.DataFrame({'Station': '100N', 'Component': 'Z', 'Number_of_stacks': 64, 'Reading_number': range(5),
+                         'Deleted': False, 'Overload': False, 'RAD_ID': 0})
+    data['Reading'] = pd.Series(list(rng.normal(scale=100, size=(5, 6))), dtype=object)
+
+    for min_remaining in range(6):
+        matrix = DecayMatrix.from_data(data)
+        outliers = matrix.find_outliers(0.1, range(6), min_remaining=min_remaining)
+        assert outliers.sum() == max(5 - min_remaining, 0)
+
+
+def test_update_matches_rebuild(rng, data):
+    matrix = DecayMatrix.from_data(data)
+    for i in range(30):
+        index = rng.choice(data.index, rng.integers(1, 10), replace=False)
+        if i % 3 == 0:
+            data.loc[index, 'Deleted'] = ~data.loc[index, 'Deleted']
+        elif i % 3 == 1:
+            data.loc[index, 'Component'] = rng.choice(['X', 'Y', 'Z'])
+        else:
+            data.loc[index, 'Reading'] = pd.Series([-r for r in data.Reading.loc[index]], index=index, dtype=object)
+
+        assert matrix.update(data, index)
+        expected = DecayMatrix.from_data(data)
+        np.testing.assert_array_equal(matrix.values, expected.values)
+        pd.testing.assert_frame_equal(matrix.meta, expected.meta)
+        np.testing.assert_array_equal(matrix.get_group_starts(), expected.get_group_starts())
+
+
+def test_update_refuses_station_changes(data):
+    matrix = DecayMatrix.from_data(data)
+    data.loc[0, 'Station'] = '9999N'
+    assert not matrix.update(data, [0])
+    assert not matrix.update(data.iloc[1:], [1])
+
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from src.line_clip import lines_in_rect
+
+INSIDE, LEFT, RIGHT, BOTTOM, TOP = 0, 1, 2, 4, 8
+
+
+def cohen_sutherland(x0, y0, x1, y1, left, bottom, right, top):
+    """
+    Cohen-Sutherland clipping of a single segment.
+    :return: bool, True if any part of the segment is inside the rectangle.
+    """
+    def code(x, y):
+        c = INSIDE
+        if x < left:
+            c |= LEFT
+        elif x > right:
+            c |= RIGHT
+        if y < bottom:
+            c |= BOTTOM
+        elif y > top:
+            c |= TOP
+        return c
+
+    code0, code1 = code(x0, y0), code(x1, y1)
+    while True:
+        if not (code0 | code1):
+            return True
+        if code0 & code1:
+            return False
+
+        out = code0 or code1
+        if out & TOP:
+            x, y = x0 + (x1 - x0) * (top - y0) / (y1 - y0), top
+        elif out & BOTTOM:
+            x, y = x0 + (x1 - x0) * (bottom - y0) / (y1 - y0), bottom
+        elif out & RIGHT:
+            x, y = right, y0 + (y1 - y0) * (right - x0) / (x1 - x0)
+        else:
+            x, y = left, y0 + (y1 - y0) * (left - x0) / (x1 - x0)
+
+        if out == code0:
+            x0, y0, code0 = x, y, code(x, y)
+        else:
+            x1, y1, code1 = x, y, code(x, y)
+
+
+def brute_force(x, y, rect):
+    x = np.broadcast_to(x, y.shape)
+    result = []
+    for xs, ys in zip(x, y):
+        valid = np.isfinite(xs) & np.isfinite(ys)
+        result.append(any([cohen_sutherland(xs[i], ys[i], xs[i + 1], ys[i + 1], *rect)
+                           for i in range(len(xs) - 1) if valid[i] and valid[i + 1]]))
+    return np.array(result, dtype=bool)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_cohen_sutherland(seed):
+    rng = np.random.default_rng(seed)
+    x = np.arange(40, dtype=float)
+    y = np.cumsum(rng.normal(size=(200, 40)), axis=1)
+    # Lines of different lengths are padded with NaN
+    y[rng.random(200) < 0.2, 30:] = np.nan
+
+    for _ in range(20):
+        left, right = np.sort(rng.uniform(-5, 45, 2))
+        bottom, top = np.sort(rng.uniform(-15, 15, 2))
+        rect = (left, bottom, right, top)
+        np.testing.assert_array_equal(lines_in_rect(x, y, *rect), brute_force(x, y, rect))
+
+
+def test_2d_x():
+    rng = np.random.default_rng(0)
+    x = rng.uniform(0, 10, (50, 8))
+    y = rng.uniform(0, 10, (50, 8))
+    rect = (3, 3, 6, 6)
+    np.testing.assert_array_equal(lines_in_rect(x, y, *rect), brute_force(x, y, rect))
+
+
+def test_edge_cases():
+    x = np.array([0., 10.])
+    y = np.array([
+        [5., 5.],  # Horizontal, through the rectangle
+        [20., 20.],  # Horizontal, above
+        [0., 10.],  # Diagonal, through the corner
+        [-20., -10.],  # Below
+        [4., 4.],  # Touching the bottom edge
+    ])
+    np.testing.assert_array_equal(lines_in_rect(x, y, 4, 4, 6, 6), [True, False, True, False, True])
+
+    # Vertical segment
+    assert lines_in_rect(np.array([[5., 5.]]), np.array([[0., 10.]]), 4, 4, 6, 6).tolist() == [True]
+    assert lines_in_rect(np.array([[7., 7.]]), np.array([[0., 10.]]), 4, 4, 6, 6).tolist() == [False]
+    # Segment entirely inside
+    assert lines_in_rect(np.array([4.5, 5.5]), np.array([[4.5, 5.5]]), 4, 4, 6, 6).tolist() == [True]
+
+
+def test_no_segments():
+    assert lines_in_rect(np.arange(1.), np.zeros((3, 1)), 0, 0, 1, 1).tolist() == [False] * 3
+    assert lines_in_rect(np.arange(5.), np.empty((0, 5)), 0, 0, 1, 1).tolist() == []
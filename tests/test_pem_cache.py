@@ -0,0 +1,104 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import FakePEMFile
+from src.pem.pem_cache import ParsedFileCache, cached_parse
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ParsedFileCache(folder=tmp_path.joinpath('cache'))
+
+
+@pytest.fixture
+def filepath(tmp_path):
+    filepath = tmp_path.joinpath('line.PEM')
+    filepath.write_text('readings')
+    return filepath
+
+
+class Parser:
+    """
+    Counts the files parsed.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.parsed = []
+
+    def __call__(self, filepath):
+        self.parsed.append(filepath)
+        return FakePEMFile(self.data.copy(), filepath=filepath)
+
+
+def test_hit(cache, filepath, data):
+    parse = Parser(data)
+    parsed = cached_parse(filepath, parse, cache=cache)
+    cached = cached_parse(filepath, parse, cache=cache)
+
+    assert len(parse.parsed) == 1
+    assert cached is not parsed
+    assert isinstance(cached, FakePEMFile)
+    assert cached.filepath == parsed.filepath
+    assert cached.number_of_channels == parsed.number_of_channels
+    pd.testing.assert_frame_equal(cached.channel_times, parsed.channel_times)
+    pd.testing.assert_frame_equal(cached.data.drop(columns='Reading'), parsed.data.drop(columns='Reading'))
+    np.testing.assert_array_equal(np.stack(cached.data.Reading.to_numpy()), np.stack(parsed.data.Reading.to_numpy()))
+
+
+def test_invalidated_by_changes(cache, filepath, data):
+    parse = Parser(data)
+    cached_parse(filepath, parse, cache=cache)
+
+    # Same size, newer modification time
+    stat = filepath.stat()
+    os.utime(filepath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    cached_parse(filepath, parse, cache=cache)
+    assert len(parse.parsed) == 2
+
+    # Different size
+    filepath.write_text('more readings')
+    cached_parse(filepath, parse, cache=cache)
+    assert len(parse.parsed) == 3
+
+    cached_parse(filepath, parse, cache=cache)
+    assert len(parse.parsed) == 3
+
+
+def test_kinds_are_separate(cache, filepath, data):
+    parse = Parser(data)
+    cached_parse(filepath, parse, cache=cache)
+
+    pem_file, extra = cached_parse(filepath, lambda f: (parse(f), 'errors'), kind='dmp', cache=cache)
+    assert len(parse.parsed) == 2
+    pem_file, extra = cached_parse(filepath, lambda f: (parse(f), 'errors'), kind='dmp', cache=cache)
+    assert len(parse.parsed) == 2
+    assert extra == 'errors'
+
+
+def test_corrupt_entry_is_parsed_again(cache, filepath, data):
+    parse = Parser(data)
+    cached_parse(filepath, parse, cache=cache)
+    for array_file in cache.folder.glob('*.npz'):
+        array_file.write_bytes(b'corrupt')
+
+    assert cache.load(filepath) is None
+    cached_parse(filepath, parse, cache=cache)
+    assert len(parse.parsed) == 2
+
+
+def test_evict(cache, tmp_path, data):
+    parse = Parser(data)
+    filepaths = []
+    for i in range(3):
+        filepaths.append(tmp_path.joinpath(f"line_{i}.PEM"))
+        filepaths[-1].write_text(str(i))
+        cached_parse(filepaths[-1], parse, cache=cache, evict=False)
+    assert all([cache.load(filepath) is not None for filepath in filepaths])
+
+    cache.max_size = 0
+    cache.evict()
+    assert all([cache.load(filepath) is None for filepath in filepaths])
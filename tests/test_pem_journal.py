@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.pem.pem_journal import PEMJournal
+from src.pem.pem_summary import get_version
+
+
+def assert_same_data(data, expected):
+    pd.testing.assert_frame_equal(data.drop(columns='Reading'), expected.drop(columns='Reading'))
+    np.testing.assert_array_equal(np.stack(data.Reading.to_numpy()), np.stack(expected.Reading.to_numpy()))
+
+
+def snapshot(pem_file):
+    return pem_file.data.copy(), pem_file.channel_times.copy(), pem_file.number_of_readings, \
+        pem_file.number_of_channels
+
+
+def assert_same_file(pem_file, state):
+    data, channel_times, number_of_readings, number_of_channels = state
+    assert_same_data(pem_file.data, data)
+    pd.testing.assert_frame_equal(pem_file.channel_times, channel_times)
+    assert pem_file.number_of_readings == number_of_readings
+    assert pem_file.number_of_channels == number_of_channels
+
+
+def run(journal, pem_file, operation, *args):
+    batch = journal.batch(operation)
+    batch.apply(pem_file, operation, *args)
+    journal.push(batch)
+    return batch
+
+
+@pytest.mark.parametrize('max_memory', [256 * 1024 ** 2, 0])
+def test_undo_redo_round_trip(tmp_path, pem_file, max_memory):
+    # With no memory, every delta is moved to a file
+    folder = tmp_path.joinpath('journal')
+    journal = PEMJournal(max_memory=max_memory, folder=folder)
+    states = [snapshot(pem_file)]
+    for operation in ['split', 'average']:
+        run(journal, pem_file, operation)
+        states.append(snapshot(pem_file))
+    if max_memory == 0:
+        assert list(folder.iterdir())
+
+    for state in reversed(states[:-1]):
+        batch, errors = journal.undo()
+        assert batch is not None and not errors
+        assert_same_file(pem_file, state)
+
+    for state in states[1:]:
+        batch, errors = journal.redo()
+        assert batch is not None and not errors
+        assert_same_file(pem_file, state)
+
+    journal.clear()
+    assert not folder.exists() or not list(folder.iterdir())
+
+
+def test_undo_marks_modified(tmp_path, pem_file):
+    journal = PEMJournal(folder=tmp_path)
+    version = get_version(pem_file)
+    batch = run(journal, pem_file, 'average')
+    assert get_version(pem_file) > version
+    assert batch.is_current()
+
+    version = get_version(pem_file)
+    journal.undo()
+    assert get_version(pem_file) > version
+    assert not batch.is_current()
+
+
+def test_get_original(tmp_path, pem_file):
+    journal = PEMJournal(folder=tmp_path)
+    original = snapshot(pem_file)
+    run(journal, pem_file, 'split')
+    run(journal, pem_file, 'average')
+    averaged = snapshot(pem_file)
+
+    assert_same_file(journal.get_original(pem_file), original)
+    # The file itself isn't changed
+    assert_same_file(pem_file, averaged)
+
+
+def test_push_clears_redo(tmp_path, pem_file):
+    journal = PEMJournal(folder=tmp_path)
+    run(journal, pem_file, 'split')
+    journal.undo()
+    assert journal.redo_batch is not None
+
+    run(journal, pem_file, 'average')
+    assert journal.redo_batch is None
+    assert journal.redo() == (None, [])
@@ -0,0 +1,133 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from src.pem.pem_registry import PEMRegistry, name_key
+
+
+class File:
+    def __init__(self, name):
+        self.filepath = Path('/project', name)
+
+    def __repr__(self):
+        return f"File({self.filepath.name})"
+
+
+def assert_maps(registry, expected):
+    """
+    The list and the maps of the registry match the expected files.
+    """
+    assert list(registry) == expected
+    assert registry._keys == [name_key(pem_file.filepath.name) for pem_file in expected]
+    assert len(registry._paths) == len(registry._file_paths) == len(expected)
+    for i, pem_file in enumerate(expected):
+        assert registry.index(pem_file) == i
+        assert pem_file in registry
+        assert registry.find(pem_file.filepath) is pem_file
+        assert registry.find(str(pem_file.filepath)) is pem_file
+
+
+def make_files(*names):
+    return [File(f"{name}.PEM") for name in names]
+
+
+def test_insert_delete_setitem():
+    a, b, c, d, e = make_files('a', 'b', 'c', 'd', 'e')
+    registry = PEMRegistry([a, b])
+    expected = [a, b]
+    assert_maps(registry, expected)
+
+    registry.insert(1, c)
+    expected.insert(1, c)
+    assert_maps(registry, expected)
+
+    registry.insert(-1, d)
+    expected.insert(-1, d)
+    assert_maps(registry, expected)
+
+    registry[0] = e
+    expected[0] = e
+    assert_maps(registry, expected)
+    assert a not in registry
+    assert registry.find(a.filepath) is None
+
+    del registry[1]
+    del expected[1]
+    assert_maps(registry, expected)
+    assert c not in registry
+
+    assert registry.pop() is expected.pop()
+    registry.remove(e)
+    expected.remove(e)
+    assert_maps(registry, expected)
+    with pytest.raises(ValueError):
+        registry.index(e)
+
+
+def test_numpy_indexes():
+    files = make_files('a', 'b', 'c')
+    new_file = File('d.PEM')
+    registry = PEMRegistry(files)
+
+    registry[np.int64(1)] = new_file
+    files[1] = new_file
+    assert_maps(registry, files)
+
+    del registry[np.int32(-1)]
+    del files[-1]
+    assert_maps(registry, files)
+
+    registry.insert(np.int64(0), File('e.PEM'))
+    assert isinstance(registry.index(files[0]), int)
+    with pytest.raises(TypeError):
+        registry[1.0] = new_file
+    with pytest.raises(IndexError):
+        del registry[10]
+
+
+def test_slices_and_reordering():
+    files = make_files('c', 'a', 'd', 'b', 'e')
+    registry = PEMRegistry(files)
+
+    registry[1:3] = make_files('f')
+    files[1:3] = registry[1:2]
+    assert_maps(registry, files)
+
+    del registry[::2]
+    del files[::2]
+    assert_maps(registry, files)
+
+    registry += make_files('g', 'h')
+    files += registry[-2:]
+    assert_maps(registry, files)
+
+    registry.reverse()
+    files.reverse()
+    assert_maps(registry, files)
+
+    registry.sort(key=lambda pem_file: pem_file.filepath.name)
+    files.sort(key=lambda pem_file: pem_file.filepath.name)
+    assert_maps(registry, files)
+
+    with pytest.raises(TypeError):
+        registry *= 2
+
+
+def test_insertion_point():
+    files = make_files('L1', 'L2', 'L10')
+    registry = PEMRegistry(files)
+    assert registry.get_insertion_point(File('L3.PEM')) == 2
+    assert registry.get_insertion_point(File('L0.PEM')) == 0
+    assert registry.get_insertion_point(File('L20.PEM')) == 3
+
+
+def test_reindex():
+    a, b = make_files('a', 'b')
+    registry = PEMRegistry([a, b])
+    old_path = a.filepath
+    a.filepath = Path('/project', 'z.PEM')
+    registry.reindex()
+
+    assert registry.find(old_path) is None
+    assert_maps(registry, [a, b])
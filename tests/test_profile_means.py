@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.pem import convert_station
+from src.pem.profile_means import ProfileMeans
+
+
+def assert_same_means(profile_means, expected):
+    np.testing.assert_array_equal(profile_means.stations, expected.stations)
+    for component in ProfileMeans.components:
+        stations, means = profile_means.get_means(component)
+        expected_stations, expected_means = expected.get_means(component)
+        np.testing.assert_array_equal(stations, expected_stations)
+        np.testing.assert_allclose(means, expected_means, atol=1e-12)
+
+        stations, values = profile_means.get_readings(component)
+        expected_stations, expected_values = expected.get_readings(component)
+        np.testing.assert_array_equal(stations, expected_stations)
+        np.testing.assert_array_equal(values, expected_values)
+
+
+@pytest.fixture
+def channel_mask(data):
+    return np.arange(len(data.Reading.iloc[0])) >= 2
+
+
+def test_means_match_pandas(data, channel_mask):
+    profile_means = ProfileMeans(data, channel_mask)
+    used = data[~data.Deleted]
+    for component in ProfileMeans.components:
+        stations, means = profile_means.get_means(component)
+        rows = used[used.Component == component]
+        for station, mean in zip(stations, means):
+            station_rows = rows[rows.Station.map(convert_station) == station]
+            expected = np.stack(station_rows.Reading.to_numpy())[:, channel_mask].mean(axis=0)
+            np.testing.assert_allclose(mean, expected)
+
+
+def test_update_matches_rebuild(rng, data, channel_mask):
+    profile_means = ProfileMeans(data, channel_mask)
+    for i in range(30):
+        index = rng.choice(data.index, rng.integers(1, 10), replace=False)
+        if i % 4 == 0:
+            data.loc[index, 'Deleted'] = ~data.loc[index, 'Deleted']
+        elif i % 4 == 1:
+            data.loc[index, 'Component'] = rng.choice(['X', 'Y', 'Z'])
+        elif i % 4 == 2:
+            data.loc[index, 'Station'] = rng.choice(data.Station.unique())
+        else:
+            data.loc[index, 'Reading'] = pd.Series([r * rng.normal() for r in data.Reading.loc[index]], index=index,
+                                                   dtype=object)
+
+        profile_means.update(data, index)
+        assert_same_means(profile_means, ProfileMeans(data, channel_mask))
+
+
+def test_update_with_new_station(data, channel_mask):
+    profile_means = ProfileMeans(data, channel_mask)
+    data.loc[[0, 1], 'Station'] = '5000N'
+
+    assert profile_means.update(data, [0, 1]) == ProfileMeans.components
+    assert 5000 in profile_means.stations
+    assert_same_means(profile_means, ProfileMeans(data, channel_mask))
+
+
+def test_invalid_readings_are_ignored(data, channel_mask):
+    data.at[0, 'Reading'] = np.full(len(channel_mask), np.nan)
+    profile_means = ProfileMeans(data, channel_mask)
+    for component in ProfileMeans.components:
+        _, means = profile_means.get_means(component)
+        assert np.isfinite(means).all()